@@ -0,0 +1,53 @@
+import math
+import time
+import threading
+
+
+# ------------------------------------------------------------------------------ #
+# Admission control
+# ------------------------------------------------------------------------------ #
+class Overloaded(Exception):
+    """Raised when a request is turned away; `retry_after` is the suggested wait in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.message = message
+        self.retry_after = retry_after
+
+
+class ServiceRate:
+    """
+    Exponentially weighted rate of completed computations per second.
+
+    Completions are summed with a weight that halves every `half_life`
+    seconds, so the estimate follows the recent service rate.
+    """
+
+    def __init__(self, half_life=30.0):
+        self.half_life = float(half_life)
+        self._lock = threading.Lock()
+        self._weight = 0.0
+        self._updated = time.monotonic()
+
+    def _decay(self, now):
+        self._weight *= 0.5 ** ((now - self._updated) / self.half_life)
+        self._updated = now
+
+    def record(self, count=1):
+        """Count completed computations."""
+        with self._lock:
+            self._decay(time.monotonic())
+            self._weight += count
+
+    def per_second(self):
+        """Current completions per second (0.0 before anything completed)."""
+        with self._lock:
+            self._decay(time.monotonic())
+            return self._weight * math.log(2) / self.half_life
+
+    def retry_after(self, backlog, minimum=1, maximum=60):
+        """Seconds until `backlog` computations should have drained at the current rate."""
+        rate = self.per_second()
+        if rate <= 0:
+            return maximum
+        return int(min(maximum, max(minimum, math.ceil(backlog / rate))))
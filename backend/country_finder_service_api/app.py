@@ -1,9 +1,11 @@
 import os
+import hmac
 import json
+import re
 import uuid
 import time
 import threading
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from werkzeug.exceptions import HTTPException
 from flask_cors import CORS
 from flasgger import Swagger
@@ -26,16 +28,150 @@ os.environ["TRANSFORMERS_CACHE"] = os.path.join(custom_cache, "models")
 load_dotenv()
 
 
-from transformers import pipeline
+import numpy as np
+from inference_scheduler import InferenceScheduler
+from country_scorer import CountryScorer, entailment_index
+from gazetteer import Gazetteer
+from country_history import CountryHistory
+from inference_backend import load_backend
+from worker_pool import InferenceWorkerPool
+from concurrency_controller import ConcurrencyController
+from model_loader import ModelLoader
+from model_snapshot import (
+    find_snapshot, load_snapshot_model, load_snapshot_tokenizer, read_snapshot_file
+)
+from metrics import MetricsRegistry, register_service_metrics
+from profiler import PROFILE_MODES, JobProfiler
+from result_cache import ResultCache, content_key
+from premise_logits import PremiseLogits
+from admission import Overloaded, ServiceRate
+from job_store import FINISHED_STATUSES, Job, WorkDispatcher, open_job_store
 
 
-# Initialize the classifier
-classifier = pipeline("zero-shot-classification", model="valhalla/distilbart-mnli-12-1", device=-1, cache_dir="./hf_cache")
+# "flat" scores every country, "two_stage" reranks an embedding shortlist,
+# "hierarchical" scores regions first and then only the countries inside the best ones
+COUNTRY_FINDER_MODE = os.getenv("COUNTRY_FINDER_MODE", "flat")
+COUNTRY_SHORTLIST_K = int(os.getenv("COUNTRY_SHORTLIST_K", "30"))
+COUNTRY_REGION_TOP = int(os.getenv("COUNTRY_REGION_TOP", "2"))
+COUNTRY_REGION_MAX = int(os.getenv("COUNTRY_REGION_MAX", "5"))
+COUNTRY_REGION_CONFIDENCE = float(os.getenv("COUNTRY_REGION_CONFIDENCE", "0.6"))
+
+# Stop scoring label chunks once the leader is this confident and this far ahead (0-1). Off by default:
+# the confidence is a softmax within one chunk, so a chunk without the right country can still clear it
+COUNTRY_EARLY_STOP = os.getenv("COUNTRY_EARLY_STOP", "false").lower() == "true"
+COUNTRY_EARLY_STOP_CONFIDENCE = float(os.getenv("COUNTRY_EARLY_STOP_CONFIDENCE", "0.9"))
+COUNTRY_EARLY_STOP_MARGIN = float(os.getenv("COUNTRY_EARLY_STOP_MARGIN", "0.6"))
+
+# Answer descriptions that name a single place outright without running the model
+COUNTRY_GAZETTEER = os.getenv("COUNTRY_GAZETTEER", "true").lower() == "true"
+
+# Token budget of a description, the model's own limit unless a smaller one is set (0 or unset); with sliding
+# windows on, longer descriptions are split into up to INPUT_MAX_WINDOWS overlapping windows whose logits are
+# averaged, otherwise they are truncated
+INPUT_MAX_TOKENS = int(os.getenv("INPUT_MAX_TOKENS", "0")) or None
+INPUT_SLIDING_WINDOWS = os.getenv("INPUT_SLIDING_WINDOWS", "false").lower() == "true"
+INPUT_WINDOW_OVERLAP = int(os.getenv("INPUT_WINDOW_OVERLAP", "64"))
+INPUT_MAX_WINDOWS = int(os.getenv("INPUT_MAX_WINDOWS", "4")) if INPUT_SLIDING_WINDOWS else 1
+
+# Zero-shot NLI model, loaded in the background by `load_model` once the server is up
+MODEL_NAME = "valhalla/distilbart-mnli-12-1"
 
 # Load countries list
 with open('country_names.json', 'r', encoding='utf-8') as file:
     all_countries = json.load(file)
 
+# Forward pass engine: "torch" (eager fp32), "torch_int8" or "onnx" (see export_model.py).
+# The torch weights are only loaded by the torch backends.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+# Snapshot written by snapshot_model.py, used instead of the Hugging Face cache when present
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", os.path.join(custom_cache, "snapshot"))
+
+# Regions scored before countries in hierarchical mode
+country_regions = None
+if COUNTRY_FINDER_MODE == "hierarchical":
+    with open('country_regions.json', 'r', encoding='utf-8') as file:
+        country_regions = json.load(file)
+
+# Descriptions classified (and rounds of them) before the service reports ready
+MODEL_WARMUP_TEXTS = os.getenv("MODEL_WARMUP_TEXTS")
+MODEL_WARMUP_ROUNDS = int(os.getenv("MODEL_WARMUP_ROUNDS", "1"))
+DEFAULT_WARMUP_TEXTS = [
+    "A cold snowy place with high mountains and glaciers",
+    "Ancient temples, spicy street food and crowded night markets along a wide river"
+]
+
+# Set by `load_model`
+tokenizer = None
+inference_backend = None
+country_scorer = None
+region_scorer = None
+worker_pool = None
+country_retriever = None
+
+# Per-stage latency histograms, served in the Prometheus text format on /metrics
+metrics = MetricsRegistry()
+queue_wait_seconds = metrics.histogram(
+    "job_queue_wait_seconds", "Time from job submission until its description is picked up."
+)
+tokenize_seconds = metrics.histogram(
+    "tokenize_seconds", "Time to tokenize a description.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1)
+)
+forward_seconds = metrics.histogram(
+    "model_forward_seconds", "Model forward pass time per batch of (description, country) pairs."
+)
+chunk_seconds = metrics.histogram(
+    "country_chunk_seconds", "Time from queueing a 30-country chunk until its logits are back, batching wait included."
+)
+job_seconds = metrics.histogram(
+    "job_duration_seconds", "End-to-end time from job submission until it is done."
+)
+
+def forward(batch):
+    """Entailment logits of a batch of pairs, timed."""
+    started = time.perf_counter()
+    logits = country_scorer.forward(batch)
+    forward_seconds.observe(time.perf_counter() - started)
+    return logits
+
+def run_batch(batch):
+    """Run a batch of pairs on the worker processes when there are any, on this thread otherwise."""
+    return worker_pool(batch) if worker_pool is not None else forward(batch)
+
+# Forward passes run in this many processes forked after the model is loaded, sharing its
+# weights, with the cores split between them (0 runs them on a thread of this process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
+
+# Recently predicted countries are scored first so early stopping triggers sooner
+country_history = CountryHistory(os.getenv("COUNTRY_HISTORY_PATH", os.path.join(custom_cache, "country_history.json")))
+
+# Compiled place-name matcher for the gazetteer fast path; names shared with people or other
+# places (country_ambiguous_names.json) only move their countries to the front of the candidates
+gazetteer = Gazetteer.from_files(
+    'country_names.json', 'country_aliases.json', 'country_ambiguous_names.json'
+) if COUNTRY_GAZETTEER else None
+
+# Results of identical descriptions are reused until the model or any setting that changes them does
+result_cache = ResultCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "3600")),
+    disk_path=os.getenv("CACHE_DISK_PATH") or None
+)
+CACHE_VERSION = ":".join(str(part) for part in (
+    MODEL_NAME, INFERENCE_BACKEND, COUNTRY_FINDER_MODE, COUNTRY_GAZETTEER,
+    COUNTRY_EARLY_STOP and (COUNTRY_EARLY_STOP_CONFIDENCE, COUNTRY_EARLY_STOP_MARGIN),
+    COUNTRY_SHORTLIST_K, COUNTRY_REGION_TOP, COUNTRY_REGION_MAX, COUNTRY_REGION_CONFIDENCE,
+    INPUT_MAX_TOKENS, INPUT_MAX_WINDOWS > 1 and ("sentences", INPUT_WINDOW_OVERLAP, INPUT_MAX_WINDOWS)
+))
+# Entailment logits of a premise window only depend on the model, so edited descriptions reuse those of their unchanged
+# windows; they are kept apart from the results so they neither push results out nor count in the result cache's hit rate
+premise_cache = ResultCache(
+    max_entries=int(os.getenv("PREMISE_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+)
+PREMISE_VERSION = f"{MODEL_NAME}:{INFERENCE_BACKEND}:premise"
+
 # ------------------------------------------------------------------------------ #
 # Helper functions
 # ------------------------------------------------------------------------------ #
@@ -43,6 +179,26 @@ def batch_labels(labels, batch_size=25):
     """Split large label lists into smaller batches."""
     return [labels[i:i + batch_size] for i in range(0, len(labels), batch_size)]
 
+def softmax(logits):
+    """Normalise entailment logits across the labels of one chunk."""
+    exp = np.exp(np.asarray(logits, dtype=np.float64) - np.max(logits))
+    return exp / exp.sum()
+
+def rank_countries(labels, logits, chunk_size=30):
+    """Return the best 3 countries, normalising scores within each chunk of labels like the zero-shot pipeline."""
+    top_results = []
+    offset = 0
+    for batch in batch_labels(labels, chunk_size):
+        scores = softmax(logits[offset:offset + len(batch)])
+        offset += len(batch)
+        for index in np.argsort(scores)[::-1][:3]:
+            top_results.append({"country": batch[index], "confidence": float(scores[index])})
+    top_results.sort(key=lambda x: x["confidence"], reverse=True)
+    return [
+        {"country": item["country"], "confidence": round(item["confidence"] * 100, 2)}
+        for item in top_results[:3]
+    ]
+
 # ------------------------------------------------------------------------------ #
 # Flask app setup with Swagger
 # ------------------------------------------------------------------------------ #
@@ -52,6 +208,9 @@ CORS(app)
 # Set the secret key in Flask config
 app.config['JWT_SECRET'] = os.getenv('JWT_SECRET')
 
+# Key for the /admin endpoints, which are disabled when it is not set
+app.config['ADMIN_API_KEY'] = os.getenv('ADMIN_API_KEY')
+
 swagger = Swagger(app, template={
     "info": {
         "title": "Country Finder API",
@@ -66,45 +225,459 @@ swagger = Swagger(app, template={
 # ------------------------------------------------------------------------------ #
 # Threading and job management
 # ------------------------------------------------------------------------------ #
-jobs = {}
-job_lock = threading.Lock()
+class CountryJob(Job):
+    """Job record with the stage that produced the result, the provisional best 3 and the description's cache key."""
+
+    __slots__ = ("source", "chunks_evaluated", "partial", "content_hash")
+
+    def __init__(self, job_id, source=None, chunks_evaluated=0, partial=(), content_hash=None, **fields):
+        super().__init__(job_id, **fields)
+        self.source = source
+        self.chunks_evaluated = chunks_evaluated
+        self.partial = partial
+        self.content_hash = content_hash
+
+# Job records and the queue of descriptions to classify, kept in memory or shared by every
+# replica through SQLite or Redis. Finished jobs are kept for 5 minutes.
+jobs = open_job_store(
+    os.getenv("JOB_STORE_URL", "memory"),
+    CountryJob,
+    ttl=300,
+    namespace="country_finder",
+    shards=int(os.getenv("JOB_STORE_SHARDS", "16")),
+    lease=float(os.getenv("JOB_STORE_LEASE_SECONDS", "120")),
+    stale=float(os.getenv("JOB_STALE_SECONDS", "3600"))
+)
+
+# Admission checks and job creation of this process run one at a time
+admission_lock = threading.Lock()
+
+# Upper bound for the ?wait=<seconds> long-poll parameter
+MAX_WAIT_SECONDS = float(os.getenv("MAX_WAIT_SECONDS", "30"))
+
+# How long /stream/<job_id> stays open waiting for a job to finish
+MAX_STREAM_SECONDS = float(os.getenv("MAX_STREAM_SECONDS", "300"))
+
+# Upper bound for the number of descriptions or job IDs in one bulk request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+
+# Admission limits: computations queued or running, jobs not yet done, and job records kept in the job store
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "100"))
+MAX_OUTSTANDING_JOBS = int(os.getenv("MAX_OUTSTANDING_JOBS", "1000"))
+MAX_JOBS = int(os.getenv("MAX_JOBS", "20000"))
+
+# Measured completions per second, used for the Retry-After estimate
+service_rate = ServiceRate()
+
+# Descriptions classified at once: starts at CONCURRENCY_INITIAL and, when ADAPTIVE_CONCURRENCY
+# is on, is tuned between CONCURRENCY_MIN and CONCURRENCY_MAX from the measured latency
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+CONCURRENCY_INITIAL = int(os.getenv("CONCURRENCY_INITIAL", "10"))
+CONCURRENCY_MIN = int(os.getenv("CONCURRENCY_MIN", "1"))
+CONCURRENCY_MAX = int(os.getenv("CONCURRENCY_MAX", "64"))
+
+# Executor for prediction, sized for the largest limit the controller may pick
+executor = ThreadPoolExecutor(max_workers=max(CONCURRENCY_MAX, CONCURRENCY_INITIAL))
+
+# Inference thread that batches (description, hypothesis) pairs across jobs, one per worker process
+scheduler = InferenceScheduler(
+    run_batch,
+    max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "128")),
+    max_batch_tokens=int(os.getenv("INFERENCE_MAX_BATCH_TOKENS", "32768")),
+    max_wait=float(os.getenv("INFERENCE_MAX_WAIT_MS", "10")) / 1000,
+    concurrency=max(1, INFERENCE_WORKERS)
+)
+
+register_service_metrics(metrics, jobs, scheduler, result_cache)
+metrics.gauge("model_ready", "1 once the model is loaded and warmed up.", lambda: int(model_loader.ready))
+
+# Profiles the next N jobs on request, see /admin/profile
+profiler = JobProfiler()
+
+def encode_description(description):
+    """Tokenize a description into its premise windows within the token budget."""
+    return country_scorer.encode_premise(description, INPUT_MAX_TOKENS, INPUT_WINDOW_OVERLAP, INPUT_MAX_WINDOWS)
+
+def premise_logits(scorer, windows, kind):
+    """Logits of the description's windows against the labels of `scorer`, reusing those cached for the same windows."""
+    return PremiseLogits(scorer, windows, premise_cache, f"{PREMISE_VERSION}:{kind}", scheduler.submit)
+
+def select_candidates(description, windows, regions=None):
+    """Pick the countries to score for the configured mode, with the stage that produced them."""
+    if country_retriever is not None:
+        return [country for country, _ in country_retriever.shortlist(description, COUNTRY_SHORTLIST_K)], "rerank"
+
+    if region_scorer is not None:
+        regions = regions or premise_logits(region_scorer, windows, "regions")
+        probabilities = softmax(regions.logits(region_scorer.labels).result())
 
-# Executor for prediction (max 10 concurrent)
-executor = ThreadPoolExecutor(max_workers=10)
+        # Take the top regions, expanding while the kept regions are not confident enough
+        selected = []
+        covered = 0.0
+        for index in np.argsort(probabilities)[::-1][:COUNTRY_REGION_MAX]:
+            if len(selected) >= COUNTRY_REGION_TOP and covered >= COUNTRY_REGION_CONFIDENCE:
+                break
+            selected.append(region_scorer.labels[index])
+            covered += probabilities[index]
+        return [country for region in selected for country in country_regions[region]], "region"
+
+    return all_countries, "model"
+
+def mentioned_first(candidates, mentioned):
+    """Move the candidates the description names (ambiguously, or more than one) to the front."""
+    remaining = set(candidates)
+    named = [country for country in mentioned if country in remaining]
+    remaining.difference_update(named)
+    return named + [country for country in candidates if country in remaining]
+
+def is_confident(best_3):
+    """Check whether the leading country passes the early stopping confidence and margin."""
+    if not best_3:
+        return False
+    runner_up = best_3[1]["confidence"] if len(best_3) > 1 else 0.0
+    return (best_3[0]["confidence"] >= COUNTRY_EARLY_STOP_CONFIDENCE * 100
+            and best_3[0]["confidence"] - runner_up >= COUNTRY_EARLY_STOP_MARGIN * 100)
+
+def score_candidates(premises, candidates, chunk_size=30, on_chunk=None, chunk_times=None):
+    """
+    Score candidate chunks against the description's `premises` in order and return the best 3 with the number of chunks evaluated.
+
+    `on_chunk(best_3, chunks_evaluated)` is called with the provisional ranking after every chunk,
+    and the seconds each chunk took from queueing until its logits were back are appended to `chunk_times`.
+    """
+    chunks = batch_labels(candidates, chunk_size)
+    # Keep the next chunk queued while the current one is checked, or every chunk without early stopping
+    ahead = 1 if COUNTRY_EARLY_STOP else len(chunks)
+    futures = [premises.logits(batch) for batch in chunks[:ahead]]
+    submitted = [time.perf_counter()] * len(futures)
+    evaluated = []
+    logits = []
+    best_3 = []
+    for index, batch in enumerate(chunks):
+        if index + ahead < len(chunks):
+            futures.append(premises.logits(chunks[index + ahead]))
+            submitted.append(time.perf_counter())
+        logits.extend(futures[index].result())
+        elapsed = time.perf_counter() - submitted[index]
+        chunk_seconds.observe(elapsed)
+        if chunk_times is not None:
+            chunk_times.append(round(elapsed, 6))
+        evaluated.extend(batch)
+        best_3 = rank_countries(evaluated, logits, chunk_size)
+        if on_chunk is not None:
+            on_chunk(best_3, index + 1)
+        if COUNTRY_EARLY_STOP and is_confident(best_3):
+            for future in futures[index + 1:]:
+                future.cancel()
+            return best_3, index + 1
+    return best_3, len(chunks)
 
 # ------------------------------------------------------------------------------ #
 # Job logic
 # ------------------------------------------------------------------------------ #
-def predict_job(job_id, description):
-    """Run the prediction and update the job status/results."""
-    with job_lock:
-        jobs[job_id]['status'] = 'predicting'
+def predict_job(cache_key, description):
+    """Run the prediction once, update every job attached to it and return the source of the result (None on failure)."""
+    started = time.time()
+    for job_id in jobs.attached(cache_key):
+        job = jobs.get(job_id)
+        if job is not None:
+            queue_wait_seconds.observe(started - job.created)
+        jobs.update(job_id, status="predicting")
 
-    top_results = []
-    for batch in batch_labels(all_countries, 30):
-        result = classifier(description, candidate_labels=batch, top_k=3)
-        for label, score in zip(result["labels"], result["scores"]):
-            top_results.append({"country": label, "confidence": score})
-    top_results.sort(key=lambda x: x["confidence"], reverse=True)
-    best_3 = [
-        {"country": item["country"], "confidence": round(item["confidence"] * 100, 2)}
-        for item in top_results[:3]
-    ]
+    def publish(best_3, chunks_evaluated):
+        """Share the provisional best 3 after a chunk with the attached jobs."""
+        for job_id in jobs.attached(cache_key):
+            jobs.update(job_id, partial=best_3, chunks_evaluated=chunks_evaluated)
+
+    # Seconds per stage of this computation, shared by the attached jobs
+    stages = {"cache_hit": False}
+    # Logits of the premise windows, kept with the result so a later edit can reuse them
+    segments = {}
+    try:
+        country = gazetteer.lookup(description) if gazetteer is not None else None
+        if country is not None:
+            best_3 = [{"country": country, "confidence": 100.0}]
+            source = "gazetteer"
+            chunks_evaluated = 0
+            stopped_early = False
+        else:
+            stage = time.perf_counter()
+            windows = encode_description(description)
+            stages["tokenize"] = time.perf_counter() - stage
+            stages["windows"] = len(windows)
+            tokenize_seconds.observe(stages["tokenize"])
+
+            countries = premise_logits(country_scorer, windows, "countries")
+            regions = premise_logits(region_scorer, windows, "regions") if region_scorer is not None else None
+
+            stage = time.perf_counter()
+            candidates, source = select_candidates(description, windows, regions)
+            if source != "rerank":
+                candidates = country_history.order(candidates)
+            if gazetteer is not None:
+                candidates = mentioned_first(candidates, gazetteer.mentioned(description))
+            stages["select_candidates"] = time.perf_counter() - stage
+
+            stage = time.perf_counter()
+            stages["chunks"] = []
+            best_3, chunks_evaluated = score_candidates(
+                countries, candidates, on_chunk=publish, chunk_times=stages["chunks"]
+            )
+            stages["score_candidates"] = time.perf_counter() - stage
+            stopped_early = chunks_evaluated < len(batch_labels(candidates, 30))
+            for premises in (countries, regions):
+                if premises is not None:
+                    stages["pairs_scored"] = stages.get("pairs_scored", 0) + premises.pairs_scored
+                    segments.update(premises.save())
+    except Exception as e:
+        # Finish the attached jobs as failed, so waiters and pollers stop; later submissions start over
+        job_ids = jobs.fail(cache_key, f"Prediction failed: {e}")
+        print(f"Prediction failed for jobs {', '.join(job_ids)}: {type(e).__name__}: {e}")
+        return None
+
+    # An early-stopped winner only beat its own chunk; counting it would make the same stop likelier next time
+    if best_3 and not stopped_early:
+        country_history.record(best_3[0]["country"])
+    result_cache.put(cache_key, {
+        "result": best_3, "source": source, "chunks_evaluated": chunks_evaluated, "segments": segments
+    })
+
+    finished = time.time()
+    stages["predict"] = finished - started
+    stages = {name: round(value, 6) if isinstance(value, float) else value for name, value in stages.items()}
+    for job_id in jobs.complete(cache_key):
+        job = jobs.get(job_id)
+        timings = dict(stages)
+        if job is not None:
+            # Jobs that joined the running computation waited less than the one that queued it
+            timings["queue_wait"] = round(max(0.0, started - job.created), 6)
+            timings["total"] = round(finished - job.created, 6)
+            job_seconds.observe(finished - job.created)
+        jobs.finish(job_id, result=best_3, source=source, chunks_evaluated=chunks_evaluated, timings=timings)
+    service_rate.record()
+    return source
+
+def run_claimed(claimed):
+    """Run the predictions claimed from the job store on the executor."""
+    def run(cache_key, description):
+        try:
+            started = time.monotonic()
+            with profiler.job():
+                source = predict_job(cache_key, description)
+            # Gazetteer answers skip the model, their near-zero latency would only drag the baseline down
+            if concurrency_controller is not None and source not in (None, "gazetteer"):
+                concurrency_controller.record(time.monotonic() - started)
+        except Exception as e:
+            # predict_job finishes its own jobs, this is whatever wraps it failing; don't leave them waiting
+            job_ids = jobs.fail(cache_key, f"Prediction failed: {e}")
+            print(f"Prediction failed for jobs {', '.join(job_ids)}: {type(e).__name__}: {e}")
+        finally:
+            dispatcher.done()
+
+    for cache_key, description in claimed:
+        executor.submit(run, cache_key, description)
+
+# Pulls queued descriptions (from any replica when the store is shared) while a slot is free,
+# started once the model is ready
+dispatcher = WorkDispatcher(jobs, run_claimed, slots=CONCURRENCY_INITIAL)
+
+# Tunes the slots and, when the model runs in this process, its intra-op threads (set by `start_dispatching`)
+concurrency_controller = None
+
+def load_model():
+    """Load the tokenizer and model, pre-tokenize the hypotheses and fork the inference workers."""
+    global tokenizer, inference_backend, country_scorer, region_scorer, worker_pool, country_retriever
+    from transformers import AutoConfig, AutoTokenizer, AutoModelForSequenceClassification
+
+    if find_snapshot(MODEL_SNAPSHOT_DIR, MODEL_NAME) is not None:
+        # Local files only: safetensors weights and the hypotheses tokenized when the snapshot was taken
+        model_source = os.path.join(MODEL_SNAPSHOT_DIR, "model")
+        tokenizer = load_snapshot_tokenizer(MODEL_SNAPSHOT_DIR)
+        load_torch_model = lambda: load_snapshot_model(MODEL_SNAPSHOT_DIR)
+        saved_scorers = read_snapshot_file(MODEL_SNAPSHOT_DIR, "scorers.json") or {}
+    else:
+        model_source = MODEL_NAME
+        tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, cache_dir="./hf_cache")
+        # low_cpu_mem_usage maps the checkpoint instead of allocating a randomly initialised copy first
+        load_torch_model = lambda: AutoModelForSequenceClassification.from_pretrained(
+            MODEL_NAME, cache_dir="./hf_cache", low_cpu_mem_usage=True
+        )
+        saved_scorers = {}
+    model_config = AutoConfig.from_pretrained(model_source, cache_dir="./hf_cache")
+    entailment_id = entailment_index(model_config)
+    max_length = min(tokenizer.model_max_length, model_config.max_position_embeddings)
+
+    inference_backend = load_backend(
+        INFERENCE_BACKEND,
+        load_torch_model,
+        os.getenv("INFERENCE_ARTIFACT_DIR", os.path.join(custom_cache, "inference"))
+    )
+
+    def scorer(labels, saved):
+        """Reuse the snapshot's tokenized hypotheses unless the labels changed since, tokenize them otherwise."""
+        if saved is not None and saved["labels"] == list(labels) and saved["entailment_id"] == entailment_id:
+            return CountryScorer.from_state(inference_backend, tokenizer, saved)
+        return CountryScorer(inference_backend, tokenizer, labels, entailment_id, max_length)
+
+    # Pre-tokenize every country (and region) hypothesis once
+    country_scorer = scorer(all_countries, saved_scorers.get("countries"))
+    if country_regions is not None:
+        region_scorer = scorer(list(country_regions), saved_scorers.get("regions"))
+
+    # Embedding index used to shortlist countries in two-stage mode
+    if COUNTRY_FINDER_MODE == "two_stage":
+        from country_retriever import CountryRetriever
+        with open('country_descriptors.json', 'r', encoding='utf-8') as file:
+            country_descriptors = json.load(file)
+        country_retriever = CountryRetriever(
+            os.getenv("COUNTRY_EMBEDDING_MODEL", "sentence-transformers/all-MiniLM-L6-v2"),
+            country_descriptors,
+            index_path=os.getenv("COUNTRY_INDEX_PATH", os.path.join(custom_cache, "country_index.npz")),
+            cache_dir="./hf_cache"
+        )
+
+    if INFERENCE_WORKERS > 0:
+        worker_pool = InferenceWorkerPool(
+            forward,
+            inference_backend,
+            INFERENCE_WORKERS,
+            threads=int(os.getenv("INFERENCE_WORKER_THREADS", "0")) or None,
+            metrics=metrics
+        )
+
+def warm_up_model():
+    """Classify the warm-up descriptions against every candidate."""
+    texts = DEFAULT_WARMUP_TEXTS
+    if MODEL_WARMUP_TEXTS:
+        with open(MODEL_WARMUP_TEXTS, 'r', encoding='utf-8') as file:
+            texts = json.load(file)
+
+    def classify(description):
+        windows = encode_description(description)
+        # Not saved, so every round runs the model
+        candidates, _ = select_candidates(description, windows)
+        score_candidates(premise_logits(country_scorer, windows, "countries"), candidates)
+
+    # Side by side, so every inference worker gets some of them
+    list(executor.map(classify, texts * MODEL_WARMUP_ROUNDS))
+
+def start_dispatching():
+    """Start taking queued jobs, with the concurrency controller when it is enabled."""
+    global concurrency_controller
+    if ADAPTIVE_CONCURRENCY:
+        concurrency_controller = ConcurrencyController(
+            dispatcher.resize,
+            dispatcher.in_progress,
+            limit=CONCURRENCY_INITIAL,
+            min_limit=CONCURRENCY_MIN,
+            max_limit=CONCURRENCY_MAX,
+            set_threads=None if worker_pool is not None else (
+                lambda threads: scheduler.call_between_batches(lambda: inference_backend.set_threads(threads))
+            ),
+            threads=inference_backend.threads() or None,
+            interval=float(os.getenv("CONCURRENCY_INTERVAL_SECONDS", "5"))
+        )
+    dispatcher.start()
+
+# The server binds right away; jobs submitted meanwhile queue until the model is ready
+model_loader = ModelLoader(load_model, warm_up_model, start_dispatching)
+model_loader.start()
+
+def admit(new_computation):
+    """Raise Overloaded when one more job (and computation) would pass the admission limits. Caller holds admission_lock."""
+    queue_depth = jobs.queue_depth()
+    if len(jobs) >= MAX_JOBS:
+        # Make room by dropping stale jobs, then the oldest finished ones
+        jobs.evict_oldest(len(jobs) - MAX_JOBS + 1)
+        if len(jobs) >= MAX_JOBS:
+            raise Overloaded("Too many jobs", service_rate.retry_after(queue_depth))
+
+    if jobs.outstanding() >= MAX_OUTSTANDING_JOBS:
+        raise Overloaded("Too many outstanding jobs", service_rate.retry_after(queue_depth))
+    if new_computation and queue_depth >= MAX_QUEUE_DEPTH:
+        raise Overloaded("Prediction queue is full", service_rate.retry_after(queue_depth - MAX_QUEUE_DEPTH + 1))
+
+def is_job_id(value):
+    """Whether the value is a job ID (a UUID) rather than a content hash."""
+    try:
+        uuid.UUID(value)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+def is_previous_version(value):
+    """Whether the value can name a previous version of a text: a job ID or a content hash."""
+    return isinstance(value, str) and (is_job_id(value) or re.fullmatch(r"[0-9a-f]{64}", value) is not None)
+
+def restore_segments(previous):
+    """
+    Put the premise window logits of a previous version of the description back into the premise cache.
+
+    `previous` is the job ID or content hash of that version. Its segments are
+    kept with its cached result, so none are restored once that has expired.
+    """
+    content_hash = previous
+    if is_job_id(previous):
+        job = jobs.get(previous)
+        content_hash = job.content_hash if job is not None else None
+    entry = result_cache.get(content_hash, count=False) if content_hash else None
+    segments = entry.get("segments") if isinstance(entry, dict) else None
+    for key, value in (segments or {}).items():
+        # Keep logits added for the window since
+        premise_cache.put(key, {**value, **(premise_cache.get(key, count=False) or {})})
+
+def create_job(description, previous=None):
+    """
+    Create a job for the description and return it.
+
+    The job is finished straight away from the result cache, attached to a
+    running computation of the same description or queued in the job store
+    for a worker. With `previous` (the job ID or content hash of an earlier
+    version of the description) the logits of its unchanged premise windows
+    are reused. Raises Overloaded when the job is not admitted.
+    """
+    cache_key = content_key(description, CACHE_VERSION)
+    cached = result_cache.get(cache_key)
+    if cached is None and previous is not None:
+        restore_segments(previous)
+
+    with admission_lock:
+        leader = jobs.attached(cache_key) if cached is None else None
+        admit(new_computation=cached is None and not leader)
 
-    with job_lock:
-        jobs[job_id]['status'] = 'done'
-        jobs[job_id]['result'] = best_3
-        jobs[job_id]['timestamp'] = time.time()
+        if cached is not None:
+            # Finish the job here, the description was classified before
+            job = jobs.create(
+                status="done",
+                result=cached["result"],
+                source=cached["source"],
+                chunks_evaluated=cached["chunks_evaluated"],
+                partial=cached["result"],
+                content_hash=cache_key,
+                timestamp=time.time(),
+                timings={"cache_hit": True, "total": 0.0}
+            )
+            return job
+
+        first = jobs.get(leader[0]) if leader else None
+        if first is not None and first.status != "done":
+            # The same description is already being classified, start from its progress
+            job = jobs.create(
+                status=first.status, chunks_evaluated=first.chunks_evaluated, partial=first.partial,
+                content_hash=cache_key
+            )
+        else:
+            job = jobs.create(content_hash=cache_key)
+
+        # Shares the running computation if there still is one, queues the description otherwise
+        jobs.join(cache_key, job.job_id, description)
+        return job
 
 def cleanup_jobs():
-    """Continuously remove completed jobs after 5 minutes."""
+    """Continuously remove completed jobs 5 minutes after they finished."""
     while True:
-        time.sleep(30)  # check every 30 seconds
-        now = time.time()
-        with job_lock:
-            expired = [job_id for job_id, data in jobs.items() if data['status'] == 'done' and now - data['timestamp'] > 300]
-            for job_id in expired:
-                del jobs[job_id]
+        time.sleep(1)
+        jobs.evict_expired()
 
 # Start cleanup thread
 cleanup_thread = threading.Thread(target=cleanup_jobs, daemon=True)
@@ -145,6 +718,58 @@ def token_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        ADMIN_API_KEY = app.config['ADMIN_API_KEY']
+
+        if not ADMIN_API_KEY:
+            return jsonify({"error": "Admin endpoints are disabled"}), 403
+
+        # Checked on top of the bearer token
+        admin_key = request.headers.get('X-Admin-Key', '')
+        if not hmac.compare_digest(admin_key.encode(), ADMIN_API_KEY.encode()):
+            return jsonify({"error": "Invalid admin key"}), 403
+
+        return f(*args, **kwargs)
+    return decorated
+
+def overloaded_response(e, **extra):
+    """429 response for a request turned away by admission control."""
+    response = jsonify({"error": e.message, "retry_after": e.retry_after, **extra})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+def wait_seconds():
+    """Read the optional ?wait=<seconds> query parameter, capped at MAX_WAIT_SECONDS (None when invalid)."""
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return None
+    if wait != wait or wait < 0:
+        return None
+    return min(wait, MAX_WAIT_SECONDS)
+
+def job_response(job):
+    """Public view of a job record."""
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "result": job.result if job.status == "done" else {},
+        "source": job.source,
+        "chunks_evaluated": job.chunks_evaluated,
+        "content_hash": job.content_hash,
+        **({"error": job.error} if job.status == "failed" else {})
+    }
+
+def job_debug_response(job):
+    """Public view of a job record with its timing breakdown."""
+    return {**job_response(job), "timings": job.timings}
+
+def job_status(job):
+    """Short view of a job record returned on submission."""
+    return {"job_id": job.job_id, "status": job.status, "content_hash": job.content_hash}
+
 @app.route("/predict", methods=["POST"])
 @token_required
 def predict_endpoint():
@@ -157,7 +782,17 @@ def predict_endpoint():
     description: >
       Accepts a description text and returns a job ID.
       The job is processed asynchronously and can be retrieved using `/result/<job_id>`.
+      With `wait`, the result is returned inline when the job finishes within that many seconds.
+      For an edited description, pass the job ID or `content_hash` of the previous version as `previous`
+      so that only its changed premise windows are scored. A description within the token budget is one
+      window, so this only saves work for longer descriptions: with INPUT_SLIDING_WINDOWS for edits that
+      leave some of its sentence windows unchanged, otherwise for edits past the budget.
     parameters:
+      - name: wait
+        in: query
+        required: false
+        type: number
+        description: Seconds to wait for the result before returning the job ID (capped by MAX_WAIT_SECONDS).
       - in: body
         name: body
         required: true
@@ -169,6 +804,10 @@ def predict_endpoint():
             description:
               type: string
               example: "A cold snowy place with high mountains and glaciers"
+            previous:
+              type: string
+              description: Job ID or content hash of the previous version of an edited description.
+              example: "b1fc03a9-9450-41ad-9217-2fa188c44d09"
     responses:
       200:
         description: Job successfully submitted.
@@ -180,7 +819,16 @@ def predict_endpoint():
               example: "b1fc03a9-9450-41ad-9217-2fa188c44d09"
             status:
               type: string
+              enum: [waiting, predicting, done, failed]
               example: "waiting"
+            content_hash:
+              type: string
+              description: Identifies this version of the description, to pass as `previous` after an edit.
+            result:
+              type: array
+              description: Only present when `wait` was given and the job finished in time.
+              items:
+                type: object
       400:
         description: Invalid or missing input.
         schema:
@@ -189,6 +837,17 @@ def predict_endpoint():
             error:
               type: string
               example: "Description cannot be empty"
+      429:
+        description: Too many queued or outstanding jobs, retry after the `Retry-After` header (seconds).
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Prediction queue is full"
+            retry_after:
+              type: integer
+              example: 12
     415:
       description: Unsupported content type.
       schema:
@@ -213,19 +872,135 @@ def predict_endpoint():
     if not isinstance(description, str) or not description.strip():
         return jsonify({"error": "Description must be a non-empty string"}), 400
 
+    previous = data.get("previous")
+    if previous is not None and not is_previous_version(previous):
+        return jsonify({"error": "previous must be a job ID or content hash"}), 400
+
+    wait = wait_seconds()
+    if wait is None:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
     description = description.strip()
-    job_id = str(uuid.uuid4())
+    try:
+        job = create_job(description, previous)
+    except Overloaded as e:
+        return overloaded_response(e)
 
-    with job_lock:
-        jobs[job_id] = {
-            "status": "waiting",
-            "result": {},
-            "timestamp": None
-        }
+    if wait and jobs.wait(job, wait):
+        return jsonify(jobs.read(job, job_response)), 200
+    return jsonify(jobs.read(job, job_status)), 200
 
-    executor.submit(predict_job, job_id, description)
+@app.route("/predict/batch", methods=["POST"])
+@token_required
+def predict_batch_endpoint():
+    """
+    Submit many country prediction jobs at once.
+    ---
+    tags:
+      - Prediction
+    summary: Submit a list of descriptions to predict top matching countries.
+    description: >
+      Accepts a list of description texts and returns one job ID per description, in the same order.
+      All descriptions are queued together so their country pairs share model batches.
+      Results can be retrieved using `/results?ids=...` or `/result/<job_id>`.
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - descriptions
+          properties:
+            descriptions:
+              type: array
+              items:
+                type: string
+              example: ["A cold snowy place with high mountains and glaciers", "A desert with pyramids"]
+    responses:
+      200:
+        description: Jobs successfully submitted.
+        schema:
+          type: object
+          properties:
+            jobs:
+              type: array
+              items:
+                type: object
+                properties:
+                  job_id:
+                    type: string
+                    example: "b1fc03a9-9450-41ad-9217-2fa188c44d09"
+                  status:
+                    type: string
+                    enum: [waiting, predicting, done, failed]
+                    example: "waiting"
+      400:
+        description: Invalid or missing input.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Descriptions must be a non-empty list of non-empty strings"
+      429:
+        description: Too many queued or outstanding jobs, retry after the `Retry-After` header (seconds).
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Prediction queue is full"
+            retry_after:
+              type: integer
+              example: 12
+            jobs:
+              type: array
+              description: Jobs accepted before the limit was reached, in order.
+              items:
+                type: object
+      415:
+        description: Unsupported content type.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Content-Type must be application/json"
+    """
+    if not request.is_json:
+        return jsonify({"error": "Content-Type must be application/json"}), 415
 
-    return jsonify({"job_id": job_id, "status": "waiting"}), 200
+    try:
+        data = request.get_json()
+    except Exception:
+        return jsonify({"error": "Malformed JSON body"}), 400
+
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON structure"}), 400
+
+    descriptions = data.get("descriptions")
+    if (not isinstance(descriptions, list) or not descriptions
+            or not all(isinstance(description, str) and description.strip() for description in descriptions)):
+        return jsonify({"error": "Descriptions must be a non-empty list of non-empty strings"}), 400
+    if len(descriptions) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} descriptions per batch"}), 400
+
+    created = []
+    rejected = None
+    for description in (description.strip() for description in descriptions):
+        try:
+            job = create_job(description)
+        except Overloaded as e:
+            rejected = e
+            break
+        created.append(job)
+
+    accepted = [jobs.read(job, job_status) for job in created]
+    if rejected is not None:
+        # The accepted prefix keeps running, the client resubmits the rest later
+        return overloaded_response(rejected, jobs=accepted)
+    return jsonify({"jobs": accepted}), 200
 
 @app.route("/result/<job_id>", methods=["GET"])
 @token_required
@@ -245,6 +1020,16 @@ def get_result(job_id):
         required: true
         type: string
         description: The job ID returned by the `/predict` endpoint.
+      - name: wait
+        in: query
+        required: false
+        type: number
+        description: Seconds to block until the job is done (capped by MAX_WAIT_SECONDS).
+      - name: debug
+        in: query
+        required: false
+        type: integer
+        description: Set to 1 to include the seconds spent per stage once the job is done.
     responses:
       200:
         description: Job status (and result if completed).
@@ -255,7 +1040,17 @@ def get_result(job_id):
               type: string
             status:
               type: string
-              enum: [waiting, predicting, done]
+              enum: [waiting, predicting, done, failed]
+            error:
+              type: string
+              description: Only for `failed` jobs, why the prediction failed.
+            timings:
+              type: object
+              description: >
+                Only with `debug=1`. Seconds spent queued, tokenizing, selecting candidates, per scored chunk,
+                scoring and in total; `cache_hit` is true when the result came from the result cache, and
+                `pairs_scored` counts the (premise window, label) pairs run through the model, the others
+                having been reused from earlier descriptions.
             result:
               type: array
               items:
@@ -277,17 +1072,159 @@ def get_result(job_id):
               type: string
               example: "Job ID not found"
     """
-    with job_lock:
-        job = jobs.get(job_id)
+    wait = wait_seconds()
+    if wait is None:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    job = jobs.get(job_id)
+
+    if not job:
+        return jsonify({"error": "Job ID not found"}), 404
+
+    # Long-poll: block until the job finishes or the wait runs out
+    if wait:
+        jobs.wait(job, wait)
+
+    if request.args.get("debug") == "1":
+        return jsonify(jobs.read(job, job_debug_response))
+    return jsonify(jobs.read(job, job_response))
+
+@app.route("/results", methods=["GET"])
+@token_required
+def get_results():
+    """
+    Retrieve prediction results for many jobs.
+    ---
+    tags:
+      - Prediction
+    summary: Get the status and result of several jobs using their job IDs.
+    description: >
+      Returns the current status of every listed job in one response, in the requested order.
+      Unknown or expired job IDs are reported with an error instead of a status.
+    parameters:
+      - name: ids
+        in: query
+        required: true
+        type: string
+        description: Comma separated job IDs returned by `/predict` or `/predict/batch`.
+    responses:
+      200:
+        description: Job statuses (and results if completed).
+        schema:
+          type: object
+          properties:
+            jobs:
+              type: array
+              items:
+                type: object
+                properties:
+                  job_id:
+                    type: string
+                  status:
+                    type: string
+                    enum: [waiting, predicting, done, failed]
+                  result:
+                    type: array
+                    items:
+                      type: object
+                  error:
+                    type: string
+                    example: "Job ID not found"
+      400:
+        description: Missing or too many job IDs.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "ids must be a comma separated list of job IDs"
+    """
+    job_ids = [job_id.strip() for job_id in request.args.get("ids", "").split(",") if job_id.strip()]
+    if not job_ids:
+        return jsonify({"error": "ids must be a comma separated list of job IDs"}), 400
+    if len(job_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} job IDs per request"}), 400
+
+    results = jobs.read_many(job_ids, job_response, lambda job_id: {"job_id": job_id, "error": "Job ID not found"})
+    return jsonify({"jobs": results})
+
+@app.route("/stream/<job_id>", methods=["GET"])
+@token_required
+def stream_result(job_id):
+    """
+    Stream provisional and final predictions for a job.
+    ---
+    tags:
+      - Prediction
+    summary: Follow a job with server-sent events.
+    description: >
+      Opens a `text/event-stream`. A `partial` event carrying the provisional best 3 countries is sent
+      when the stream opens and after every scored 30-country chunk, then a `done` event with the
+      same body as `/result/<job_id>`. An `error` event is sent if the job does not finish within MAX_STREAM_SECONDS.
+    produces:
+      - text/event-stream
+    parameters:
+      - name: job_id
+        in: path
+        required: true
+        type: string
+        description: The job ID returned by the `/predict` endpoint.
+    responses:
+      200:
+        description: >
+          Event stream, e.g.
+          `event: partial` / `data: {"job_id": "...", "status": "predicting", "chunks_evaluated": 1, "result": [...]}`
+      404:
+        description: Job not found or expired.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Job ID not found"
+    """
+    job = jobs.get(job_id)
+
+    if not job:
+        return jsonify({"error": "Job ID not found"}), 404
+
+    def event(name, data):
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    def generate():
+        deadline = time.time() + MAX_STREAM_SECONDS
+        sent = None
+        while True:
+            jobs.wait(job, min(15, max(0, deadline - time.time())), lambda job: job.chunks_evaluated != sent)
+            progress = jobs.read(job, lambda job: job_response(job) if job.status in FINISHED_STATUSES else {
+                "job_id": job.job_id,
+                "status": job.status,
+                "chunks_evaluated": job.chunks_evaluated,
+                "result": job.partial
+            })
+            if progress["status"] == "failed":
+                yield event("error", {"job_id": job_id, "error": progress["error"]})
+                return
+            if progress["status"] == "done":
+                final = progress
+                break
+            chunks_evaluated = progress["chunks_evaluated"]
 
-        if not job:
-            return jsonify({"error": "Job ID not found"}), 404
-        
-        return jsonify({
-            "job_id": job_id,
-            "status": job["status"],
-            "result": job["result"] if job["status"] == "done" else {}
-        })
+            if chunks_evaluated != sent:
+                sent = chunks_evaluated
+                yield event("partial", progress)
+            elif time.time() >= deadline:
+                yield event("error", {"job_id": job_id, "error": "Job did not finish in time"})
+                return
+            else:
+                # Comment line so proxies keep the connection open
+                yield ": keep-alive\n\n"
+        yield event("done", final)
+
+    return Response(generate(), mimetype="text/event-stream", headers={
+        "Cache-Control": "no-cache",
+        "X-Accel-Buffering": "no"
+    })
 
 @app.route("/status", methods=["GET"])
 def get_status():
@@ -310,6 +1247,261 @@ def get_status():
     """
     return jsonify({ "status": True })
 
+@app.route("/ready", methods=["GET"])
+def get_ready():
+    """
+    Get API readiness
+    ---
+    tags:
+      - Utility
+    summary: Get API readiness
+    description: >
+      Returns 200 once the model is loaded and the warm-up inferences have run, 503 before that.
+      `/status` reports the process is up; use this endpoint for readiness probes.
+    responses:
+      200:
+        description: Model loaded and warmed up.
+        schema:
+          type: object
+          properties:
+            ready:
+              type: boolean
+              example: true
+            state:
+              type: string
+              enum: [loading, warming_up, ready, failed]
+              example: "ready"
+            load_seconds:
+              type: number
+              format: float
+              example: 8.412
+            warm_up_seconds:
+              type: number
+              format: float
+              example: 1.937
+            error:
+              type: string
+              example: null
+      503:
+        description: Model still loading or warming up, or loading failed.
+    """
+    readiness = model_loader.snapshot()
+    return jsonify(readiness), 200 if readiness["ready"] else 503
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Get service metrics
+    ---
+    tags:
+      - Utility
+    summary: Get service metrics in the Prometheus text format
+    description: >
+      Returns the job queue depth, job counts by status, result cache hit counters, process RSS and
+      histograms of queue wait, tokenization, model forward time per batch, chunk scoring time and
+      end-to-end job time, in the Prometheus text exposition format.
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics, e.g. `job_queue_depth 3`
+    """
+    return Response(metrics.render(), content_type=metrics.content_type)
+
+@app.route("/concurrency", methods=["GET"])
+def get_concurrency():
+    """
+    Get the current concurrency decisions
+    ---
+    tags:
+      - Utility
+    summary: Get the current concurrency decisions
+    description: >
+      Returns the number of descriptions classified at once and the intra-op thread count picked by the
+      adaptive concurrency controller, with the throughput and latency measured over its last window.
+    responses:
+      200:
+        description: Concurrency decisions
+        schema:
+          type: object
+          properties:
+            adaptive:
+              type: boolean
+              example: true
+            limit:
+              type: integer
+              example: 14
+            in_progress:
+              type: integer
+              example: 9
+            threads:
+              type: integer
+              example: 4
+            thread_tuning:
+              type: string
+              enum: [probing, holding, "off"]
+              example: "holding"
+            throughput:
+              type: number
+              format: float
+              example: 3.2
+            latency:
+              type: number
+              format: float
+              example: 2.71
+    """
+    if concurrency_controller is None:
+        return jsonify({"adaptive": False, "limit": dispatcher.slots, "in_progress": dispatcher.in_progress()})
+    return jsonify(concurrency_controller.snapshot())
+
+@app.route("/admin/profile", methods=["POST"])
+@token_required
+@admin_required
+def start_profile():
+    """
+    Profile the next jobs
+    ---
+    tags:
+      - Admin
+    summary: Turn on profiling for the next N jobs
+    description: >
+      Requires the `X-Admin-Key` header to match ADMIN_API_KEY. The next `jobs` predictions are profiled
+      with a stack sampler over the job and inference threads (`sample`) or with cProfile on the job
+      threads (`cprofile`); fetch the aggregated profile from `GET /admin/profile`. Forward passes run
+      in INFERENCE_WORKERS processes are not sampled.
+    parameters:
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            jobs:
+              type: integer
+              example: 20
+            mode:
+              type: string
+              enum: [sample, cprofile]
+              example: "sample"
+            interval_ms:
+              type: number
+              example: 5
+    responses:
+      202:
+        description: Profiler armed.
+      400:
+        description: Invalid parameters.
+      403:
+        description: Admin endpoints disabled or wrong admin key.
+      409:
+        description: A profile is still being collected.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON structure"}), 400
+
+    count = data.get("jobs", 10)
+    mode = data.get("mode", "sample")
+    interval = data.get("interval_ms", 5)
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= 10000:
+        return jsonify({"error": "jobs must be an integer between 1 and 10000"}), 400
+    if mode not in PROFILE_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(PROFILE_MODES)}"}), 400
+    if not isinstance(interval, (int, float)) or isinstance(interval, bool) or not 1 <= interval <= 1000:
+        return jsonify({"error": "interval_ms must be a number between 1 and 1000"}), 400
+
+    if not profiler.start(count, mode, interval / 1000):
+        return jsonify({"error": "A profile is still being collected"}), 409
+    return jsonify({"status": "running", "mode": mode, "jobs_requested": count}), 202
+
+@app.route("/admin/profile", methods=["GET"])
+@token_required
+@admin_required
+def get_profile():
+    """
+    Get the aggregated profile
+    ---
+    tags:
+      - Admin
+    summary: Get the profile of the last profiled jobs
+    description: >
+      Requires the `X-Admin-Key` header to match ADMIN_API_KEY. Returns the profiler status and, once
+      the requested jobs are done, the hottest lines and collapsed stacks (`sample`) or the functions
+      by cumulative time (`cprofile`).
+    parameters:
+      - name: wait
+        in: query
+        required: false
+        type: number
+        description: Seconds to block until the profile is complete (capped by MAX_WAIT_SECONDS).
+    responses:
+      200:
+        description: Profiler status and profile.
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              enum: [idle, running, done]
+            jobs_requested:
+              type: integer
+            jobs_profiled:
+              type: integer
+            profile:
+              type: object
+      403:
+        description: Admin endpoints disabled or wrong admin key.
+    """
+    wait = wait_seconds()
+    if wait is None:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    return jsonify(profiler.result(wait))
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """
+    Get result cache statistics
+    ---
+    tags:
+      - Utility
+    summary: Get result cache statistics
+    description: >
+      Returns the size and the hit, miss and eviction counters of the result cache, and under `premise`
+      those of the cache of premise window logits.
+    responses:
+      200:
+        description: Cache statistics
+        schema:
+          type: object
+          properties:
+            entries:
+              type: integer
+              example: 120
+            max_entries:
+              type: integer
+              example: 10000
+            hits:
+              type: integer
+              example: 42
+            disk_hits:
+              type: integer
+              example: 3
+            misses:
+              type: integer
+              example: 120
+            evictions:
+              type: integer
+              example: 0
+            hit_rate:
+              type: number
+              format: float
+              example: 0.2593
+            premise:
+              type: object
+              description: The same statistics for the cache of premise window logits.
+    """
+    return jsonify({**result_cache.stats(), "premise": premise_cache.stats()})
+
 # ------------------------------------------------------------------------------ #
 # Graceful shutdown handling with manual timeout
 # ------------------------------------------------------------------------------ #
@@ -325,6 +1517,12 @@ def shutdown_handler(sig, frame):
         try:
             # Shut down prediction executor
             executor._threads.clear()  # Clear the threads in the pool
+            scheduler.stop(timeout=2)  # Let the in-flight batch finish
+            if worker_pool is not None:
+                worker_pool.close(timeout=2)
+            country_history.save()
+            result_cache.close()
+            jobs.close()
             # Manually wait for cleanup tasks
             cleanup_thread.join(timeout=5)  # Give cleanup thread 5 seconds to finish
             stop_event.set()  # Mark the event as done
@@ -0,0 +1,165 @@
+import os
+import math
+import time
+import threading
+
+
+# ------------------------------------------------------------------------------ #
+# Adaptive concurrency control
+# ------------------------------------------------------------------------------ #
+class ConcurrencyController:
+    """
+    Tune the number of concurrent inference slots and intra-op threads at runtime.
+
+    Every `interval` seconds the completions recorded in the window give a
+    throughput and a mean latency. The slot limit follows a gradient rule:
+    it is scaled by baseline latency / window latency (so it shrinks as
+    queueing inflates latency) plus a sqrt(limit) allowance to keep probing
+    upwards, and smoothed. The thread count hill-climbs on throughput, one
+    thread at a time, only in busy windows where the slot limit held steady;
+    once it has turned around three times it settles on the best count seen
+    and holds it for `hold` windows before probing again.
+    """
+
+    def __init__(self, set_limit, in_progress, limit, min_limit=1, max_limit=64,
+                 set_threads=None, threads=None, max_threads=None,
+                 interval=5.0, smoothing=0.2, tolerance=0.05, hold=12):
+        self.set_limit = set_limit
+        self.in_progress = in_progress
+        self.set_threads = set_threads
+        self.min_limit = max(1, int(min_limit))
+        self.max_limit = max(self.min_limit, int(max_limit))
+        self.max_threads = max(1, int(max_threads or os.cpu_count() or 1))
+        self.interval = float(interval)
+        self.smoothing = float(smoothing)
+        self.tolerance = float(tolerance)
+        self.hold = int(hold)
+
+        self.limit = float(min(self.max_limit, max(self.min_limit, limit)))
+        self.threads = min(self.max_threads, max(1, int(threads or self.max_threads))) if set_threads else None
+
+        self._lock = threading.Lock()
+        self._window_start = time.monotonic()
+        self._completed = 0
+        self._latency_sum = 0.0
+        self._peak_in_progress = 0
+        self._baseline = None
+        self._direction = -1 if self.threads == self.max_threads else 1
+        self._previous_throughput = None
+        self._reversals = 0
+        self._best = None
+        self._holding = 0
+        self._last = {"throughput": 0.0, "latency": None, "window_seconds": 0.0, "completed": 0}
+
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def record(self, latency, count=1):
+        """Count `count` completions that took `latency` seconds each; call it before their slots are released."""
+        in_progress = self.in_progress()
+        with self._lock:
+            self._completed += count
+            self._latency_sum += latency * count
+            self._peak_in_progress = max(self._peak_in_progress, in_progress)
+
+    def snapshot(self):
+        """Current decisions and the measurements of the last window."""
+        with self._lock:
+            return {
+                "adaptive": True,
+                "limit": int(self.limit),
+                "min_limit": self.min_limit,
+                "max_limit": self.max_limit,
+                "in_progress": self.in_progress(),
+                "threads": self.threads,
+                "max_threads": self.max_threads if self.set_threads else None,
+                "thread_tuning": "holding" if self._holding else ("probing" if self.set_threads else "off"),
+                "baseline_latency": self._baseline,
+                "interval_seconds": self.interval,
+                **self._last
+            }
+
+    def _loop(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self._adjust()
+            except Exception as e:
+                print(f"Concurrency controller failed: {e}")
+
+    def _adjust(self):
+        now = time.monotonic()
+        with self._lock:
+            elapsed = now - self._window_start
+            completed, latency_sum, peak = self._completed, self._latency_sum, self._peak_in_progress
+            self._window_start = now
+            self._completed = 0
+            self._latency_sum = 0.0
+            self._peak_in_progress = 0
+            if not completed:
+                # Idle window, nothing to learn from
+                self._last = {"throughput": 0.0, "latency": None, "window_seconds": elapsed, "completed": 0}
+                return
+
+            throughput = completed / elapsed
+            latency = latency_sum / completed
+            self._last = {"throughput": throughput, "latency": latency, "window_seconds": elapsed, "completed": completed}
+
+            # The baseline tracks the lowest latency seen and drifts up slowly so it can follow heavier inputs
+            self._baseline = latency if self._baseline is None else min(latency, self._baseline * 1.005)
+
+            previous_limit = int(self.limit)
+            if peak >= self.limit / 2:
+                # Only a limit that was actually reached says anything about the right size
+                gradient = max(0.5, min(1.0, self._baseline / latency))
+                target = self.limit * gradient + math.sqrt(self.limit)
+                self.limit = (1 - self.smoothing) * self.limit + self.smoothing * target
+                self.limit = min(self.max_limit, max(self.min_limit, self.limit))
+            limit = int(self.limit)
+            busy = peak >= limit
+
+            threads = None
+            if self.set_threads is not None:
+                threads = self._climb_threads(throughput, busy and abs(limit - previous_limit) <= 1)
+
+        if limit != previous_limit:
+            self.set_limit(limit)
+        if threads is not None:
+            self.set_threads(threads)
+
+    def _climb_threads(self, throughput, comparable):
+        """Return the thread count to try next, or None to keep the current one. Caller holds the lock."""
+        if self._holding:
+            self._holding -= 1
+            return None
+        if not comparable:
+            # Throughput was limited by arrivals or moved by the slot limit
+            self._previous_throughput = None
+            return None
+
+        if self._best is None or throughput > self._best[1]:
+            self._best = (self.threads, throughput)
+
+        if self._previous_throughput is not None and throughput < self._previous_throughput * (1 - self.tolerance):
+            self._direction = -self._direction
+            self._reversals += 1
+        self._previous_throughput = throughput
+
+        if self._reversals >= 3:
+            # Oscillating around the optimum, settle on the best count measured
+            threads = self._best[0]
+            self._reversals = 0
+            self._previous_throughput = None
+            self._best = None
+            self._holding = self.hold
+        else:
+            threads = self.threads + self._direction
+            if not 1 <= threads <= self.max_threads:
+                self._direction = -self._direction
+                threads = self.threads + self._direction
+            threads = min(self.max_threads, max(1, threads))
+
+        if threads == self.threads:
+            return None
+        self.threads = threads
+        return threads
@@ -0,0 +1,69 @@
+import os
+import json
+import time
+import threading
+
+
+# ------------------------------------------------------------------------------ #
+# Prediction history used as a prior for label ordering
+# ------------------------------------------------------------------------------ #
+class CountryHistory:
+    """
+    Decaying counters of recently predicted countries, persisted to a JSON file.
+
+    Counts halve every `half_life` seconds so the ordering follows recent
+    traffic. The file is rewritten at most every `save_interval` seconds.
+    """
+
+    def __init__(self, path, half_life=7 * 24 * 3600, save_interval=60):
+        self.path = path
+        self.half_life = half_life
+        self.save_interval = save_interval
+        self._lock = threading.Lock()
+        self._counts = {}
+        self._decayed_at = time.time()
+        self._saved_at = time.time()
+
+        if path and os.path.exists(path):
+            try:
+                with open(path, 'r', encoding='utf-8') as file:
+                    data = json.load(file)
+                self._counts = {country: float(count) for country, count in data.get("counts", {}).items()}
+                self._decayed_at = float(data.get("decayed_at", self._decayed_at))
+            except (OSError, ValueError) as e:
+                print(f"Ignoring unreadable country history {path}: {e}")
+
+    def record(self, country):
+        """Count one prediction of the country."""
+        with self._lock:
+            self._counts[country] = self._counts.get(country, 0.0) + 1.0
+            due = time.time() - self._saved_at >= self.save_interval
+        if due:
+            self.save()
+
+    def order(self, labels):
+        """Return the labels with the most recently predicted first (stable for ties)."""
+        with self._lock:
+            counts = dict(self._counts)
+        return sorted(labels, key=lambda label: -counts.get(label, 0.0))
+
+    def save(self):
+        """Decay the counters and write them to disk atomically."""
+        if not self.path:
+            return
+        with self._lock:
+            now = time.time()
+            factor = 0.5 ** ((now - self._decayed_at) / self.half_life)
+            self._counts = {country: count * factor for country, count in self._counts.items() if count * factor >= 0.01}
+            self._decayed_at = now
+            self._saved_at = now
+            data = {"decayed_at": now, "counts": self._counts}
+
+            try:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                temp_path = f"{self.path}.tmp"
+                with open(temp_path, 'w', encoding='utf-8') as file:
+                    json.dump(data, file, ensure_ascii=False)
+                os.replace(temp_path, self.path)
+            except OSError as e:
+                print(f"Failed to save country history {self.path}: {e}")
@@ -0,0 +1,57 @@
+import os
+import numpy as np
+import torch
+from transformers import AutoTokenizer, AutoModel
+
+
+# ------------------------------------------------------------------------------ #
+# Embedding shortlist for two-stage country finding
+# ------------------------------------------------------------------------------ #
+class CountryRetriever:
+    """
+    Shortlist countries by cosine similarity between the description and an
+    embedding index of country descriptors.
+
+    The index is a (countries x dims) NumPy matrix of L2-normalised sentence
+    embeddings. It is loaded from `index_path` when the file matches the
+    current descriptors, otherwise built at startup and written there.
+    """
+
+    def __init__(self, model_name, descriptors, index_path=None, cache_dir=None):
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name, cache_dir=cache_dir)
+        self.model = AutoModel.from_pretrained(model_name, cache_dir=cache_dir)
+        self.model.eval()
+        self.labels = list(descriptors)
+        self.index = self._load_or_build(index_path, [descriptors[label] for label in self.labels])
+
+    def _load_or_build(self, index_path, texts):
+        """Load the index from disk when it was built for the same labels, otherwise build and save it."""
+        if index_path and os.path.exists(index_path):
+            stored = np.load(index_path, allow_pickle=False)
+            if stored["labels"].tolist() == self.labels and stored["texts"].tolist() == texts:
+                return stored["index"]
+
+        index = np.concatenate([self.embed(texts[i:i + 64]) for i in range(0, len(texts), 64)])
+        if index_path:
+            os.makedirs(os.path.dirname(index_path) or ".", exist_ok=True)
+            with open(index_path, "wb") as file:
+                np.savez(file, labels=np.array(self.labels), texts=np.array(texts), index=index)
+        return index
+
+    def embed(self, texts):
+        """Mean-pool the last hidden state into L2-normalised float32 vectors."""
+        inputs = self.tokenizer(texts, padding=True, truncation=True, return_tensors="pt")
+        with torch.no_grad():
+            hidden = self.model(**inputs).last_hidden_state
+        mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+        pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+        pooled = torch.nn.functional.normalize(pooled, p=2, dim=1)
+        return pooled.numpy().astype(np.float32)
+
+    def shortlist(self, description, k):
+        """Return the `k` most similar countries as (country, similarity) pairs, best first."""
+        k = max(1, min(int(k), len(self.labels)))
+        similarities = self.index @ self.embed([description])[0]
+        top = np.argpartition(-similarities, k - 1)[:k]
+        top = top[np.argsort(-similarities[top])]
+        return [(self.labels[index], float(similarities[index])) for index in top]
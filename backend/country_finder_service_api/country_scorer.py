@@ -0,0 +1,143 @@
+import numpy as np
+from sentences import split_sentences
+from token_budget import sentence_windows, length_groups
+
+
+# ------------------------------------------------------------------------------ #
+# Country scoring engine
+# ------------------------------------------------------------------------------ #
+def entailment_index(model_config):
+    """Index of the entailment logit in the NLI model's output (-1, the last one, when it is not named)."""
+    return next(
+        (index for label, index in model_config.label2id.items() if label.lower().startswith("entail")), -1
+    )
+
+
+class CountryScorer:
+    """
+    Score a description against every country hypothesis of the NLI model.
+
+    The hypothesis side ("This example is <country>.") is tokenized once at
+    startup and the description is tokenized once per request, so building the
+    ~250 model inputs of a job is a list concatenation instead of ~250 calls to
+    the tokenizer. BART's encoder attends over premise and hypothesis jointly,
+    so each pair still needs its own forward pass; `forward` runs them as one
+    padded batch on the configured inference backend.
+
+    A long description can be split into premise windows of whole sentences;
+    every label is then paired with each window and its logits are averaged
+    over them with `mean_over_windows`.
+    """
+
+    def __init__(self, backend, tokenizer, labels, entailment_id, max_length, hypothesis_template="This example is {}."):
+        self.backend = backend
+        self.tokenizer = tokenizer
+        self.labels = list(labels)
+        self.entailment_id = entailment_id
+        self.label_index = {label: index for index, label in enumerate(self.labels)}
+        self.hypothesis_ids = [
+            tokenizer.encode(hypothesis_template.format(label), add_special_tokens=False)
+            for label in self.labels
+        ]
+
+        self.prefix_ids, self.separator_ids, self.suffix_ids = self._special_token_layout()
+
+        special_tokens = len(self.prefix_ids) + len(self.separator_ids) + len(self.suffix_ids)
+        longest_hypothesis = max(len(ids) for ids in self.hypothesis_ids)
+        self.max_premise_length = max_length - special_tokens - longest_hypothesis
+        self.pad_token_id = tokenizer.pad_token_id
+
+    def state(self):
+        """Pre-tokenized hypotheses and special-token layout, to rebuild the scorer with `from_state`."""
+        return {
+            "labels": self.labels,
+            "entailment_id": self.entailment_id,
+            "hypothesis_ids": self.hypothesis_ids,
+            "prefix_ids": self.prefix_ids,
+            "separator_ids": self.separator_ids,
+            "suffix_ids": self.suffix_ids,
+            "max_premise_length": self.max_premise_length,
+            "pad_token_id": self.pad_token_id
+        }
+
+    @classmethod
+    def from_state(cls, backend, tokenizer, state):
+        """Rebuild a scorer from `state()` without tokenizing the hypotheses again."""
+        scorer = cls.__new__(cls)
+        scorer.backend = backend
+        scorer.tokenizer = tokenizer
+        scorer.labels = list(state["labels"])
+        scorer.entailment_id = state["entailment_id"]
+        scorer.label_index = {label: index for index, label in enumerate(scorer.labels)}
+        scorer.hypothesis_ids = state["hypothesis_ids"]
+        scorer.prefix_ids = state["prefix_ids"]
+        scorer.separator_ids = state["separator_ids"]
+        scorer.suffix_ids = state["suffix_ids"]
+        scorer.max_premise_length = state["max_premise_length"]
+        scorer.pad_token_id = state["pad_token_id"]
+        return scorer
+
+    def _special_token_layout(self):
+        """Find the special tokens the tokenizer puts before, between and after a (premise, hypothesis) pair."""
+        premise = self.tokenizer.encode("premise", add_special_tokens=False)
+        hypothesis = self.tokenizer.encode("hypothesis", add_special_tokens=False)
+        full = self.tokenizer("premise", "hypothesis")["input_ids"]
+
+        for start in range(len(full)):
+            if full[start:start + len(premise)] != premise:
+                continue
+            for middle in range(start + len(premise), len(full)):
+                if full[middle:middle + len(hypothesis)] == hypothesis:
+                    return full[:start], full[start + len(premise):middle], full[middle + len(hypothesis):]
+        raise ValueError("Unable to detect the special token layout of the tokenizer")
+
+    def encode_premise(self, description, max_tokens=None, overlap=0, max_windows=1):
+        """
+        Tokenize the description once into premise windows so that every pair fits the model.
+
+        Each window holds at most `max_tokens` tokens (the model's limit by
+        default); with `max_windows` 1 the description is truncated to one.
+        Otherwise every sentence is tokenized with the whitespace before it,
+        so its ids do not depend on where it sits in the description, and the
+        windows are packed from whole sentences with `sentence_windows`.
+        """
+        size = min(max_tokens or self.max_premise_length, self.max_premise_length)
+        if max_windows <= 1:
+            return [self.tokenizer.encode(description, add_special_tokens=False, verbose=False)[:size]]
+
+        sentences = []
+        previous_end = 0
+        for _, end in split_sentences(description):
+            sentences.append(self.tokenizer.encode(
+                description[previous_end:end], add_special_tokens=False, verbose=False
+            ))
+            previous_end = end
+        return sentence_windows(sentences, size, overlap, max_windows)
+
+    def pairs(self, windows, labels=None):
+        """Build model input ids for every premise window against the given labels (all countries by default)."""
+        indices = range(len(self.labels)) if labels is None else [self.label_index[label] for label in labels]
+        heads = [self.prefix_ids + list(window[:self.max_premise_length]) + self.separator_ids for window in windows]
+        return [head + self.hypothesis_ids[index] + self.suffix_ids for index in indices for head in heads]
+
+    @staticmethod
+    def mean_over_windows(logits, windows):
+        """Average the logits of each label over the premise windows it was paired with."""
+        if len(windows) == 1:
+            return list(logits)
+        return np.asarray(logits, dtype=np.float64).reshape(-1, len(windows)).mean(axis=1).tolist()
+
+    def forward(self, batch):
+        """Pad each group of similar-length input id lists of a batch and return their entailment logits in order."""
+        logits = [None] * len(batch)
+        for group in length_groups([len(ids) for ids in batch]):
+            longest = max(len(batch[index]) for index in group)
+            input_ids = np.full((len(group), longest), self.pad_token_id, dtype=np.int64)
+            attention_mask = np.zeros((len(group), longest), dtype=np.int64)
+            for row, index in enumerate(group):
+                input_ids[row, :len(batch[index])] = batch[index]
+                attention_mask[row, :len(batch[index])] = 1
+
+            for index, value in zip(group, self.backend(input_ids, attention_mask)[:, self.entailment_id].tolist()):
+                logits[index] = value
+        return logits
@@ -0,0 +1,42 @@
+import os
+import argparse
+
+
+# ------------------------------------------------------------------------------ #
+# Hugging Face model setup
+# ------------------------------------------------------------------------------ #
+custom_cache = os.path.join(os.getcwd(), "hf_cache")
+os.environ["HF_HOME"] = custom_cache
+os.environ["TRANSFORMERS_CACHE"] = os.path.join(custom_cache, "models")
+
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from inference_backend import export_onnx
+
+
+MODEL_NAME = "valhalla/distilbart-mnli-12-1"
+
+# ------------------------------------------------------------------------------ #
+# One-shot ONNX export and int8 quantization for INFERENCE_BACKEND=onnx
+# ------------------------------------------------------------------------------ #
+def main():
+    parser = argparse.ArgumentParser(description="Export the country finder model to ONNX (fp32 and int8).")
+    parser.add_argument(
+        "--artifact-dir",
+        default=os.getenv("INFERENCE_ARTIFACT_DIR", os.path.join(custom_cache, "inference")),
+        help="Directory the app loads ONNX models from (INFERENCE_ARTIFACT_DIR)."
+    )
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, cache_dir="./hf_cache")
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME, cache_dir="./hf_cache")
+
+    sample = tokenizer(
+        ["A cold snowy place with high mountains and glaciers"] * 2,
+        ["This example is Norway.", "This example is Antigua and Barbuda."],
+        padding=True,
+        return_tensors="pt"
+    )
+    print("Wrote", *export_onnx(model, sample, args.artifact_dir))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+import json
+from collections import deque
+
+
+# ------------------------------------------------------------------------------ #
+# Gazetteer fast path
+# ------------------------------------------------------------------------------ #
+def _fold(text):
+    """Lowercase character by character so offsets in the folded text match the original."""
+    return "".join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+class Gazetteer:
+    """
+    Aho-Corasick matcher from place names (countries, demonyms, cities and
+    landmarks) to the countries they identify.
+
+    The automaton is compiled once, so a lookup is a single pass over the
+    description regardless of how many names are loaded. Names in `ambiguous`
+    (people, other places or things sharing the name, like "Florence" or
+    "Jordan") never answer a lookup on their own; they only point the model at
+    their countries through `mentioned`.
+    """
+
+    def __init__(self, places, ambiguous=()):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        self._countries = []
+        self._capitalized = []
+        self._ambiguous = []
+
+        ambiguous = set(ambiguous)
+        for name, countries in places.items():
+            self._add(_fold(name), frozenset(countries), name[:1].isupper(), name in ambiguous)
+        self._compile()
+
+    @classmethod
+    def from_files(cls, country_names_path, aliases_path, ambiguous_path=None):
+        """
+        Build the matcher from the country list, an alias file of `{"alias": country or [countries]}`
+        and an optional list of ambiguous names.
+        """
+        with open(country_names_path, 'r', encoding='utf-8') as file:
+            countries = json.load(file)
+        with open(aliases_path, 'r', encoding='utf-8') as file:
+            aliases = json.load(file)
+        ambiguous = []
+        if ambiguous_path is not None:
+            with open(ambiguous_path, 'r', encoding='utf-8') as file:
+                ambiguous = json.load(file)
+
+        places = {country: {country} for country in countries}
+        for alias, targets in aliases.items():
+            targets = [targets] if isinstance(targets, str) else targets
+            places.setdefault(alias, set()).update(targets)
+        return cls(places, ambiguous)
+
+    def _add(self, pattern, countries, capitalized, ambiguous):
+        node = 0
+        for ch in pattern:
+            if ch not in self._goto[node]:
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+                self._goto[node][ch] = len(self._goto) - 1
+            node = self._goto[node][ch]
+        self._countries.append(countries)
+        self._capitalized.append(capitalized)
+        self._ambiguous.append(ambiguous)
+        self._output[node].append((len(pattern), len(self._countries) - 1))
+
+    def _compile(self):
+        """Breadth-first pass that fills in failure links and merges their outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def find(self, text):
+        """
+        Return leftmost-longest whole-word matches as (start, end, countries, ambiguous), skipping
+        lowercase mentions of capitalized names.
+        """
+        folded = _fold(text)
+        matches = []
+        node = 0
+        for end, ch in enumerate(folded, start=1):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, pattern in self._output[node]:
+                start = end - length
+                if start > 0 and text[start - 1].isalnum():
+                    continue
+                if end < len(text) and text[end].isalnum():
+                    continue
+                # Place names are proper nouns; "turkey sandwich" is not Turkey
+                if self._capitalized[pattern] and not text[start].isupper():
+                    continue
+                matches.append((start, end, self._countries[pattern], self._ambiguous[pattern]))
+
+        matches.sort(key=lambda match: (match[0], match[0] - match[1]))
+        selected = []
+        covered = 0
+        for match in matches:
+            if match[0] >= covered:
+                selected.append(match)
+                covered = match[1]
+        return selected
+
+    def lookup(self, text):
+        """
+        Return the single country named by the text, or None when nothing or more than one country
+        matches. Ambiguous names are left out, so they alone never give an answer.
+        """
+        countries = set()
+        for _, _, matched, ambiguous in self.find(text):
+            if ambiguous:
+                continue
+            countries.update(matched)
+            if len(countries) > 1:
+                return None
+        return next(iter(countries)) if countries else None
+
+    def mentioned(self, text):
+        """Countries of every name in the text, ambiguous ones included, in order of first mention."""
+        countries = []
+        for _, _, matched, _ in self.find(text):
+            countries.extend(sorted(country for country in matched if country not in countries))
+        return countries
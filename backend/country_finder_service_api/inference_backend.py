@@ -0,0 +1,181 @@
+import os
+import inspect
+import numpy as np
+import torch
+
+
+# ------------------------------------------------------------------------------ #
+# Pluggable inference backends
+# ------------------------------------------------------------------------------ #
+# Selected with the INFERENCE_BACKEND environment variable
+INFERENCE_BACKENDS = ("torch", "torch_int8", "onnx")
+
+ONNX_MODEL_FILE = "model.onnx"
+ONNX_INT8_MODEL_FILE = "model_int8.onnx"
+
+
+class _LogitsOnly(torch.nn.Module):
+    """Wrap a sequence classification model so that it returns the logits tensor only."""
+
+    def __init__(self, model):
+        super().__init__()
+        self.model = model
+
+    def forward(self, input_ids, attention_mask):
+        return self.model(input_ids=input_ids, attention_mask=attention_mask).logits
+
+
+def quantize_int8(model):
+    """Dynamically quantize the Linear layers of the model to int8."""
+    return torch.ao.quantization.quantize_dynamic(model.eval(), {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class TorchBackend:
+    """Eager PyTorch forward pass on CPU."""
+
+    name = "torch"
+
+    def __init__(self, model):
+        self.model = model.eval()
+
+    def share(self):
+        """Move the weights to shared memory so forked workers map them instead of copying them."""
+        self.model.share_memory()
+
+    def threads(self):
+        """Current number of intra-op threads."""
+        return torch.get_num_threads()
+
+    def set_threads(self, threads):
+        """Set the number of intra-op threads, e.g. to split the cores between forked workers."""
+        torch.set_num_threads(threads)
+
+    def __call__(self, input_ids, attention_mask):
+        """Return the logits for a padded batch as a NumPy array."""
+        with torch.no_grad():
+            logits = self.model(
+                input_ids=torch.as_tensor(input_ids, dtype=torch.long),
+                attention_mask=torch.as_tensor(attention_mask, dtype=torch.long)
+            ).logits
+        return logits.float().numpy()
+
+
+class QuantizedTorchBackend(TorchBackend):
+    """PyTorch forward pass with the Linear layers dynamically quantized to int8 at startup."""
+
+    name = "torch_int8"
+
+    def __init__(self, model):
+        super().__init__(quantize_int8(model))
+
+
+class OnnxBackend:
+    """ONNX Runtime session over the model exported by `export_model.py`."""
+
+    name = "onnx"
+
+    def __init__(self, artifact_dir, quantized=True):
+        self._threads = 0
+        try:
+            import onnxruntime
+        except ImportError as e:
+            raise RuntimeError("INFERENCE_BACKEND=onnx requires the onnxruntime package") from e
+        self._onnxruntime = onnxruntime
+
+        path = os.path.join(artifact_dir, ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE)
+        if quantized and not os.path.exists(path):
+            path = os.path.join(artifact_dir, ONNX_MODEL_FILE)
+        if not os.path.exists(path):
+            raise RuntimeError(f"No ONNX model in {artifact_dir}, run `python export_model.py` first")
+
+        self.path = path
+        self.session = self._open()
+
+    def _open(self, threads=0):
+        onnxruntime = self._onnxruntime
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        return onnxruntime.InferenceSession(self.path, options, providers=["CPUExecutionProvider"])
+
+    def share(self):
+        """Nothing to share, the session's thread pool does not survive a fork."""
+
+    def threads(self):
+        """Configured number of intra-op threads (0 lets ONNX Runtime use every core)."""
+        return self._threads
+
+    def set_threads(self, threads):
+        """Open a new session with `threads` intra-op threads, also giving a forked worker a session of its own."""
+        self.session = self._open(threads)
+        self._threads = threads
+
+    def __call__(self, input_ids, attention_mask):
+        """Return the logits for a padded batch as a NumPy array."""
+        return self.session.run(["logits"], {
+            "input_ids": np.asarray(input_ids, dtype=np.int64),
+            "attention_mask": np.asarray(attention_mask, dtype=np.int64)
+        })[0]
+
+
+def load_backend(name, load_model, artifact_dir):
+    """Build the backend selected by name; `load_model` returns the fp32 torch model when one is needed."""
+    if name == "torch":
+        return TorchBackend(load_model())
+    if name == "torch_int8":
+        return QuantizedTorchBackend(load_model())
+    if name == "onnx":
+        return OnnxBackend(artifact_dir, quantized=os.getenv("INFERENCE_ONNX_QUANTIZED", "true").lower() == "true")
+    raise ValueError(f"Unknown INFERENCE_BACKEND '{name}', expected one of {', '.join(INFERENCE_BACKENDS)}")
+
+
+def load_mmapped(load):
+    """
+    Call `load()` with torch.load memory-mapping checkpoints instead of reading them into memory.
+
+    Needs a torch release with serialization config (2.5+) and a zip-format
+    checkpoint; otherwise the checkpoint is loaded the usual way.
+    """
+    try:
+        from torch.utils.serialization import config
+    except ImportError:
+        return load()
+
+    previous = config.load.mmap
+    config.load.mmap = True
+    try:
+        return load()
+    except RuntimeError as e:
+        # Legacy (non-zip) checkpoints cannot be memory-mapped
+        if "mmap" not in str(e):
+            raise
+    finally:
+        config.load.mmap = previous
+    return load()
+
+
+def export_onnx(model, sample_inputs, artifact_dir):
+    """Export the model to ONNX with dynamic batch and sequence axes, plus an int8-quantized copy."""
+    os.makedirs(artifact_dir, exist_ok=True)
+    path = os.path.join(artifact_dir, ONNX_MODEL_FILE)
+    # Newer torch releases default to the dynamo exporter, keep the tracing one
+    extra = {"dynamo": False} if "dynamo" in inspect.signature(torch.onnx.export).parameters else {}
+    torch.onnx.export(
+        _LogitsOnly(model.eval()),
+        (torch.as_tensor(sample_inputs["input_ids"]), torch.as_tensor(sample_inputs["attention_mask"])),
+        path,
+        input_names=["input_ids", "attention_mask"],
+        output_names=["logits"],
+        dynamic_axes={
+            "input_ids": {0: "batch", 1: "sequence"},
+            "attention_mask": {0: "batch", 1: "sequence"},
+            "logits": {0: "batch"}
+        },
+        opset_version=17,
+        **extra
+    )
+
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    int8_path = os.path.join(artifact_dir, ONNX_INT8_MODEL_FILE)
+    quantize_dynamic(path, int8_path, weight_type=QuantType.QInt8)
+    return path, int8_path
@@ -0,0 +1,169 @@
+import os
+import threading
+
+
+# ------------------------------------------------------------------------------ #
+# Prometheus text exposition
+# ------------------------------------------------------------------------------ #
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'))
+        for name, value in labels
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Histogram:
+    """Cumulative bucket counts, sum and count of observations, per label set."""
+
+    def __init__(self, registry, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.label_names)
+        if self.registry.buffer is not None:
+            # Inside a worker process, shipped to the parent with the batch output
+            self.registry.buffer.append((self.name, key, value))
+            return
+        self._add(key, value)
+
+    def _add(self, key, value):
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][index] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = sorted(self._series.items())
+            series = [(key, (list(counts), total, count)) for key, (counts, total, count) in series]
+        for key, (counts, total, count) in series:
+            labels = list(zip(self.label_names, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_format_labels(labels + [('le', _format_value(bound))])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {count}")
+        return lines
+
+
+class Gauge:
+    """Value read at scrape time from `read()`, which returns a number or a {label values: number} dict."""
+
+    def __init__(self, name, help, read, labels=(), kind="gauge"):
+        self.name = name
+        self.help = help
+        self.read = read
+        self.label_names = tuple(labels)
+        self.kind = kind
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        value = self.read()
+        if not isinstance(value, dict):
+            value = {(): value}
+        for key, sample in sorted(value.items(), key=lambda item: str(item[0])):
+            key = key if isinstance(key, tuple) else (key,)
+            lines.append(f"{self.name}{_format_labels(list(zip(self.label_names, key)))} {_format_value(sample)}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Metrics of one service, rendered in the Prometheus text format by `render()`.
+
+    Histograms are updated as work happens; gauges and counters kept
+    elsewhere (job store, result cache) are read when scraped.
+    """
+
+    content_type = "text/plain; version=0.0.4; charset=utf-8"
+
+    def __init__(self):
+        self._metrics = []
+        self._histograms = {}
+        # Set to a list in forked inference workers, see `replay`
+        self.buffer = None
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        histogram = Histogram(self, name, help, labels, buckets)
+        self._metrics.append(histogram)
+        self._histograms[name] = histogram
+        return histogram
+
+    def gauge(self, name, help, read, labels=()):
+        self._metrics.append(Gauge(name, help, read, labels))
+
+    def counter(self, name, help, read, labels=()):
+        self._metrics.append(Gauge(name, help, read, labels, kind="counter"))
+
+    def drain(self):
+        """Take the observations buffered in a worker process."""
+        observations, self.buffer = self.buffer, []
+        return observations
+
+    def replay(self, observations):
+        """Apply observations made in a worker process."""
+        for name, key, value in observations:
+            self._histograms[name]._add(key, value)
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {e}")
+        return "\n".join(lines) + "\n"
+
+
+def resident_memory_bytes():
+    """Resident set size of this process, from /proc on Linux or the peak from getrusage elsewhere."""
+    try:
+        with open("/proc/self/statm", "r") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+def register_service_metrics(registry, jobs, scheduler, result_cache):
+    """Gauges and counters every inference service exposes: queues, jobs by status, result cache and memory."""
+    def cache_hits():
+        stats = result_cache.stats()
+        return {"memory": stats["hits"] - stats["disk_hits"], "disk": stats["disk_hits"]}
+
+    registry.gauge("job_queue_depth", "Distinct texts queued or being processed in the job store.", jobs.queue_depth)
+    registry.gauge("inference_pending_items", "Items waiting in this process for a model batch.", scheduler.pending_items)
+    registry.gauge("jobs", "Job records in the job store by status.", jobs.status_counts, labels=("status",))
+    registry.counter("result_cache_hits_total", "Result cache hits by tier.", cache_hits, labels=("tier",))
+    registry.counter("result_cache_misses_total", "Result cache misses.", lambda: result_cache.stats()["misses"])
+    registry.gauge("result_cache_hit_ratio", "Hits over lookups of the result cache.", lambda: result_cache.stats()["hit_rate"])
+    registry.gauge("result_cache_entries", "Results kept in the in-memory cache tier.", lambda: result_cache.stats()["entries"])
+    registry.gauge("process_resident_memory_bytes", "Resident memory size in bytes.", resident_memory_bytes)
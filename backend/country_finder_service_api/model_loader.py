@@ -0,0 +1,74 @@
+import time
+import threading
+
+
+# ------------------------------------------------------------------------------ #
+# Background model loading and warm-up
+# ------------------------------------------------------------------------------ #
+class ModelLoader:
+    """
+    Load the model on a background thread so the HTTP server can bind straight away.
+
+    `load()` builds the model and everything that depends on it; `warm_up()`
+    then runs a few inferences so the first real request does not pay for
+    lazy initialization and allocation of the inference path, and
+    `on_ready()` starts taking work. The loader is ready once all three have
+    finished; a failure leaves it in the "failed" state with the error, and
+    the service keeps answering without a model.
+    """
+
+    def __init__(self, load, warm_up=None, on_ready=None):
+        self._load = load
+        self._warm_up = warm_up
+        self._on_ready = on_ready
+        self._ready = threading.Event()
+        self._lock = threading.Lock()
+        self.state = "idle"
+        self.error = None
+        self.load_seconds = None
+        self.warm_up_seconds = None
+        self._thread = threading.Thread(target=self._run, name="model-loader", daemon=True)
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    def start(self):
+        with self._lock:
+            self.state = "loading"
+        self._thread.start()
+
+    def snapshot(self):
+        """Readiness with the loading state and the time each phase took."""
+        with self._lock:
+            return {
+                "ready": self.ready,
+                "state": self.state,
+                "load_seconds": self.load_seconds,
+                "warm_up_seconds": self.warm_up_seconds,
+                "error": self.error
+            }
+
+    def _run(self):
+        try:
+            started = time.perf_counter()
+            self._load()
+            with self._lock:
+                self.load_seconds = round(time.perf_counter() - started, 3)
+                self.state = "warming_up"
+
+            started = time.perf_counter()
+            if self._warm_up is not None:
+                self._warm_up()
+            if self._on_ready is not None:
+                self._on_ready()
+            with self._lock:
+                self.warm_up_seconds = round(time.perf_counter() - started, 3)
+                self.state = "ready"
+            self._ready.set()
+            print(f"Model ready (loaded in {self.load_seconds}s, warmed up in {self.warm_up_seconds}s)")
+        except Exception as e:
+            with self._lock:
+                self.state = "failed"
+                self.error = f"{type(e).__name__}: {e}"
+            print(f"Model loading failed: {self.error}")
@@ -0,0 +1,72 @@
+import os
+import json
+import time
+import shutil
+
+
+# ------------------------------------------------------------------------------ #
+# Ready-to-load model snapshots
+#
+# A snapshot directory holds the weights as safetensors (memory-mapped when
+# loaded), the tokenizer files, the model config and any service state written
+# as JSON, so a restart loads local files instead of resolving the Hugging Face
+# cache and rebuilding everything. The manifest is written last and names the
+# model, so a half-written snapshot or one of another model is never used.
+# ------------------------------------------------------------------------------ #
+SNAPSHOT_MANIFEST = "snapshot.json"
+SNAPSHOT_FORMAT = 1
+
+
+def save_snapshot(snapshot_dir, model_name, model, tokenizer, files=None):
+    """Write the model, tokenizer and `files` ({file name: JSON-serializable object}) to a fresh snapshot."""
+    staging = snapshot_dir.rstrip("/\\") + ".tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    model.save_pretrained(os.path.join(staging, "model"), safe_serialization=True)
+    tokenizer.save_pretrained(os.path.join(staging, "tokenizer"))
+    for name, content in (files or {}).items():
+        with open(os.path.join(staging, name), 'w', encoding='utf-8') as file:
+            json.dump(content, file)
+    with open(os.path.join(staging, SNAPSHOT_MANIFEST), 'w', encoding='utf-8') as file:
+        json.dump({"format": SNAPSHOT_FORMAT, "model": model_name, "created": time.time()}, file)
+
+    shutil.rmtree(snapshot_dir, ignore_errors=True)
+    os.replace(staging, snapshot_dir)
+    return snapshot_dir
+
+
+def find_snapshot(snapshot_dir, model_name):
+    """Return the manifest of a complete snapshot of `model_name` in `snapshot_dir`, or None."""
+    try:
+        with open(os.path.join(snapshot_dir, SNAPSHOT_MANIFEST), 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("format") != SNAPSHOT_FORMAT or manifest.get("model") != model_name:
+        print(f"Ignoring model snapshot in {snapshot_dir}: written for {manifest.get('model')}")
+        return None
+    return manifest
+
+
+def read_snapshot_file(snapshot_dir, name):
+    """Load a JSON file written with the snapshot, or None when it has none."""
+    try:
+        with open(os.path.join(snapshot_dir, name), 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except FileNotFoundError:
+        return None
+
+
+def load_snapshot_tokenizer(snapshot_dir):
+    """The tokenizer saved with the snapshot."""
+    from transformers import AutoTokenizer
+    return AutoTokenizer.from_pretrained(os.path.join(snapshot_dir, "tokenizer"))
+
+
+def load_snapshot_model(snapshot_dir):
+    """The sequence classification model of the snapshot, with its safetensors weights memory-mapped."""
+    from transformers import AutoModelForSequenceClassification
+    return AutoModelForSequenceClassification.from_pretrained(
+        os.path.join(snapshot_dir, "model"), low_cpu_mem_usage=True
+    )
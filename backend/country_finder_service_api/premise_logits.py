@@ -0,0 +1,77 @@
+from concurrent.futures import Future
+from result_cache import content_key
+
+
+# ------------------------------------------------------------------------------ #
+# Premise-level reuse of entailment logits
+# ------------------------------------------------------------------------------ #
+class PremiseLogits:
+    """
+    Entailment logits of a description's premise windows against the labels of a scorer.
+
+    The logits of each window are kept in `cache` by the window's token ids,
+    one {label: logit} entry per window, so a description sharing
+    windows with one scored before (such as an edited post) only pairs its new
+    windows, and labels not yet scored against a window, with the model.
+    """
+
+    def __init__(self, scorer, windows, cache, version, submit):
+        self.scorer = scorer
+        self.windows = windows
+        self.cache = cache
+        self.submit = submit
+        self.keys = [content_key(" ".join(str(token) for token in window), version) for window in windows]
+        # Copies, the memory tier hands out the cached objects themselves
+        self.known = [dict(cache.get(key) or {}) for key in self.keys]
+        self.pairs_scored = 0
+
+    def logits(self, labels):
+        """
+        Return a Future of the logits of `labels` averaged over the windows.
+
+        Only the (window, label) pairs without a known logit are queued;
+        cancelling the Future cancels them when they have not started.
+        """
+        missing = [
+            (label, position) for label in labels
+            for position in range(len(self.windows)) if label not in self.known[position]
+        ]
+        future = Future()
+        if not missing:
+            future.set_result(self._mean(labels))
+            return future
+
+        self.pairs_scored += len(missing)
+        scored = self.submit([
+            self.scorer.pairs([self.windows[position]], [label])[0] for label, position in missing
+        ])
+        future.add_done_callback(lambda future: future.cancelled() and scored.cancel())
+
+        def collect(scored):
+            if scored.cancelled():
+                future.cancel()
+                return
+            if not future.set_running_or_notify_cancel():
+                return
+            if scored.exception() is not None:
+                future.set_exception(scored.exception())
+                return
+            for (label, position), logit in zip(missing, scored.result()):
+                self.known[position][label] = logit
+            future.set_result(self._mean(labels))
+
+        scored.add_done_callback(collect)
+        return future
+
+    def _mean(self, labels):
+        return self.scorer.mean_over_windows(
+            [self.known[position][label] for label in labels for position in range(len(self.windows))],
+            self.windows
+        )
+
+    def save(self):
+        """Write the logits of every window back to the cache and return them as {key: {label: logit}}."""
+        segments = {key: dict(logits) for key, logits in zip(self.keys, self.known)}
+        for key, logits in segments.items():
+            self.cache.put(key, logits)
+        return segments
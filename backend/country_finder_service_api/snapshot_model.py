@@ -0,0 +1,52 @@
+import os
+import json
+import argparse
+
+
+# ------------------------------------------------------------------------------ #
+# Hugging Face model setup
+# ------------------------------------------------------------------------------ #
+custom_cache = os.path.join(os.getcwd(), "hf_cache")
+os.environ["HF_HOME"] = custom_cache
+os.environ["TRANSFORMERS_CACHE"] = os.path.join(custom_cache, "models")
+
+from transformers import AutoTokenizer, AutoModelForSequenceClassification
+from country_scorer import CountryScorer, entailment_index
+from model_snapshot import save_snapshot
+
+
+MODEL_NAME = "valhalla/distilbart-mnli-12-1"
+
+# ------------------------------------------------------------------------------ #
+# Ready-to-load snapshot for fast restarts (MODEL_SNAPSHOT_DIR)
+# ------------------------------------------------------------------------------ #
+def main():
+    parser = argparse.ArgumentParser(
+        description="Snapshot the country finder model, tokenizer and pre-tokenized hypotheses for fast startup."
+    )
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.getenv("MODEL_SNAPSHOT_DIR", os.path.join(custom_cache, "snapshot")),
+        help="Directory the app loads the snapshot from (MODEL_SNAPSHOT_DIR)."
+    )
+    args = parser.parse_args()
+
+    tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME, cache_dir="./hf_cache")
+    model = AutoModelForSequenceClassification.from_pretrained(MODEL_NAME, cache_dir="./hf_cache")
+    entailment_id = entailment_index(model.config)
+    max_length = min(tokenizer.model_max_length, model.config.max_position_embeddings)
+
+    with open('country_names.json', 'r', encoding='utf-8') as file:
+        all_countries = json.load(file)
+    with open('country_regions.json', 'r', encoding='utf-8') as file:
+        country_regions = json.load(file)
+
+    # The hypotheses of both the countries and the regions (hierarchical mode), tokenized once here
+    scorers = {
+        "countries": CountryScorer(None, tokenizer, all_countries, entailment_id, max_length).state(),
+        "regions": CountryScorer(None, tokenizer, list(country_regions), entailment_id, max_length).state()
+    }
+    print("Wrote", save_snapshot(args.snapshot_dir, MODEL_NAME, model, tokenizer, {"scorers.json": scorers}))
+
+if __name__ == "__main__":
+    main()
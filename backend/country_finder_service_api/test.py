@@ -21,13 +21,15 @@ def submit_job(description):
     return response.json() if response.status_code == 200 else None
 
 def poll_result(job_id, timeout=60):
-    for _ in range(timeout):
-        res = requests.get(f"{RESULT_ENDPOINT}/{job_id}")
-        if res.status_code == 200:
-            data = res.json()
-            if data['status'] == 'done':
-                return data['result']
-        time.sleep(1)
+    # Long-poll, the API answers as soon as the job is done
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        res = requests.get(f"{RESULT_ENDPOINT}/{job_id}", params={"wait": min(30, deadline - time.time())})
+        if res.status_code != 200:
+            break
+        data = res.json()
+        if data['status'] == 'done':
+            return data['result']
     return None
 
 # Function to run the test cases
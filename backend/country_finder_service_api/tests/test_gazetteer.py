@@ -0,0 +1,56 @@
+import os
+from gazetteer import Gazetteer
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def shipped_gazetteer():
+    return Gazetteer.from_files(
+        os.path.join(SERVICE_DIR, 'country_names.json'),
+        os.path.join(SERVICE_DIR, 'country_aliases.json'),
+        os.path.join(SERVICE_DIR, 'country_ambiguous_names.json')
+    )
+
+
+def test_unambiguous_names_answer():
+    gazetteer = shipped_gazetteer()
+    assert gazetteer.lookup("Sunrise over Angkor Wat") == "Cambodia"
+    assert gazetteer.lookup("Two weeks hiking in Norway") == "Norway"
+
+
+def test_ambiguous_names_do_not_answer():
+    gazetteer = shipped_gazetteer()
+    assert gazetteer.lookup("My friend Florence visited") is None
+    assert gazetteer.lookup("Michael Jordan played here") is None
+    assert gazetteer.lookup("We flew into Perth and drove north") is None
+
+
+def test_ambiguous_names_are_mentioned():
+    gazetteer = shipped_gazetteer()
+    assert gazetteer.mentioned("Gelato in Florence") == ["Italy"]
+    # An unambiguous name still answers next to an ambiguous one
+    assert gazetteer.lookup("From Florence we took the train to Rome") == "Italy"
+
+
+def test_lowercase_mentions_of_capitalized_names_are_skipped():
+    gazetteer = Gazetteer({"Turkey": ["Turkey"], "weSwatini": ["Eswatini"]})
+    assert gazetteer.lookup("a turkey sandwich") is None
+    assert gazetteer.lookup("Turkey in spring") == "Turkey"
+
+
+def test_lowercase_initial_names_match():
+    gazetteer = Gazetteer({"weSwatini": ["Eswatini"], "the Abode of Peace": ["Brunei"]})
+    assert gazetteer.lookup("Days in weSwatini") == "Eswatini"
+    assert gazetteer.lookup("Known as the Abode of Peace") == "Brunei"
+
+
+def test_places_named_after_other_countries_do_not_answer_for_them():
+    gazetteer = shipped_gazetteer()
+    assert gazetteer.lookup("Road trip through New Mexico") == "United States"
+    assert gazetteer.lookup("Trip to New England") == "United States"
+    assert gazetteer.lookup("New South Wales beaches") == "Australia"
+    assert gazetteer.lookup("Hiking in New Guinea") is None
+    assert gazetteer.lookup("Holland, Michigan") is None
+    # The full names still answer
+    assert gazetteer.lookup("Hiking in Papua New Guinea") == "Papua New Guinea"
+    assert gazetteer.lookup("Tacos in Mexico City") == "Mexico"
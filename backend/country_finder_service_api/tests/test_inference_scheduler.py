@@ -0,0 +1,57 @@
+import threading
+import pytest
+from inference_scheduler import InferenceScheduler
+
+
+def hold(scheduler):
+    """Submit an item whose batch blocks the worker until released, once it is running."""
+    started = threading.Event()
+    future = scheduler.submit(["a"], on_start=started.set)
+    started.wait(timeout=5)
+    return future
+
+
+@pytest.fixture
+def open_scheduler():
+    opened = []
+
+    def open_scheduler(**options):
+        batches = []
+        release = threading.Event()
+
+        def run_batch(batch):
+            # Hold the first batch until everything is queued, so the rest are formed from a full queue
+            release.wait()
+            batches.append(list(batch))
+            return [len(item) for item in batch]
+
+        scheduler = InferenceScheduler(run_batch, max_wait=0, **options)
+        opened.append(scheduler)
+        return scheduler, batches, release
+
+    yield open_scheduler
+    for scheduler in opened:
+        scheduler.stop(timeout=5)
+
+
+def test_batches_are_capped_by_padded_tokens(open_scheduler):
+    scheduler, batches, release = open_scheduler(max_batch_size=8, max_batch_tokens=12)
+    first = hold(scheduler)
+    futures = [scheduler.submit(["bb", "bb", "bbbb", "bbbbbb", "b" * 20, "c"])]
+    release.set()
+
+    assert first.result(timeout=5) == [1]
+    assert futures[0].result(timeout=5) == [2, 2, 4, 6, 20, 1]
+    # Three 4-token items would take 12 padded tokens, a fourth at 6 tokens would take 24
+    assert batches[1:] == [["bb", "bb", "bbbb"], ["bbbbbb"], ["b" * 20], ["c"]]
+
+
+def test_batches_are_capped_by_size_without_a_token_limit(open_scheduler):
+    scheduler, batches, release = open_scheduler(max_batch_size=2)
+    first = hold(scheduler)
+    future = scheduler.submit(["b" * 100] * 5)
+    release.set()
+
+    assert first.result(timeout=5) == [1]
+    assert future.result(timeout=5) == [100] * 5
+    assert [len(batch) for batch in batches[1:]] == [2, 2, 1]
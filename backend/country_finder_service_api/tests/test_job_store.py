@@ -0,0 +1,282 @@
+import time
+import threading
+import pytest
+from job_store import MemoryJobStore, RedisJobStore, SqliteJobStore, WorkDispatcher
+
+
+@pytest.fixture(params=["memory", "sqlite", "redis"])
+def open_store(request, tmp_path):
+    """Factory for a fresh store of each kind; Redis runs against fakeredis when it is installed."""
+    opened = []
+
+    def open_store(ttl=60, lease=120, stale=3600):
+        if request.param == "memory":
+            store = MemoryJobStore(ttl=ttl, stale=stale)
+        elif request.param == "sqlite":
+            store = SqliteJobStore(
+                str(tmp_path / f"jobs{len(opened)}.db"), ttl=ttl, lease=lease, poll_interval=0.01, stale=stale
+            )
+        else:
+            fakeredis = pytest.importorskip("fakeredis")
+            store = RedisJobStore(
+                "redis://", ttl=ttl, lease=lease, poll_interval=0.01, client=fakeredis.FakeRedis(), stale=stale
+            )
+        opened.append(store)
+        return store
+
+    yield open_store
+    for store in opened:
+        store.close()
+
+
+@pytest.fixture
+def store(open_store):
+    return open_store()
+
+
+def test_jobs_share_the_computation_of_their_text(store):
+    first = store.create()
+    second = store.create()
+    other = store.create()
+    assert store.join("key", first.job_id, "text") is None
+    assert store.join("key", second.job_id, "text") == first.job_id
+    assert store.join("other", other.job_id, "other text") is None
+    assert store.in_flight("key")
+    assert store.queue_depth() == 2
+    assert store.outstanding() == 3
+
+    assert store.claim(limit=5) == [("key", "text"), ("other", "other text")]
+    assert store.claim(limit=5, timeout=0) == []
+    assert store.attached("key") == [first.job_id, second.job_id]
+
+    assert store.complete("key") == [first.job_id, second.job_id]
+    for job_id in (first.job_id, second.job_id):
+        store.finish(job_id, result=["A"])
+    assert not store.in_flight("key")
+    assert store.queue_depth() == 1
+    assert store.outstanding() == 1
+    assert store.get(first.job_id).result == ["A"]
+    assert store.wait(second, timeout=1) and second.status == "done"
+    assert store.status_counts() == {"done": 2, "waiting": 1}
+    assert len(store) == 3
+
+
+def test_claim_respects_the_limit_and_queue_order(store):
+    for index in range(3):
+        store.join(f"key{index}", store.create().job_id, f"text{index}")
+
+    assert store.claim(limit=2) == [("key0", "text0"), ("key1", "text1")]
+    assert store.claim(limit=2) == [("key2", "text2")]
+
+
+def test_wait_times_out_on_an_unfinished_job(store):
+    job = store.create()
+    store.update(job.job_id, status="predicting")
+
+    assert not store.wait(job, timeout=0.05)
+    assert store.wait(job, timeout=1, predicate=lambda job: job.status == "predicting")
+
+
+def test_finished_jobs_expire_after_the_ttl(open_store):
+    store = open_store(ttl=0)
+    finished = store.create()
+    running = store.create()
+    store.finish(finished.job_id)
+
+    time.sleep(0.01)
+    assert store.evict_expired() == 1
+    assert store.get(finished.job_id) is None
+    assert store.get(running.job_id) is not None
+
+
+def test_stale_jobs_are_not_outstanding_and_get_evicted(open_store):
+    store = open_store(stale=0.05)
+    lost = store.create()
+    store.join("key", lost.job_id, "text")
+    assert store.outstanding() == 1
+
+    time.sleep(0.1)
+    fresh = store.create()
+    assert store.outstanding() == 1
+    store.evict_expired()
+    assert store.get(lost.job_id) is None
+    assert store.get(fresh.job_id) is not None
+
+    # A computation finishing after its jobs were given up does not bring them back
+    assert store.complete("key") == [lost.job_id]
+    assert store.outstanding() == 1
+
+
+def test_finished_jobs_never_go_stale(open_store):
+    store = open_store(stale=0.05)
+    job = store.create()
+    store.finish(job.job_id)
+
+    time.sleep(0.1)
+    store.evict_expired()
+    assert store.get(job.job_id).status == "done"
+    assert store.outstanding() == 0
+
+
+def test_evict_oldest_drops_stale_jobs_then_finished_ones_but_not_running_ones(open_store):
+    store = open_store(stale=0.05)
+    stale = store.create()
+    time.sleep(0.1)
+    oldest = store.create(status="done", timestamp=time.time())
+    newest = store.create(status="done", timestamp=time.time() + 1)
+    running = store.create()
+
+    assert store.evict_oldest(2) == 2
+    assert store.get(stale.job_id) is None
+    assert store.get(oldest.job_id) is None
+    assert store.get(newest.job_id) is not None
+
+    assert store.evict_oldest(5) == 1
+    assert store.get(running.job_id) is not None
+    assert len(store) == 1
+
+
+def test_shared_stores_hand_out_work_again_after_the_lease(open_store):
+    store = open_store(lease=0.05)
+    if not store.shared:
+        pytest.skip("only shared stores lease claimed work")
+    store.join("key", store.create().job_id, "text")
+
+    assert store.claim() == [("key", "text")]
+    assert store.claim(timeout=0) == []
+    time.sleep(0.1)
+    assert store.claim() == [("key", "text")]
+
+    store.complete("key")
+    time.sleep(0.1)
+    assert store.claim(timeout=0) == []
+
+
+def test_failure_finishes_every_coalesced_job(store):
+    first = store.create()
+    second = store.create()
+    assert store.join("key", first.job_id, "text") is None
+    assert store.join("key", second.job_id, "text") == first.job_id
+    assert store.claim() == [("key", "text")]
+
+    assert sorted(store.fail("key", "Prediction failed: boom")) == sorted([first.job_id, second.job_id])
+
+    for job in (first, second):
+        assert store.wait(job, timeout=1)
+        current = store.get(job.job_id)
+        assert current.status == "failed"
+        assert current.error == "Prediction failed: boom"
+    assert store.attached("key") == []
+    assert store.outstanding() == 0
+    assert store.status_counts().get("failed") == 2
+
+
+def test_failed_jobs_expire(open_store):
+    store = open_store(ttl=0)
+    job = store.create()
+    store.join("key", job.job_id, "text")
+    store.claim()
+    store.fail("key", "boom")
+
+    time.sleep(0.01)
+    store.evict_expired()
+    assert store.get(job.job_id) is None
+
+
+def test_dispatcher_hands_claimed_work_to_the_handler_within_its_slots():
+    store = MemoryJobStore()
+    handled = []
+    running = threading.Semaphore(0)
+
+    def handle(claimed):
+        handled.extend(claimed)
+        for _ in claimed:
+            running.release()
+
+    dispatcher = WorkDispatcher(store, handle, slots=2, batch_size=2, poll_interval=0.01).start()
+    for index in range(3):
+        store.join(f"key{index}", store.create().job_id, f"text{index}")
+
+    for _ in range(2):
+        assert running.acquire(timeout=1)
+    assert not running.acquire(timeout=0.1)
+    assert dispatcher.in_progress() == 2
+    assert [cache_key for cache_key, _ in handled] == ["key0", "key1"]
+
+    dispatcher.done(1)
+    assert running.acquire(timeout=1)
+    assert handled[-1] == ("key2", "text2")
+
+
+def test_dispatcher_resize_changes_the_work_in_progress():
+    store = MemoryJobStore()
+    started = threading.Semaphore(0)
+    dispatcher = WorkDispatcher(
+        store, lambda claimed: [started.release() for _ in claimed], slots=1, poll_interval=0.01
+    ).start()
+    for index in range(3):
+        store.join(f"key{index}", store.create().job_id, f"text{index}")
+
+    assert started.acquire(timeout=1)
+    assert not started.acquire(timeout=0.1)
+    dispatcher.resize(3)
+    assert started.acquire(timeout=1) and started.acquire(timeout=1)
+    assert dispatcher.in_progress() == 3
+
+
+def test_dispatcher_returns_the_slots_of_work_it_failed_to_start():
+    store = MemoryJobStore()
+    attempts = []
+
+    def handle(claimed):
+        attempts.append(claimed)
+        raise RuntimeError("no worker")
+
+    WorkDispatcher(store, handle, slots=1, poll_interval=0.01).start()
+    store.join("key", store.create().job_id, "text")
+    store.join("other", store.create().job_id, "other text")
+
+    deadline = time.monotonic() + 1
+    while len(attempts) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    # With one slot, the second text is only claimed once the first one's slot was given back
+    assert [claimed[0][0] for claimed in attempts] == ["key", "other"]
+
+
+def test_claiming_completed_work_leaves_nothing_claimed(open_store):
+    store = open_store(lease=0.05)
+    if not store.shared:
+        pytest.skip("only shared stores lease claimed work")
+    store.join("first", store.create().job_id, "first text")
+    store.join("second", store.create().job_id, "second text")
+    assert len(store.claim(limit=2)) == 2
+
+    # Both leases run out and are queued again, then the first worker completes the one still queued
+    time.sleep(0.1)
+    (cache_key, _), = store.claim(timeout=0)
+    requeued = "second" if cache_key == "first" else "first"
+    store.complete(requeued)
+    assert store.claim(timeout=0) == []
+    store.complete(cache_key)
+
+    assert store.queue_depth() == 0
+
+
+def test_updates_do_not_bring_back_evicted_jobs(open_store):
+    store = open_store(ttl=0)
+    job = store.create()
+    store.finish(job.job_id)
+    time.sleep(0.01)
+    store.evict_expired()
+
+    store.update(job.job_id, status="predicting")
+    assert store.get(job.job_id) is None
+    assert len(store) == 0
+
+
+def test_an_idle_dispatcher_has_nothing_in_progress():
+    dispatcher = WorkDispatcher(MemoryJobStore(), lambda claimed: None, slots=2, poll_interval=1).start()
+
+    # The dispatcher is waiting for work to claim by now
+    time.sleep(0.05)
+    assert dispatcher.in_progress() == 0
@@ -0,0 +1,45 @@
+import threading
+from profiler import JobProfiler
+
+
+def busy():
+    return sum(index * index for index in range(1000))
+
+
+def test_cprofile_profiles_one_job_at_a_time_and_runs_the_others():
+    profiler = JobProfiler()
+    assert profiler.start(2, mode="cprofile")
+    inside = threading.Barrier(3, timeout=5)
+    ran = []
+
+    def job():
+        with profiler.job():
+            inside.wait()
+            busy()
+            ran.append(True)
+
+    threads = [threading.Thread(target=job) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+
+    assert len(ran) == 3
+    report = profiler.result()
+    assert report["status"] == "running"
+    assert report["jobs_profiled"] == 1
+
+    with profiler.job():
+        busy()
+    report = profiler.result()
+    assert report["status"] == "done"
+    assert report["jobs_profiled"] == 2
+    assert any("busy" in row["function"] for row in report["profile"]["functions"])
+    assert profiler.start(1, mode="cprofile")
+
+
+def test_jobs_are_not_profiled_while_the_profiler_is_not_armed():
+    profiler = JobProfiler()
+    with profiler.job():
+        busy()
+    assert profiler.result()["status"] == "idle"
@@ -0,0 +1,23 @@
+from result_cache import ResultCache
+
+
+def test_uncounted_lookups_leave_the_hit_rate_alone():
+    cache = ResultCache(max_entries=10)
+    cache.put("key", {"result": 1})
+
+    assert cache.get("key", count=False) == {"result": 1}
+    assert cache.get("missing", count=False) is None
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (0, 0)
+
+    cache.get("key")
+    cache.get("missing")
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
+
+
+def test_uncounted_disk_hits_are_not_counted(tmp_path):
+    disk_path = str(tmp_path / "cache.db")
+    ResultCache(max_entries=10, disk_path=disk_path).put("key", [1])
+    cache = ResultCache(max_entries=10, disk_path=disk_path)
+
+    assert cache.get("key", count=False) == [1]
+    assert cache.stats()["disk_hits"] == 0
@@ -0,0 +1,77 @@
+from country_scorer import CountryScorer
+from token_budget import sentence_windows, token_windows
+
+
+class WordTokenizer:
+    """One token per word, its id the hash of the word with the whitespace before it."""
+
+    def encode(self, text, add_special_tokens=False, verbose=False):
+        ids = []
+        for index, word in enumerate(text.split(" ")):
+            if word:
+                ids.append(hash((index > 0 or text.startswith(" "), word)))
+        return ids
+
+
+def scorer(max_premise_length):
+    scorer = CountryScorer.__new__(CountryScorer)
+    scorer.tokenizer = WordTokenizer()
+    scorer.max_premise_length = max_premise_length
+    return scorer
+
+
+def test_token_windows_overlap_and_stop_at_max_windows():
+    assert token_windows(list(range(10)), 4, overlap=1, max_windows=10) == [
+        [0, 1, 2, 3], [3, 4, 5, 6], [6, 7, 8, 9]
+    ]
+    assert token_windows(list(range(10)), 4, max_windows=1) == [[0, 1, 2, 3]]
+
+
+def test_sentence_windows_pack_whole_sentences():
+    sentences = [[1] * 3, [2] * 3, [3] * 3, [4] * 3]
+
+    assert sentence_windows(sentences, 7, max_windows=4) == [[1, 1, 1, 2, 2, 2], [3, 3, 3, 4, 4, 4]]
+    assert sentence_windows(sentences, 20, max_windows=4) == [[1, 1, 1, 2, 2, 2, 3, 3, 3, 4, 4, 4]]
+    assert sentence_windows(sentences, 7, max_windows=1) == [[1, 1, 1, 2, 2, 2, 3]]
+
+
+def test_sentence_windows_overlap_by_whole_sentences():
+    sentences = [[1] * 3, [2] * 3, [3] * 3, [4] * 3]
+
+    assert sentence_windows(sentences, 7, overlap=3, max_windows=4) == [
+        [1, 1, 1, 2, 2, 2], [2, 2, 2, 3, 3, 3], [3, 3, 3, 4, 4, 4]
+    ]
+    assert sentence_windows(sentences, 7, overlap=3, max_windows=2) == [[1, 1, 1, 2, 2, 2], [2, 2, 2, 3, 3, 3]]
+
+
+def test_sentence_windows_split_sentences_over_the_budget():
+    assert sentence_windows([[1] * 3, [9] * 10, [2] * 2], 4, overlap=1, max_windows=10) == [
+        [1, 1, 1], [9, 9, 9, 9], [9, 9, 9, 9], [9, 9, 9, 9], [2, 2]
+    ]
+
+
+def test_an_edited_sentence_only_changes_its_window():
+    description = "One two three. Four five six. Seven eight nine. Ten eleven twelve."
+    edited = "One two three. Four five six. Seven eight nine! Ten eleven twelve."
+    windows = scorer(6).encode_premise(description, overlap=0, max_windows=4)
+    edited_windows = scorer(6).encode_premise(edited, overlap=0, max_windows=4)
+
+    assert len(windows) == len(edited_windows) == 2
+    assert windows[0] == edited_windows[0]
+    assert windows[1] != edited_windows[1]
+
+
+def test_an_inserted_word_does_not_shift_the_windows_after_it():
+    description = "One two. Three four five. Six seven eight. Nine ten eleven."
+    edited = "One two extra. Three four five. Six seven eight. Nine ten eleven."
+    windows = scorer(6).encode_premise(description, overlap=0, max_windows=4)
+    edited_windows = scorer(6).encode_premise(edited, overlap=0, max_windows=4)
+
+    assert windows[0] != edited_windows[0]
+    assert windows[1:] == edited_windows[1:]
+
+
+def test_one_window_truncates_the_description():
+    assert scorer(2).encode_premise("One two three.", max_windows=1) == [
+        WordTokenizer().encode("One two three.")[:2]
+    ]
@@ -0,0 +1,59 @@
+import os
+import pytest
+from worker_pool import InferenceWorkerPool
+
+
+class Backend:
+    def share(self):
+        pass
+
+    def set_threads(self, threads):
+        pass
+
+
+def run_batch(batch):
+    if batch == "crash":
+        os._exit(1)
+    return [value * 2 for value in batch]
+
+
+@pytest.fixture
+def open_pool():
+    opened = []
+
+    def open_pool(workers=1):
+        pool = InferenceWorkerPool(run_batch, Backend(), workers, threads=1)
+        opened.append(pool)
+        return pool
+
+    yield open_pool
+    for pool in opened:
+        pool.close(timeout=2)
+
+
+def test_batches_run_on_the_workers(open_pool):
+    pool = open_pool(workers=2)
+    assert pool([1, 2]) == [2, 4]
+    assert pool.submit([3]).result(timeout=5) == [6]
+
+
+def test_a_dead_worker_fails_its_batches_and_is_replaced(open_pool):
+    pool = open_pool()
+    with pytest.raises(RuntimeError, match="died"):
+        pool.submit("crash").result(timeout=5)
+
+    assert pool.submit([1]).result(timeout=5) == [2]
+
+
+def test_submit_raises_once_no_worker_is_left(open_pool):
+    pool = open_pool()
+
+    def fail_to_start():
+        raise OSError("fork failed")
+
+    pool._start_worker = fail_to_start
+    with pytest.raises(RuntimeError, match="died"):
+        pool.submit("crash").result(timeout=5)
+
+    with pytest.raises(RuntimeError, match="No inference worker left"):
+        pool.submit([1])
@@ -0,0 +1,84 @@
+# ------------------------------------------------------------------------------ #
+# Token budget, sliding windows and length grouping of model inputs
+# ------------------------------------------------------------------------------ #
+def token_windows(ids, size, overlap=0, max_windows=1):
+    """
+    Split token ids into windows of at most `size` tokens overlapping by `overlap` tokens.
+
+    At most `max_windows` windows are made, from the start of the text; with
+    one window this truncates the ids to the token budget.
+    """
+    size = max(1, int(size))
+    if len(ids) <= size or max_windows <= 1:
+        return [list(ids[:size])]
+
+    stride = max(1, size - min(int(overlap), size - 1))
+    windows = []
+    for start in range(0, len(ids), stride):
+        windows.append(list(ids[start:start + size]))
+        if start + size >= len(ids) or len(windows) == max_windows:
+            break
+    return windows
+
+
+def sentence_windows(sentences, size, overlap=0, max_windows=1):
+    """
+    Pack the token ids of consecutive sentences into windows of at most `size` tokens.
+
+    Windows start and end on sentence boundaries, so an edit only changes the
+    windows holding the edited sentences, as long as it does not move others
+    to a different window. Consecutive windows share whole trailing sentences
+    of at most `overlap` tokens; a sentence longer than `size` is split into
+    windows of its own with `token_windows`. Text that fits one window is one
+    window, and at most `max_windows` windows are made from the start.
+    """
+    size = max(1, int(size))
+    if sum(len(ids) for ids in sentences) <= size or max_windows <= 1:
+        return [[token for ids in sentences for token in ids][:size]]
+
+    windows = []
+    current = []
+    length = 0
+    for ids in sentences:
+        if len(windows) >= max_windows:
+            break
+        if len(ids) > size:
+            if current:
+                windows.append([token for part in current for token in part])
+            windows.extend(token_windows(ids, size, overlap, max_windows - len(windows)))
+            current, length = [], 0
+            continue
+        if current and length + len(ids) > size:
+            windows.append([token for part in current for token in part])
+            # Carry the trailing sentences that fit the overlap into the next window
+            carried = []
+            for part in reversed(current):
+                if sum(map(len, carried)) + len(part) > min(overlap, size - len(ids)):
+                    break
+                carried.insert(0, part)
+            current, length = carried, sum(map(len, carried))
+        current.append(ids)
+        length += len(ids)
+    if current and len(windows) < max_windows:
+        windows.append([token for part in current for token in part])
+    return windows[:max_windows]
+
+
+def length_groups(lengths, growth=1.5, slack=16):
+    """
+    Split the indices of `lengths` into groups of similar length, shortest first.
+
+    A group takes sequences up to `growth` times (or `slack` tokens more than)
+    its shortest one, so padding each group to its longest sequence wastes
+    little while near-equal lengths still share one forward pass.
+    """
+    groups = []
+    shortest = None
+    for index in sorted(range(len(lengths)), key=lengths.__getitem__):
+        length = lengths[index]
+        if groups and length <= max(shortest * growth, shortest + slack):
+            groups[-1].append(index)
+        else:
+            groups.append([index])
+            shortest = length
+    return groups
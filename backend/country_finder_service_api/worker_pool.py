@@ -0,0 +1,153 @@
+import os
+import itertools
+import threading
+import multiprocessing
+from multiprocessing.connection import wait
+from concurrent.futures import Future
+
+
+# ------------------------------------------------------------------------------ #
+# Multi-process inference workers
+# ------------------------------------------------------------------------------ #
+def _serve(run_batch, backend, threads, metrics, requests, responses):
+    """Worker process loop: run batches from `requests` and put (batch_id, ok, payload, observations) on `responses`."""
+    backend.set_threads(threads)
+    if metrics is not None:
+        metrics.buffer = []
+    while True:
+        request = requests.get()
+        if request is None:
+            return
+        batch_id, batch = request
+        try:
+            output = run_batch(batch)
+            ok = True
+        except Exception as e:
+            output = f"{type(e).__name__}: {e}"
+            ok = False
+        responses.put((batch_id, ok, output, metrics.drain() if metrics is not None else ()))
+
+
+class InferenceWorkerPool:
+    """
+    Run batches in `workers` processes forked from the process that loaded the model.
+
+    A torch backend's weights are moved to shared memory before forking, so
+    every worker maps the same pages instead of loading its own copy, and each
+    worker gets `threads` intra-op threads so the workers partition the cores
+    rather than oversubscribe them. Calling the pool runs one batch on the
+    next free worker and blocks for its output, so it can stand in for
+    `run_batch` in an InferenceScheduler with one thread per worker.
+    Histograms of `metrics` observed by `run_batch` in a worker are sent back
+    with its output and added to the parent's registry. A worker that dies is
+    forked again; once none can be, `submit` raises instead of queueing.
+    """
+
+    def __init__(self, run_batch, backend, workers, threads=None, metrics=None):
+        try:
+            context = multiprocessing.get_context("fork")
+        except ValueError as e:
+            raise RuntimeError("INFERENCE_WORKERS requires a platform that can fork (Linux or macOS)") from e
+
+        self.workers = max(1, int(workers))
+        self.threads = threads or max(1, (os.cpu_count() or 1) // self.workers)
+        self._context = context
+        self._run_batch = run_batch
+        self._backend = backend
+        self._closing = False
+        self._requests = context.SimpleQueue()
+        self._responses = context.SimpleQueue()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count()
+        self._metrics = metrics
+
+        # Forked tokenizers would otherwise warn and disable their thread pool on first use
+        os.environ.setdefault("TOKENIZERS_PARALLELISM", "false")
+        backend.share()
+        self._processes = [self._start_worker() for _ in range(self.workers)]
+
+        self._collector = threading.Thread(target=self._collect, daemon=True)
+        self._collector.start()
+        self._monitor = threading.Thread(target=self._watch, daemon=True)
+        self._monitor.start()
+
+    def _start_worker(self):
+        process = self._context.Process(
+            target=_serve,
+            args=(self._run_batch, self._backend, self.threads, self._metrics, self._requests, self._responses),
+            daemon=True
+        )
+        process.start()
+        return process
+
+    def submit(self, batch):
+        """Queue a batch for the workers and return a Future of its output; raises when no worker is left."""
+        future = Future()
+        batch_id = next(self._ids)
+        with self._lock:
+            if not self._processes:
+                raise RuntimeError("No inference worker left")
+            self._pending[batch_id] = future
+        self._requests.put((batch_id, batch))
+        return future
+
+    def __call__(self, batch):
+        return self.submit(batch).result()
+
+    def _collect(self):
+        while True:
+            response = self._responses.get()
+            if response is None:
+                return
+            batch_id, ok, payload, observations = response
+            if observations:
+                self._metrics.replay(observations)
+            with self._lock:
+                future = self._pending.pop(batch_id, None)
+            if future is None:
+                continue
+            if ok:
+                future.set_result(payload)
+            else:
+                future.set_exception(RuntimeError(payload))
+
+    def _watch(self):
+        """Fail the queued batches once a worker dies, since one of them may never be answered, and replace it."""
+        running = {process.sentinel: process for process in self._processes}
+        while running:
+            for sentinel in wait(list(running)):
+                process = running.pop(sentinel)
+                process.join()
+                crashed = process.exitcode != 0
+                replacement = None
+                if crashed:
+                    print(f"Inference worker {process.pid} exited with code {process.exitcode}")
+                    if not self._closing:
+                        try:
+                            replacement = self._start_worker()
+                            running[replacement.sentinel] = replacement
+                        except Exception as e:
+                            print(f"Unable to restart the inference worker: {e}")
+                with self._lock:
+                    self._processes.remove(process)
+                    if replacement is not None:
+                        self._processes.append(replacement)
+                    # Once the last worker is gone nothing reads the queue any more
+                    if crashed or not self._processes:
+                        pending, self._pending = self._pending, {}
+                    else:
+                        pending = {}
+                for future in pending.values():
+                    future.set_exception(RuntimeError("Inference worker died"))
+
+    def close(self, timeout=None):
+        """Stop the workers once they finish the batches already queued."""
+        self._closing = True
+        with self._lock:
+            processes = list(self._processes)
+        for _ in processes:
+            self._requests.put(None)
+        for process in processes:
+            process.join(timeout)
+        self._responses.put(None)
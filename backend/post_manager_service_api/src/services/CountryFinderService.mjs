@@ -1,6 +1,7 @@
 import fetch from 'node-fetch';
 import dotenv from 'dotenv';
 import CommonErrors from '../utils/errors/CommonErrors.mjs';
+import { fetchWithRetry } from '../utils/FetchRetry.mjs';
 
 
 dotenv.config();
@@ -13,7 +14,8 @@ class CountryFinderService {
 
     async predict(jwt, description) {
         try {
-            const response = await fetch(`${ countryFinderServiceApi }/predict`, {
+            // Waits out short overloads (429 with Retry-After) instead of failing the post or comment
+            const response = await fetchWithRetry(fetch, `${ countryFinderServiceApi }/predict`, {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${ jwt }`,
@@ -35,9 +37,9 @@ class CountryFinderService {
         }
     }
 
-    async result(jwt, jobId) {
+    async result(jwt, jobId, wait = 0) {
         try {
-            const response = await fetch(`${ countryFinderServiceApi }/result/${ jobId }`, {
+            const response = await fetch(`${ countryFinderServiceApi }/result/${ jobId }?wait=${ wait }`, {
                 method: 'GET',
                 headers: {
                     'Authorization': `Bearer ${ jwt }`,
@@ -1,6 +1,7 @@
 import fetch from 'node-fetch';
 import dotenv from 'dotenv';
 import CommonErrors from '../utils/errors/CommonErrors.mjs';
+import { fetchWithRetry } from '../utils/FetchRetry.mjs';
 
 
 dotenv.config();
@@ -13,7 +14,8 @@ class ToxicityDetectionService {
 
     async predict(jwt, description) {
         try {
-            const response = await fetch(`${ toxicityDetectionServiceApi }/predict`, {
+            // Waits out short overloads (429 with Retry-After) instead of failing the post or comment
+            const response = await fetchWithRetry(fetch, `${ toxicityDetectionServiceApi }/predict`, {
                 method: 'POST',
                 headers: {
                     'Authorization': `Bearer ${ jwt }`,
@@ -35,9 +37,9 @@ class ToxicityDetectionService {
         }
     }
 
-    async result(jwt, jobId) {
+    async result(jwt, jobId, wait = 0) {
         try {
-            const response = await fetch(`${ toxicityDetectionServiceApi }/result/${ jobId }`, {
+            const response = await fetch(`${ toxicityDetectionServiceApi }/result/${ jobId }?wait=${ wait }`, {
                 method: 'GET',
                 headers: {
                     'Authorization': `Bearer ${ jwt }`,
@@ -0,0 +1,39 @@
+// Retries of a request turned away with 429 by a service's admission control, and the cap on each wait
+const MAX_RETRIES = Number(process.env.OVERLOAD_MAX_RETRIES || 5);
+const MAX_RETRY_AFTER_SECONDS = Number(process.env.OVERLOAD_MAX_RETRY_AFTER_SECONDS || 30);
+
+
+function sleep(milliseconds) {
+    return new Promise(resolve => setTimeout(resolve, milliseconds));
+}
+
+// Seconds to wait from a Retry-After header, given either as seconds or as an HTTP date
+function retryAfterSeconds(header, now = Date.now()) {
+    if (header === null || header === undefined || header === '') return 1;
+
+    const seconds = Number(header);
+    if (Number.isFinite(seconds)) return Math.max(0, seconds);
+
+    const date = Date.parse(header);
+    return Number.isNaN(date) ? 1 : Math.max(0, (date - now) / 1000);
+}
+
+// Send the request, waiting for Retry-After and sending it again while the service answers 429,
+// up to `retries` times; the last response is returned either way
+async function fetchWithRetry(fetch, url, options, {
+    retries = MAX_RETRIES,
+    maxRetryAfter = MAX_RETRY_AFTER_SECONDS,
+    wait = sleep,
+} = {}) {
+    for (let attempt = 0; ; attempt++) {
+        const response = await fetch(url, options);
+        if (response.status !== 429 || attempt >= retries) return response;
+
+        // Free the connection before waiting
+        await response.text().catch(() => {});
+        const seconds = Math.min(retryAfterSeconds(response.headers.get('Retry-After')), maxRetryAfter);
+        await wait(seconds * 1000);
+    }
+}
+
+export { fetchWithRetry, retryAfterSeconds };
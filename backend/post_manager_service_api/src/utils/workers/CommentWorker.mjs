@@ -9,13 +9,15 @@ import ErrorLogService from '../../services/ErrorLogService.mjs';
 const toxicityDetectionService = new ToxicityDetectionService();
 const notificationServices = new NotificationServices();
 const errorLogService = new ErrorLogService();
+const RESULT_WAIT_SECONDS = 30;
 
 
 const getResult = async (jwt, jobId) => {
     while (true) {
-        const result = await toxicityDetectionService.result(jwt, jobId);
+        // Long-poll, the service answers as soon as the job is done
+        const result = await toxicityDetectionService.result(jwt, jobId, RESULT_WAIT_SECONDS);
         if (result.status === 'done') return result;
-        await new Promise(resolve => setTimeout(resolve, 5000)); // wait for 5s
+        if (result.status === 'failed') throw new Error(CommonErrors.INTERNAL_SERVER_ERROR);
     }
 }
 
@@ -13,19 +13,21 @@ const countryFinderService = new CountryFinderService();
 const toxicityDetectionService = new ToxicityDetectionService();
 const notificationServices = new NotificationServices();
 const errorLogService = new ErrorLogService();
+const RESULT_WAIT_SECONDS = 30;
 
 
 const getResult = async (jwt, jobId, ditectType) => {
     while (true) {
+        // Long-poll, the service answers as soon as the job is done
         let result;
         if (ditectType === DitectType.TOXICITY) {
-            result = await toxicityDetectionService.result(jwt, jobId);
+            result = await toxicityDetectionService.result(jwt, jobId, RESULT_WAIT_SECONDS);
 
         } else if (ditectType === DitectType.COUNTRY) {
-            result = await countryFinderService.result(jwt, jobId);
+            result = await countryFinderService.result(jwt, jobId, RESULT_WAIT_SECONDS);
         }
         if (result.status === 'done') return result;
-        await new Promise(resolve => setTimeout(resolve, 5000)); // wait for 5s
+        if (result.status === 'failed') throw new Error(CommonErrors.INTERNAL_SERVER_ERROR);
     }
 }
 
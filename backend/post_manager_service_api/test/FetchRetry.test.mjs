@@ -0,0 +1,77 @@
+import test from 'node:test';
+import assert from 'node:assert/strict';
+import { fetchWithRetry, retryAfterSeconds } from '../src/utils/FetchRetry.mjs';
+
+
+function fakeFetch(statuses, retryAfter = '2') {
+    const calls = [];
+    const fetch = async (url, options) => {
+        calls.push({ url, options });
+        const status = statuses[Math.min(calls.length - 1, statuses.length - 1)];
+        return {
+            status,
+            headers: { get: name => (name === 'Retry-After' && status === 429 ? retryAfter : null) },
+            text: async () => '',
+        };
+    };
+    return { fetch, calls };
+}
+
+function recordWaits() {
+    const waits = [];
+    return { waits, wait: async milliseconds => { waits.push(milliseconds); } };
+}
+
+
+test('retries a 429 after Retry-After and returns the accepted response', async () => {
+    const { fetch, calls } = fakeFetch([429, 429, 202]);
+    const { waits, wait } = recordWaits();
+
+    const response = await fetchWithRetry(fetch, 'http://service/predict', { method: 'POST' }, { wait });
+
+    assert.equal(response.status, 202);
+    assert.equal(calls.length, 3);
+    assert.deepEqual(waits, [2000, 2000]);
+    assert.equal(calls[2].options.method, 'POST');
+});
+
+test('gives up after the retry limit and returns the last 429', async () => {
+    const { fetch, calls } = fakeFetch([429]);
+    const { waits, wait } = recordWaits();
+
+    const response = await fetchWithRetry(fetch, 'http://service/predict', {}, { retries: 2, wait });
+
+    assert.equal(response.status, 429);
+    assert.equal(calls.length, 3);
+    assert.equal(waits.length, 2);
+});
+
+test('does not retry other errors', async () => {
+    const { fetch, calls } = fakeFetch([500]);
+    const { waits, wait } = recordWaits();
+
+    const response = await fetchWithRetry(fetch, 'http://service/predict', {}, { wait });
+
+    assert.equal(response.status, 500);
+    assert.equal(calls.length, 1);
+    assert.deepEqual(waits, []);
+});
+
+test('caps the wait at maxRetryAfter', async () => {
+    const { fetch } = fakeFetch([429, 200], '3600');
+    const { waits, wait } = recordWaits();
+
+    await fetchWithRetry(fetch, 'http://service/predict', {}, { maxRetryAfter: 30, wait });
+
+    assert.deepEqual(waits, [30000]);
+});
+
+test('reads Retry-After as seconds or as an HTTP date', () => {
+    const now = Date.parse('2025-01-01T00:00:00Z');
+
+    assert.equal(retryAfterSeconds('5', now), 5);
+    assert.equal(retryAfterSeconds('Wed, 01 Jan 2025 00:00:10 GMT', now), 10);
+    assert.equal(retryAfterSeconds('Tue, 31 Dec 2024 23:59:00 GMT', now), 0);
+    assert.equal(retryAfterSeconds(null, now), 1);
+    assert.equal(retryAfterSeconds('soon', now), 1);
+});
@@ -1,13 +1,14 @@
 import os
+import hmac
+import re
 import json
 import uuid
 import time
 import threading
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from werkzeug.exceptions import HTTPException
 from flask_cors import CORS
 from flasgger import Swagger
-from concurrent.futures import ThreadPoolExecutor
 import signal
 import sys
 import jwt
@@ -25,8 +26,164 @@ os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
 # Load environment variables from a .env file
 load_dotenv()
 
-from detoxify import Detoxify
-model = Detoxify('original')  # or 'multilingual'
+import numpy as np
+from inference_backend import load_backend, load_mmapped
+from inference_scheduler import InferenceScheduler
+from worker_pool import InferenceWorkerPool
+from concurrency_controller import ConcurrencyController
+from model_loader import ModelLoader
+from model_snapshot import (
+    find_snapshot, load_snapshot_model, load_snapshot_tokenizer, read_snapshot_file
+)
+from metrics import MetricsRegistry, register_service_metrics
+from profiler import PROFILE_MODES, JobProfiler
+from token_budget import token_windows, length_groups
+from result_cache import ResultCache, content_key
+from admission import Overloaded, ServiceRate
+from job_store import Job, WorkDispatcher, open_job_store
+from sentence_scores import SentenceScores
+
+# Forward pass engine: "torch" (eager fp32), "torch_int8" or "onnx" (see export_model.py)
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+INFERENCE_ARTIFACT_DIR = os.getenv("INFERENCE_ARTIFACT_DIR", "./model_cache/inference")
+
+# Snapshot written by snapshot_model.py, used instead of the Detoxify checkpoint when present
+MODEL_NAME = "detoxify-original"
+MODEL_SNAPSHOT_DIR = os.getenv("MODEL_SNAPSHOT_DIR", "./model_cache/snapshot")
+
+# Texts scored (and rounds of them) before the service reports ready
+MODEL_WARMUP_TEXTS = os.getenv("MODEL_WARMUP_TEXTS")
+MODEL_WARMUP_ROUNDS = int(os.getenv("MODEL_WARMUP_ROUNDS", "1"))
+DEFAULT_WARMUP_TEXTS = [
+    "You are the worst person ever",
+    "Thanks for the tips, the view from the old lighthouse at sunset was worth the climb.",
+    "ok"
+]
+
+# Token budget of a text (special tokens included); with sliding windows on, longer texts are split into
+# up to INPUT_MAX_WINDOWS overlapping windows and each label takes its highest score, otherwise they are truncated
+INPUT_MAX_TOKENS = int(os.getenv("INPUT_MAX_TOKENS", "512"))
+INPUT_SLIDING_WINDOWS = os.getenv("INPUT_SLIDING_WINDOWS", "false").lower() == "true"
+INPUT_WINDOW_OVERLAP = int(os.getenv("INPUT_WINDOW_OVERLAP", "64"))
+INPUT_MAX_WINDOWS = int(os.getenv("INPUT_MAX_WINDOWS", "8")) if INPUT_SLIDING_WINDOWS else 1
+
+# "text" scores each text as a whole; "sentences" scores its sentences in one batch, reusing the scores of
+# sentences seen before, and also returns the TOXICITY_TOP_SPANS most toxic ones scoring TOXICITY_SPAN_THRESHOLD or more
+TOXICITY_MODE = os.getenv("TOXICITY_MODE", "text")
+TOXICITY_TOP_SPANS = int(os.getenv("TOXICITY_TOP_SPANS", "3"))
+TOXICITY_SPAN_THRESHOLD = float(os.getenv("TOXICITY_SPAN_THRESHOLD", "0.5"))
+
+# Set by `load_model`, in the background once the server is up
+tokenizer = None
+class_names = None
+inference_backend = None
+worker_pool = None
+
+# Scores of identical texts are reused until the model or backend changes
+result_cache = ResultCache(
+    max_entries=int(os.getenv("CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "3600")),
+    disk_path=os.getenv("CACHE_DISK_PATH") or None
+)
+SCORE_VERSION = f"{MODEL_NAME}:{INFERENCE_BACKEND}:{INPUT_MAX_TOKENS}" + (
+    f":{INPUT_WINDOW_OVERLAP}x{INPUT_MAX_WINDOWS}" if INPUT_MAX_WINDOWS > 1 else ""
+)
+# Results of the sentences mode (with the spans, at exact offsets) are kept under a version of their own
+CACHE_VERSION = SCORE_VERSION if TOXICITY_MODE == "text" else (
+    f"{SCORE_VERSION}:sentences:{TOXICITY_TOP_SPANS}:{TOXICITY_SPAN_THRESHOLD}"
+)
+# Scores of each sentence of the sentences mode, reused by edited texts for their unchanged sentences; they are
+# kept apart from the results so they neither push results out nor count in the result cache's hit rate
+segment_cache = ResultCache(
+    max_entries=int(os.getenv("SEGMENT_CACHE_MAX_ENTRIES", "10000")),
+    ttl=float(os.getenv("CACHE_TTL_SECONDS", "3600"))
+)
+
+# Per-stage latency histograms, served in the Prometheus text format on /metrics
+metrics = MetricsRegistry()
+queue_wait_seconds = metrics.histogram(
+    "job_queue_wait_seconds", "Time from job submission until its text is handed to the model."
+)
+tokenize_seconds = metrics.histogram(
+    "tokenize_seconds", "Time to tokenize a batch of texts.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25)
+)
+forward_seconds = metrics.histogram(
+    "model_forward_seconds", "Model forward pass time per length group of a batch."
+)
+job_seconds = metrics.histogram(
+    "job_duration_seconds", "End-to-end time from job submission until it is done."
+)
+
+# Profiles the next N batches on request, see /admin/profile
+profiler = JobProfiler()
+
+def predict_texts(texts):
+    """
+    Score a list of texts, one forward pass per group of similar-length windows.
+
+    Returns one ({label: probability}, timings) pair per text, where timings holds the
+    seconds spent tokenizing the batch and in the forward passes over the text's windows.
+    """
+    with profiler.job(len(texts)):
+        return score_texts(texts)
+
+def score_texts(texts):
+    """Tokenize and score texts for `predict_texts`."""
+    started = time.perf_counter()
+    encoded = tokenizer(texts, add_special_tokens=False, verbose=False)["input_ids"]
+    size = min(INPUT_MAX_TOKENS, tokenizer.model_max_length) - tokenizer.num_special_tokens_to_add()
+
+    # Windows of each text are consecutive, text i owns windows[spans[i]:spans[i + 1]]
+    windows = []
+    spans = [0]
+    for ids in encoded:
+        for window in token_windows(ids, size, INPUT_WINDOW_OVERLAP, INPUT_MAX_WINDOWS):
+            windows.append(tokenizer.build_inputs_with_special_tokens(window))
+        spans.append(len(windows))
+    owners = [index for index in range(len(texts)) for _ in range(spans[index], spans[index + 1])]
+    tokenize = time.perf_counter() - started
+    tokenize_seconds.observe(tokenize)
+
+    scores = np.zeros((len(windows), len(class_names)))
+    forward_times = [0.0] * len(texts)
+    for group in length_groups([len(window) for window in windows]):
+        longest = max(len(windows[row]) for row in group)
+        input_ids = np.full((len(group), longest), tokenizer.pad_token_id, dtype=np.int64)
+        attention_mask = np.zeros((len(group), longest), dtype=np.int64)
+        for position, row in enumerate(group):
+            input_ids[position, :len(windows[row])] = windows[row]
+            attention_mask[position, :len(windows[row])] = 1
+
+        started = time.perf_counter()
+        logits = inference_backend(input_ids, attention_mask)
+        forward = time.perf_counter() - started
+        forward_seconds.observe(forward)
+        scores[group] = 1 / (1 + np.exp(-logits))
+        for index in {owners[row] for row in group}:
+            forward_times[index] += forward
+
+    results = []
+    for index in range(len(texts)):
+        # A text is as toxic as its most toxic window
+        text_scores = scores[spans[index]:spans[index + 1]].max(axis=0)
+        timings = {
+            "tokenize": round(tokenize, 6),
+            "forward": round(forward_times[index], 6),
+            "batch_size": len(texts),
+            "windows": spans[index + 1] - spans[index]
+        }
+        # Convert NumPy floats to native Python floats
+        results.append(({label: float(text_scores[column]) for column, label in enumerate(class_names)}, timings))
+    return results
+
+def run_batch(texts):
+    """Score a batch of texts on the worker processes when there are any, on this thread otherwise."""
+    return worker_pool(texts) if worker_pool is not None else predict_texts(texts)
+
+# Batches are tokenized and scored in this many processes forked after the model is loaded,
+# sharing its weights, with the cores split between them (0 runs them on a thread of this process)
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "0"))
 
 # ------------------------------------------------------------------------------
 # Flask app setup with Swagger
@@ -37,6 +194,9 @@ CORS(app)
 # Set the secret key in Flask config
 app.config['JWT_SECRET'] = os.getenv('JWT_SECRET')
 
+# Key for the /admin endpoints, which are disabled when it is not set
+app.config['ADMIN_API_KEY'] = os.getenv('ADMIN_API_KEY')
+
 swagger = Swagger(app, template={
     "info": {
         "title": "Toxicity Detection API",
@@ -51,34 +211,288 @@ swagger = Swagger(app, template={
 # ------------------------------------------------------------------------------
 # Threading and job management
 # ------------------------------------------------------------------------------
-jobs = {}
-job_lock = threading.Lock()
-executor = ThreadPoolExecutor(max_workers=10)
+class ToxicityJob(Job):
+    """Job record with the most toxic sentences of the text (sentences mode) and the text's cache key."""
+
+    __slots__ = ("spans", "content_hash")
+
+    def __init__(self, job_id, spans=None, content_hash=None, **fields):
+        super().__init__(job_id, **fields)
+        self.spans = spans
+        self.content_hash = content_hash
+
+# Job records and the queue of texts to score, kept in memory or shared by every
+# replica through SQLite or Redis. Finished jobs are kept for 5 minutes.
+jobs = open_job_store(
+    os.getenv("JOB_STORE_URL", "memory"),
+    ToxicityJob,
+    ttl=300,
+    namespace="toxicity_detection",
+    shards=int(os.getenv("JOB_STORE_SHARDS", "16")),
+    lease=float(os.getenv("JOB_STORE_LEASE_SECONDS", "120")),
+    stale=float(os.getenv("JOB_STALE_SECONDS", "3600"))
+)
+
+# Admission checks and job creation of this process run one at a time
+admission_lock = threading.Lock()
+
+# Upper bound for the ?wait=<seconds> long-poll parameter
+MAX_WAIT_SECONDS = float(os.getenv("MAX_WAIT_SECONDS", "30"))
+
+# Upper bound for the number of texts or job IDs in one bulk request
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE", "256"))
+
+# Admission limits: texts queued or being scored, jobs not yet done, and job records kept in the job store
+MAX_QUEUE_DEPTH = int(os.getenv("MAX_QUEUE_DEPTH", "1000"))
+MAX_OUTSTANDING_JOBS = int(os.getenv("MAX_OUTSTANDING_JOBS", "5000"))
+MAX_JOBS = int(os.getenv("MAX_JOBS", "20000"))
+
+# Measured texts scored per second, used for the Retry-After estimate
+service_rate = ServiceRate()
+
+def estimated_tokens(text):
+    """Tokens of a text for the batch token limit, estimated at 4 characters each as texts are tokenized in the batch."""
+    return min(len(text) // 4 + 1, INPUT_MAX_WINDOWS * INPUT_MAX_TOKENS)
+
+# Inference thread that drains pending texts into one batched forward pass per tick, one per worker process
+scheduler = InferenceScheduler(
+    run_batch,
+    max_batch_size=int(os.getenv("INFERENCE_MAX_BATCH_SIZE", "32")),
+    max_batch_tokens=int(os.getenv("INFERENCE_MAX_BATCH_TOKENS", "16384")),
+    item_tokens=estimated_tokens,
+    max_wait=float(os.getenv("INFERENCE_MAX_WAIT_MS", "10")) / 1000,
+    concurrency=max(1, INFERENCE_WORKERS)
+)
 
-def predict_job(job_id, description):
-    """Run the prediction and update the job status/results."""
-    with job_lock:
-        jobs[job_id]['status'] = 'predicting'
+register_service_metrics(metrics, jobs, scheduler, result_cache)
+metrics.gauge("model_ready", "1 once the model is loaded and warmed up.", lambda: int(model_loader.ready))
 
-    raw_results = model.predict(description)
-    # Convert NumPy float32 to native Python float
-    results = {k: float(v) for k, v in raw_results.items()}
+# Texts scored at once: starts at CONCURRENCY_INITIAL and, when ADAPTIVE_CONCURRENCY is on,
+# is tuned between CONCURRENCY_MIN and CONCURRENCY_MAX from the measured latency
+ADAPTIVE_CONCURRENCY = os.getenv("ADAPTIVE_CONCURRENCY", "true").lower() == "true"
+CONCURRENCY_INITIAL = int(os.getenv("CONCURRENCY_INITIAL", str(4 * scheduler.max_batch_size)))
+CONCURRENCY_MIN = int(os.getenv("CONCURRENCY_MIN", str(scheduler.max_batch_size)))
+CONCURRENCY_MAX = int(os.getenv("CONCURRENCY_MAX", str(16 * scheduler.max_batch_size)))
 
-    with job_lock:
-        jobs[job_id]['status'] = 'done'
-        jobs[job_id]['result'] = results
-        jobs[job_id]['timestamp'] = time.time()
+# Sentences mode: texts scored sentence by sentence, sentences seen before coming from the segment cache
+sentence_scores = SentenceScores(
+    segment_cache, SCORE_VERSION, scheduler.submit, TOXICITY_TOP_SPANS, TOXICITY_SPAN_THRESHOLD
+)
+
+def predict_job(texts):
+    """Queue claimed (cache_key, description) pairs as one submission and update every job attached to them as they are scored."""
+    cache_keys = [cache_key for cache_key, _ in texts]
+    started = time.monotonic()
+    handed = time.time()
+
+    def mark_predicting():
+        nonlocal handed
+        handed = time.time()
+        for cache_key in cache_keys:
+            for job_id in jobs.attached(cache_key):
+                job = jobs.get(job_id)
+                if job is not None:
+                    queue_wait_seconds.observe(handed - job.created)
+                jobs.update(job_id, status="predicting")
+
+    def store_result(future):
+        try:
+            error = future.exception()
+            if error is not None:
+                # Finish the attached jobs as failed, so waiters and pollers stop; later submissions start over
+                job_ids = [
+                    job_id for cache_key in cache_keys
+                    for job_id in jobs.fail(cache_key, f"Prediction failed: {error}")
+                ]
+                print(f"Prediction failed for jobs {', '.join(job_ids)}: {type(error).__name__}: {error}")
+                return
+            finished = time.time()
+            outputs = future.result()
+            if TOXICITY_MODE == "text":
+                outputs = [(result, None, None, stages) for result, stages in outputs]
+            for cache_key, (result, spans, segments, stages) in zip(cache_keys, outputs):
+                result_cache.put(cache_key, result if TOXICITY_MODE == "text" else {
+                    "result": result, "spans": spans, "segments": segments
+                })
+                for job_id in jobs.complete(cache_key):
+                    job = jobs.get(job_id)
+                    timings = {"cache_hit": False, **stages, "predict": round(finished - handed, 6)}
+                    if job is not None:
+                        timings["queue_wait"] = round(max(0.0, handed - job.created), 6)
+                        timings["total"] = round(finished - job.created, 6)
+                        job_seconds.observe(finished - job.created)
+                    jobs.finish(job_id, result=result, spans=spans, timings=timings)
+            service_rate.record(len(cache_keys))
+            if concurrency_controller is not None:
+                concurrency_controller.record(time.monotonic() - started, len(cache_keys))
+        finally:
+            dispatcher.done(len(cache_keys))
+
+    descriptions = [description for _, description in texts]
+    if TOXICITY_MODE == "sentences":
+        future = sentence_scores.score(descriptions, on_start=mark_predicting)
+    else:
+        future = scheduler.submit(descriptions, on_start=mark_predicting)
+    future.add_done_callback(store_result)
+
+# Pulls queued texts (from any replica when the store is shared) in scheduler-sized batches,
+# keeping at most a few batches of this process in progress, once the model is ready
+dispatcher = WorkDispatcher(jobs, predict_job, slots=CONCURRENCY_INITIAL, batch_size=scheduler.max_batch_size)
+
+# Tunes the slots and, when the model runs in this process, its intra-op threads (set by `start_dispatching`)
+concurrency_controller = None
+
+def load_model():
+    """Load the tokenizer, labels and model, then fork the inference workers."""
+    global tokenizer, class_names, inference_backend, worker_pool
+    if INFERENCE_BACKEND == "onnx":
+        # The exported artifacts carry the tokenizer and labels, so the torch checkpoint is not loaded
+        from transformers import AutoTokenizer
+        tokenizer = AutoTokenizer.from_pretrained(os.path.join(INFERENCE_ARTIFACT_DIR, "tokenizer"))
+        with open(os.path.join(INFERENCE_ARTIFACT_DIR, "class_names.json"), 'r', encoding='utf-8') as file:
+            class_names = json.load(file)
+        inference_backend = load_backend(INFERENCE_BACKEND, None, INFERENCE_ARTIFACT_DIR)
+    elif find_snapshot(MODEL_SNAPSHOT_DIR, MODEL_NAME) is not None:
+        # Local files only, with the safetensors weights memory-mapped
+        tokenizer = load_snapshot_tokenizer(MODEL_SNAPSHOT_DIR)
+        class_names = read_snapshot_file(MODEL_SNAPSHOT_DIR, "class_names.json")
+        inference_backend = load_backend(
+            INFERENCE_BACKEND, lambda: load_snapshot_model(MODEL_SNAPSHOT_DIR), INFERENCE_ARTIFACT_DIR
+        )
+    else:
+        from detoxify import Detoxify
+        # The checkpoint is memory-mapped rather than read into memory where torch supports it
+        model = load_mmapped(lambda: Detoxify('original'))  # or 'multilingual'
+        tokenizer, class_names = model.tokenizer, model.class_names
+        inference_backend = load_backend(INFERENCE_BACKEND, lambda: model.model, INFERENCE_ARTIFACT_DIR)
+
+    if INFERENCE_WORKERS > 0:
+        worker_pool = InferenceWorkerPool(
+            predict_texts,
+            inference_backend,
+            INFERENCE_WORKERS,
+            threads=int(os.getenv("INFERENCE_WORKER_THREADS", "0")) or None,
+            metrics=metrics
+        )
+
+def warm_up_model():
+    """Score the warm-up texts through the scheduler, in batches like real traffic."""
+    texts = DEFAULT_WARMUP_TEXTS
+    if MODEL_WARMUP_TEXTS:
+        with open(MODEL_WARMUP_TEXTS, 'r', encoding='utf-8') as file:
+            texts = json.load(file)
+    # One submission per round, so with several workers the rounds run side by side
+    rounds = [scheduler.submit(texts) for _ in range(MODEL_WARMUP_ROUNDS)]
+    for future in rounds:
+        future.result()
+
+def start_dispatching():
+    """Start taking queued texts, with the concurrency controller when it is enabled."""
+    global concurrency_controller
+    if ADAPTIVE_CONCURRENCY:
+        concurrency_controller = ConcurrencyController(
+            dispatcher.resize,
+            dispatcher.in_progress,
+            limit=CONCURRENCY_INITIAL,
+            min_limit=CONCURRENCY_MIN,
+            max_limit=CONCURRENCY_MAX,
+            set_threads=None if worker_pool is not None else (
+                lambda threads: scheduler.call_between_batches(lambda: inference_backend.set_threads(threads))
+            ),
+            threads=inference_backend.threads() or None,
+            interval=float(os.getenv("CONCURRENCY_INTERVAL_SECONDS", "5"))
+        )
+    dispatcher.start()
+
+# The server binds right away; jobs submitted meanwhile queue until the model is ready
+model_loader = ModelLoader(load_model, warm_up_model, start_dispatching)
+model_loader.start()
+
+def admit(new_computation):
+    """Raise Overloaded when one more job (and queued text) would pass the admission limits. Caller holds admission_lock."""
+    queue_depth = jobs.queue_depth()
+    if len(jobs) >= MAX_JOBS:
+        # Make room by dropping stale jobs, then the oldest finished ones
+        jobs.evict_oldest(len(jobs) - MAX_JOBS + 1)
+        if len(jobs) >= MAX_JOBS:
+            raise Overloaded("Too many jobs", service_rate.retry_after(queue_depth))
+
+    if jobs.outstanding() >= MAX_OUTSTANDING_JOBS:
+        raise Overloaded("Too many outstanding jobs", service_rate.retry_after(queue_depth))
+    if new_computation and queue_depth >= MAX_QUEUE_DEPTH:
+        raise Overloaded("Prediction queue is full", service_rate.retry_after(queue_depth - MAX_QUEUE_DEPTH + 1))
+
+def is_job_id(value):
+    """Whether the value is a job ID (a UUID) rather than a content hash."""
+    try:
+        uuid.UUID(value)
+    except (ValueError, TypeError, AttributeError):
+        return False
+    return True
+
+def is_previous_version(value):
+    """Whether the value can name a previous version of a text: a job ID or a content hash."""
+    return isinstance(value, str) and (is_job_id(value) or re.fullmatch(r"[0-9a-f]{64}", value) is not None)
+
+def restore_segments(previous):
+    """
+    Put the sentence scores of a previous version of the text back into the segment cache.
+
+    `previous` is the job ID or content hash of that version. Its segments are
+    kept with its cached result, so none are restored once that has expired.
+    """
+    content_hash = previous
+    if is_job_id(previous):
+        job = jobs.get(previous)
+        content_hash = job.content_hash if job is not None else None
+    entry = result_cache.get(content_hash, count=False) if content_hash else None
+    segments = entry.get("segments") if isinstance(entry, dict) else None
+    sentence_scores.restore(segments or {})
+
+def create_job(description, previous=None):
+    """
+    Create a job for the text and return it.
+
+    The job is finished straight away from the result cache, attached to a
+    queued copy of the same text or queued in the job store for a worker.
+    With `previous` (the job ID or content hash of an earlier version of the
+    text) the scores of its unchanged sentences are reused in sentences mode;
+    text mode has no segments, so it is ignored there. Raises Overloaded
+    when the job is not admitted.
+    """
+    # Spans are character offsets, so in sentences mode only exact copies of the text share a result
+    cache_key = content_key(description, CACHE_VERSION, normalize=TOXICITY_MODE == "text")
+    cached = result_cache.get(cache_key)
+    if cached is None and previous is not None and TOXICITY_MODE == "sentences":
+        restore_segments(previous)
+
+    with admission_lock:
+        leader = jobs.attached(cache_key) if cached is None else None
+        admit(new_computation=cached is None and not leader)
+
+        if cached is not None:
+            # Finish the job here, the text was scored before
+            result, spans = (cached, None) if TOXICITY_MODE == "text" else (cached["result"], cached["spans"])
+            return jobs.create(
+                status="done", result=result, spans=spans, content_hash=cache_key, timestamp=time.time(),
+                timings={"cache_hit": True, "total": 0.0}
+            )
+
+        first = jobs.get(leader[0]) if leader else None
+        job = jobs.create(
+            status="predicting" if first is not None and first.status == "predicting" else "waiting",
+            content_hash=cache_key
+        )
+
+        # Shares the queued copy if there still is one, queues the text otherwise
+        jobs.join(cache_key, job.job_id, description)
+        return job
 
 def cleanup_jobs():
-    """Continuously remove completed jobs after 5 minutes."""
+    """Continuously remove completed jobs 5 minutes after they finished."""
     while True:
-        time.sleep(30)
-        now = time.time()
-        with job_lock:
-            expired = [job_id for job_id, data in jobs.items()
-                       if data['status'] == 'done' and now - data['timestamp'] > 300]
-            for job_id in expired:
-                del jobs[job_id]
+        time.sleep(1)
+        jobs.evict_expired()
 
 # Start cleanup thread
 cleanup_thread = threading.Thread(target=cleanup_jobs, daemon=True)
@@ -119,6 +533,57 @@ def token_required(f):
         return f(*args, **kwargs)
     return decorated
 
+def admin_required(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        ADMIN_API_KEY = app.config['ADMIN_API_KEY']
+
+        if not ADMIN_API_KEY:
+            return jsonify({"error": "Admin endpoints are disabled"}), 403
+
+        # Checked on top of the bearer token
+        admin_key = request.headers.get('X-Admin-Key', '')
+        if not hmac.compare_digest(admin_key.encode(), ADMIN_API_KEY.encode()):
+            return jsonify({"error": "Invalid admin key"}), 403
+
+        return f(*args, **kwargs)
+    return decorated
+
+def overloaded_response(e, **extra):
+    """429 response for a request turned away by admission control."""
+    response = jsonify({"error": e.message, "retry_after": e.retry_after, **extra})
+    response.headers["Retry-After"] = str(e.retry_after)
+    return response, 429
+
+def wait_seconds():
+    """Read the optional ?wait=<seconds> query parameter, capped at MAX_WAIT_SECONDS (None when invalid)."""
+    try:
+        wait = float(request.args.get("wait", 0))
+    except ValueError:
+        return None
+    if wait != wait or wait < 0:
+        return None
+    return min(wait, MAX_WAIT_SECONDS)
+
+def job_response(job):
+    """Public view of a job record."""
+    return {
+        "job_id": job.job_id,
+        "status": job.status,
+        "result": job.result if job.status == "done" else {},
+        **({"spans": job.spans if job.status == "done" else []} if TOXICITY_MODE == "sentences" else {}),
+        "content_hash": job.content_hash,
+        **({"error": job.error} if job.status == "failed" else {})
+    }
+
+def job_debug_response(job):
+    """Public view of a job record with its timing breakdown."""
+    return {**job_response(job), "timings": job.timings}
+
+def job_status(job):
+    """Short view of a job record returned on submission."""
+    return {"job_id": job.job_id, "status": job.status, "content_hash": job.content_hash}
+
 @app.route("/predict", methods=["POST"])
 @token_required
 def predict_endpoint():
@@ -131,7 +596,16 @@ def predict_endpoint():
     description: >
       Accepts a text input and returns a job ID.
       The job is processed asynchronously and can be retrieved using `/result/<job_id>`.
+      With `wait`, the result is returned inline when the job finishes within that many seconds.
+      For an edited text, pass the job ID or `content_hash` of the previous version as `previous`
+      so that, with TOXICITY_MODE=sentences, only its changed sentences are scored. In the default text mode
+      `previous` is ignored and the whole text is scored again.
     parameters:
+      - name: wait
+        in: query
+        required: false
+        type: number
+        description: Seconds to wait for the result before returning the job ID (capped by MAX_WAIT_SECONDS).
       - in: body
         name: body
         required: true
@@ -143,6 +617,10 @@ def predict_endpoint():
             description:
               type: string
               example: "You are the worst person ever"
+            previous:
+              type: string
+              description: Job ID or content hash of the previous version of an edited text.
+              example: "b1fc03a9-9450-41ad-9217-2fa188c44d09"
     responses:
       200:
         description: Job successfully submitted.
@@ -154,7 +632,14 @@ def predict_endpoint():
               example: "b1fc03a9-9450-41ad-9217-2fa188c44d09"
             status:
               type: string
+              enum: [waiting, predicting, done, failed]
               example: "waiting"
+            content_hash:
+              type: string
+              description: Identifies this version of the text, to pass as `previous` after an edit.
+            result:
+              type: object
+              description: Only present when `wait` was given and the job finished in time.
       400:
         description: Invalid or missing input.
         schema:
@@ -163,6 +648,17 @@ def predict_endpoint():
             error:
               type: string
               example: "Description must be a non-empty string"
+      429:
+        description: Too many queued or outstanding jobs, retry after the `Retry-After` header (seconds).
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Prediction queue is full"
+            retry_after:
+              type: integer
+              example: 12
       415:
         description: Content-Type must be application/json.
         schema:
@@ -181,16 +677,129 @@ def predict_endpoint():
     if not isinstance(description, str) or not description.strip():
         return jsonify({"error": "Description must be a non-empty string"}), 400
 
-    job_id = str(uuid.uuid4())
-    with job_lock:
-        jobs[job_id] = {
-            "status": "waiting",
-            "result": {},
-            "timestamp": None
-        }
+    previous = data.get("previous")
+    if previous is not None and not is_previous_version(previous):
+        return jsonify({"error": "previous must be a job ID or content hash"}), 400
+
+    wait = wait_seconds()
+    if wait is None:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    description = description.strip()
+    try:
+        job = create_job(description, previous)
+    except Overloaded as e:
+        return overloaded_response(e)
+
+    if wait and jobs.wait(job, wait):
+        return jsonify(jobs.read(job, job_response))
+    return jsonify(jobs.read(job, job_status))
+
+@app.route("/predict/batch", methods=["POST"])
+@token_required
+def predict_batch_endpoint():
+    """
+    Submit many texts for toxicity prediction at once.
+    ---
+    tags:
+      - Prediction
+    summary: Submit a list of texts for toxicity prediction
+    description: >
+      Accepts a list of texts and returns one job ID per text, in the same order.
+      The texts are queued as one submission so they are scored in shared batches.
+      Results can be retrieved using `/results?ids=...` or `/result/<job_id>`.
+    parameters:
+      - in: body
+        name: body
+        required: true
+        schema:
+          type: object
+          required:
+            - descriptions
+          properties:
+            descriptions:
+              type: array
+              items:
+                type: string
+              example: ["You are the worst person ever", "Have a nice day"]
+    responses:
+      200:
+        description: Jobs successfully submitted.
+        schema:
+          type: object
+          properties:
+            jobs:
+              type: array
+              items:
+                type: object
+                properties:
+                  job_id:
+                    type: string
+                    example: "b1fc03a9-9450-41ad-9217-2fa188c44d09"
+                  status:
+                    type: string
+                    enum: [waiting, predicting, done, failed]
+                    example: "waiting"
+      400:
+        description: Invalid or missing input.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Descriptions must be a non-empty list of non-empty strings"
+      429:
+        description: Too many queued or outstanding jobs, retry after the `Retry-After` header (seconds).
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Prediction queue is full"
+            retry_after:
+              type: integer
+              example: 12
+            jobs:
+              type: array
+              description: Jobs accepted before the limit was reached, in order.
+              items:
+                type: object
+      415:
+        description: Content-Type must be application/json.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "Content-Type must be application/json"
+    """
+    if not request.is_json:
+        return jsonify({"error": "Content-Type must be application/json"}), 415
+
+    data = request.get_json()
 
-    executor.submit(predict_job, job_id, description.strip())
-    return jsonify({"job_id": job_id, "status": "waiting"})
+    descriptions = data.get("descriptions") if isinstance(data, dict) else None
+    if (not isinstance(descriptions, list) or not descriptions
+            or not all(isinstance(description, str) and description.strip() for description in descriptions)):
+        return jsonify({"error": "Descriptions must be a non-empty list of non-empty strings"}), 400
+    if len(descriptions) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} descriptions per batch"}), 400
+
+    created = []
+    rejected = None
+    for description in (description.strip() for description in descriptions):
+        try:
+            job = create_job(description)
+        except Overloaded as e:
+            rejected = e
+            break
+        created.append(job)
+
+    accepted = [jobs.read(job, job_status) for job in created]
+    if rejected is not None:
+        # The accepted prefix keeps running, the client resubmits the rest later
+        return overloaded_response(rejected, jobs=accepted)
+    return jsonify({"jobs": accepted})
 
 @app.route("/result/<job_id>", methods=["GET"])
 @token_required
@@ -210,6 +819,16 @@ def get_result(job_id):
         required: true
         type: string
         description: The job ID returned by the `/predict` endpoint.
+      - name: wait
+        in: query
+        required: false
+        type: number
+        description: Seconds to block until the job is done (capped by MAX_WAIT_SECONDS).
+      - name: debug
+        in: query
+        required: false
+        type: integer
+        description: Set to 1 to include the seconds spent per stage once the job is done.
     responses:
       200:
         description: Job status (and result if completed).
@@ -220,7 +839,7 @@ def get_result(job_id):
               type: string
             status:
               type: string
-              enum: [waiting, predicting, done]
+              enum: [waiting, predicting, done, failed]
             result:
               type: object
               additionalProperties:
@@ -230,6 +849,35 @@ def get_result(job_id):
                 toxicity: 0.123
                 severe_toxicity: 0.045
                 obscene: 0.078
+            spans:
+              type: array
+              description: >
+                Only with TOXICITY_MODE=sentences. The most toxic sentences, highest first, with their
+                character offsets into the submitted text (leading and trailing whitespace removed).
+              items:
+                type: object
+                properties:
+                  start:
+                    type: integer
+                  end:
+                    type: integer
+                  text:
+                    type: string
+                  scores:
+                    type: object
+                    additionalProperties:
+                      type: number
+                      format: float
+            error:
+              type: string
+              description: Only for `failed` jobs, why the prediction failed.
+            timings:
+              type: object
+              description: >
+                Only with `debug=1`. Seconds spent queued, tokenizing the batch, in the forward passes of the
+                text's length groups, from hand-off to the model until done, and in total; `cache_hit` is
+                true when the result came from the result cache. In sentences mode, also the number of
+                sentences and how many of them were not in the cache.
       404:
         description: Job not found or invalid.
         schema:
@@ -244,17 +892,87 @@ def get_result(job_id):
     except (ValueError, TypeError):
         return jsonify({"error": "Job ID not found"}), 404
 
-    with job_lock:
-        job = jobs.get(job_id)
+    wait = wait_seconds()
+    if wait is None:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+
+    job = jobs.get(job_id)
 
     if not job:
         return jsonify({"error": "Job ID not found"}), 404
 
-    return jsonify({
-        "job_id": job_id,
-        "status": job["status"],
-        "result": job["result"] if job["status"] == "done" else {}
-    })
+    # Long-poll: block until the job finishes or the wait runs out
+    if wait:
+        jobs.wait(job, wait)
+
+    if request.args.get("debug") == "1":
+        return jsonify(jobs.read(job, job_debug_response))
+    return jsonify(jobs.read(job, job_response))
+
+@app.route("/results", methods=["GET"])
+@token_required
+def get_results():
+    """
+    Retrieve prediction results for many jobs.
+    ---
+    tags:
+      - Prediction
+    summary: Get the status and result of several jobs using their job IDs
+    description: >
+      Returns the current status of every listed job in one response, in the requested order.
+      Unknown or expired job IDs are reported with an error instead of a status.
+    parameters:
+      - name: ids
+        in: query
+        required: true
+        type: string
+        description: Comma separated job IDs returned by `/predict` or `/predict/batch`.
+    responses:
+      200:
+        description: Job statuses (and results if completed).
+        schema:
+          type: object
+          properties:
+            jobs:
+              type: array
+              items:
+                type: object
+                properties:
+                  job_id:
+                    type: string
+                  status:
+                    type: string
+                    enum: [waiting, predicting, done, failed]
+                  result:
+                    type: object
+                    additionalProperties:
+                      type: number
+                      format: float
+                  spans:
+                    type: array
+                    description: Only with TOXICITY_MODE=sentences, see `/result/{job_id}`.
+                    items:
+                      type: object
+                  error:
+                    type: string
+                    example: "Job ID not found"
+      400:
+        description: Missing or too many job IDs.
+        schema:
+          type: object
+          properties:
+            error:
+              type: string
+              example: "ids must be a comma separated list of job IDs"
+    """
+    job_ids = [job_id.strip() for job_id in request.args.get("ids", "").split(",") if job_id.strip()]
+    if not job_ids:
+        return jsonify({"error": "ids must be a comma separated list of job IDs"}), 400
+    if len(job_ids) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} job IDs per request"}), 400
+
+    results = jobs.read_many(job_ids, job_response, lambda job_id: {"job_id": job_id, "error": "Job ID not found"})
+    return jsonify({"jobs": results})
 
 @app.route("/status", methods=["GET"])
 def get_status():
@@ -277,6 +995,261 @@ def get_status():
     """
     return jsonify({"status": True})
 
+@app.route("/ready", methods=["GET"])
+def get_ready():
+    """
+    Get API readiness
+    ---
+    tags:
+      - Utility
+    summary: Get API readiness
+    description: >
+      Returns 200 once the model is loaded and the warm-up inferences have run, 503 before that.
+      `/status` reports the process is up; use this endpoint for readiness probes.
+    responses:
+      200:
+        description: Model loaded and warmed up.
+        schema:
+          type: object
+          properties:
+            ready:
+              type: boolean
+              example: true
+            state:
+              type: string
+              enum: [loading, warming_up, ready, failed]
+              example: "ready"
+            load_seconds:
+              type: number
+              format: float
+              example: 8.412
+            warm_up_seconds:
+              type: number
+              format: float
+              example: 1.937
+            error:
+              type: string
+              example: null
+      503:
+        description: Model still loading or warming up, or loading failed.
+    """
+    readiness = model_loader.snapshot()
+    return jsonify(readiness), 200 if readiness["ready"] else 503
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    """
+    Get service metrics
+    ---
+    tags:
+      - Utility
+    summary: Get service metrics in the Prometheus text format
+    description: >
+      Returns the job queue depth, job counts by status, result cache hit counters, process RSS and
+      histograms of queue wait, tokenization, model forward time and end-to-end job time,
+      in the Prometheus text exposition format.
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: Metrics, e.g. `job_queue_depth 3`
+    """
+    return Response(metrics.render(), content_type=metrics.content_type)
+
+@app.route("/concurrency", methods=["GET"])
+def get_concurrency():
+    """
+    Get the current concurrency decisions
+    ---
+    tags:
+      - Utility
+    summary: Get the current concurrency decisions
+    description: >
+      Returns the number of texts scored at once and the intra-op thread count picked by the
+      adaptive concurrency controller, with the throughput and latency measured over its last window.
+    responses:
+      200:
+        description: Concurrency decisions
+        schema:
+          type: object
+          properties:
+            adaptive:
+              type: boolean
+              example: true
+            limit:
+              type: integer
+              example: 96
+            in_progress:
+              type: integer
+              example: 64
+            threads:
+              type: integer
+              example: 4
+            thread_tuning:
+              type: string
+              enum: [probing, holding, "off"]
+              example: "holding"
+            throughput:
+              type: number
+              format: float
+              example: 41.5
+            latency:
+              type: number
+              format: float
+              example: 0.38
+    """
+    if concurrency_controller is None:
+        return jsonify({"adaptive": False, "limit": dispatcher.slots, "in_progress": dispatcher.in_progress()})
+    return jsonify(concurrency_controller.snapshot())
+
+@app.route("/admin/profile", methods=["POST"])
+@token_required
+@admin_required
+def start_profile():
+    """
+    Profile the next jobs
+    ---
+    tags:
+      - Admin
+    summary: Turn on profiling for the next N jobs
+    description: >
+      Requires the `X-Admin-Key` header to match ADMIN_API_KEY. The batches scoring the next `jobs` texts
+      are profiled with a stack sampler over the inference threads (`sample`) or with cProfile (`cprofile`);
+      fetch the aggregated profile from `GET /admin/profile`. Batches run in INFERENCE_WORKERS processes
+      are not profiled.
+    parameters:
+      - in: body
+        name: body
+        required: false
+        schema:
+          type: object
+          properties:
+            jobs:
+              type: integer
+              example: 20
+            mode:
+              type: string
+              enum: [sample, cprofile]
+              example: "sample"
+            interval_ms:
+              type: number
+              example: 5
+    responses:
+      202:
+        description: Profiler armed.
+      400:
+        description: Invalid parameters.
+      403:
+        description: Admin endpoints disabled or wrong admin key.
+      409:
+        description: A profile is still being collected.
+    """
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Invalid JSON structure"}), 400
+
+    count = data.get("jobs", 10)
+    mode = data.get("mode", "sample")
+    interval = data.get("interval_ms", 5)
+    if not isinstance(count, int) or isinstance(count, bool) or not 1 <= count <= 10000:
+        return jsonify({"error": "jobs must be an integer between 1 and 10000"}), 400
+    if mode not in PROFILE_MODES:
+        return jsonify({"error": f"mode must be one of {', '.join(PROFILE_MODES)}"}), 400
+    if not isinstance(interval, (int, float)) or isinstance(interval, bool) or not 1 <= interval <= 1000:
+        return jsonify({"error": "interval_ms must be a number between 1 and 1000"}), 400
+
+    if not profiler.start(count, mode, interval / 1000):
+        return jsonify({"error": "A profile is still being collected"}), 409
+    return jsonify({"status": "running", "mode": mode, "jobs_requested": count}), 202
+
+@app.route("/admin/profile", methods=["GET"])
+@token_required
+@admin_required
+def get_profile():
+    """
+    Get the aggregated profile
+    ---
+    tags:
+      - Admin
+    summary: Get the profile of the last profiled jobs
+    description: >
+      Requires the `X-Admin-Key` header to match ADMIN_API_KEY. Returns the profiler status and, once
+      the requested jobs are done, the hottest lines and collapsed stacks (`sample`) or the functions
+      by cumulative time (`cprofile`).
+    parameters:
+      - name: wait
+        in: query
+        required: false
+        type: number
+        description: Seconds to block until the profile is complete (capped by MAX_WAIT_SECONDS).
+    responses:
+      200:
+        description: Profiler status and profile.
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              enum: [idle, running, done]
+            jobs_requested:
+              type: integer
+            jobs_profiled:
+              type: integer
+            profile:
+              type: object
+      403:
+        description: Admin endpoints disabled or wrong admin key.
+    """
+    wait = wait_seconds()
+    if wait is None:
+        return jsonify({"error": "wait must be a number of seconds"}), 400
+    return jsonify(profiler.result(wait))
+
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    """
+    Get result cache statistics
+    ---
+    tags:
+      - Utility
+    summary: Get result cache statistics
+    description: >
+      Returns the size and the hit, miss and eviction counters of the result cache, and under `segments`
+      those of the cache of sentence scores.
+    responses:
+      200:
+        description: Cache statistics
+        schema:
+          type: object
+          properties:
+            entries:
+              type: integer
+              example: 120
+            max_entries:
+              type: integer
+              example: 10000
+            hits:
+              type: integer
+              example: 42
+            disk_hits:
+              type: integer
+              example: 3
+            misses:
+              type: integer
+              example: 120
+            evictions:
+              type: integer
+              example: 0
+            hit_rate:
+              type: number
+              format: float
+              example: 0.2593
+            segments:
+              type: object
+              description: The same statistics for the cache of sentence scores.
+    """
+    return jsonify({**result_cache.stats(), "segments": segment_cache.stats()})
+
 # ------------------------------------------------------------------------------
 # Graceful shutdown
 # ------------------------------------------------------------------------------
@@ -287,7 +1260,11 @@ def shutdown_handler(sig, frame):
 
     def shutdown_executor_with_timeout():
         try:
-            executor._threads.clear()
+            scheduler.stop(timeout=2)
+            if worker_pool is not None:
+                worker_pool.close(timeout=2)
+            result_cache.close()
+            jobs.close()
             cleanup_thread.join(timeout=5)
             stop_event.set()
         except Exception as e:
@@ -0,0 +1,43 @@
+import os
+import json
+import argparse
+
+
+# ------------------------------------------------------------------------------
+# Hugging Face model setup
+# ------------------------------------------------------------------------------
+os.environ["TORCH_HOME"] = "./model_cache"
+os.environ["HF_HOME"] = "./hf_cache"
+os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
+
+from detoxify import Detoxify
+from inference_backend import export_onnx
+
+# ------------------------------------------------------------------------------
+# One-shot ONNX export and int8 quantization for INFERENCE_BACKEND=onnx
+# ------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Export the Detoxify model to ONNX (fp32 and int8).")
+    parser.add_argument(
+        "--artifact-dir",
+        default=os.getenv("INFERENCE_ARTIFACT_DIR", "./model_cache/inference"),
+        help="Directory the app loads ONNX models from (INFERENCE_ARTIFACT_DIR)."
+    )
+    args = parser.parse_args()
+
+    model = Detoxify('original')
+    sample = model.tokenizer(
+        ["You are the worst person ever", "Thank you so much for your help"],
+        return_tensors="pt",
+        truncation=True,
+        padding=True
+    )
+    print("Wrote", *export_onnx(model.model, sample, args.artifact_dir))
+
+    # The app loads these instead of the torch checkpoint when using the onnx backend
+    model.tokenizer.save_pretrained(os.path.join(args.artifact_dir, "tokenizer"))
+    with open(os.path.join(args.artifact_dir, "class_names.json"), 'w', encoding='utf-8') as file:
+        json.dump(model.class_names, file)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+# ------------------------------------------------------------------------------ #
+# Cross-request micro-batching scheduler
+# ------------------------------------------------------------------------------ #
+class _Request:
+    """A queued submission whose items may be spread over several batches."""
+
+    __slots__ = ("items", "tokens", "outputs", "future", "on_start", "enqueued", "taken", "remaining")
+
+    def __init__(self, items, tokens, future, on_start):
+        self.items = items
+        self.tokens = tokens
+        self.outputs = [None] * len(items)
+        self.future = future
+        self.on_start = on_start
+        self.enqueued = time.monotonic()
+        self.taken = 0
+        self.remaining = len(items)
+
+
+class InferenceScheduler:
+    """
+    Gather items submitted by many jobs into shared model batches.
+
+    A single worker thread owns the model. It waits until `max_batch_size`
+    items are queued or the oldest queued item has waited `max_wait` seconds,
+    runs `run_batch` once over the whole batch and hands each job its outputs.
+    With `max_batch_tokens` a batch also stops growing before its items,
+    padded to the longest by `item_tokens`, would take more tokens than that;
+    an item longer than the limit is run alone.
+    With `concurrency` > 1 that many threads form and run batches side by
+    side, for a `run_batch` that hands them to separate worker processes.
+    """
+
+    def __init__(self, run_batch, max_batch_size=128, max_wait=0.01, concurrency=1, max_batch_tokens=None,
+                 item_tokens=len):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, int(max_batch_size))
+        self.max_batch_tokens = int(max_batch_tokens) if max_batch_tokens else None
+        self.item_tokens = item_tokens
+        self.max_wait = max(0.0, float(max_wait))
+        self._pending = deque()
+        self._calls = []
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._threads = [
+            threading.Thread(target=self._loop, name=f"inference-scheduler-{index}", daemon=True)
+            for index in range(max(1, int(concurrency)))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, items, on_start=None):
+        """
+        Queue a list of items and return a Future of their outputs in the same order.
+
+        `on_start` is called from the worker thread when the first item is handed to the model.
+        """
+        future = Future()
+        items = list(items)
+        if not items:
+            future.set_result([])
+            return future
+
+        with self._cond:
+            if self._stopped:
+                raise RuntimeError("Inference scheduler is stopped")
+            self._pending.append(_Request(items, [self.item_tokens(item) for item in items], future, on_start))
+            self._cond.notify()
+        return future
+
+    def call_between_batches(self, call):
+        """Run `call()` on a worker thread before its next batch, when no forward pass of that thread is running."""
+        with self._cond:
+            self._calls.append(call)
+
+    def pending_items(self):
+        """Number of items queued but not yet handed to the model."""
+        with self._cond:
+            return sum(len(req.items) - req.taken for req in self._pending)
+
+    def stop(self, timeout=None):
+        """Stop the worker threads once the queue has drained."""
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+
+    def _fits(self, size, longest, tokens):
+        """Whether an item of `tokens` tokens can join a batch of `size` items padded to `longest`."""
+        if size >= self.max_batch_size:
+            return False
+        return size == 0 or self.max_batch_tokens is None or (size + 1) * max(longest, tokens) <= self.max_batch_tokens
+
+    def _batch_full(self):
+        """Whether the queued items fill a batch, by count or by padded tokens."""
+        size = longest = 0
+        for req in self._pending:
+            for tokens in req.tokens[req.taken:]:
+                if not self._fits(size, longest, tokens):
+                    return True
+                size += 1
+                longest = max(longest, tokens)
+        return size >= self.max_batch_size
+
+    def _next_batch(self):
+        """Block until a batch is ready and return its (request, start, end) slices."""
+        with self._cond:
+            while not self._pending and not self._stopped:
+                self._cond.wait()
+            if not self._pending:
+                return None
+
+            deadline = self._pending[0].enqueued + self.max_wait
+            while not self._stopped:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._batch_full():
+                    break
+                self._cond.wait(remaining)
+
+            slices = []
+            size = longest = 0
+            while self._pending:
+                req = self._pending[0]
+                if not self._fits(size, longest, req.tokens[req.taken]):
+                    break
+                if req.future.done() or (req.taken == 0 and not req.future.set_running_or_notify_cancel()):
+                    # Cancelled before it started, or an earlier slice already failed
+                    self._pending.popleft()
+                    continue
+                start = end = req.taken
+                while end < len(req.items) and self._fits(size, longest, req.tokens[end]):
+                    longest = max(longest, req.tokens[end])
+                    size += 1
+                    end += 1
+                slices.append((req, start, end))
+                req.taken = end
+                if req.taken == len(req.items):
+                    self._pending.popleft()
+            return slices
+
+    def _loop(self):
+        while True:
+            slices = self._next_batch()
+            if slices is None:
+                return
+            if not slices:
+                continue
+
+            with self._cond:
+                calls, self._calls = self._calls, []
+            for call in calls:
+                try:
+                    call()
+                except Exception as e:
+                    print(f"Call between batches failed: {e}")
+
+            batch = []
+            for req, start, end in slices:
+                if start == 0 and req.on_start is not None:
+                    req.on_start()
+                batch.extend(req.items[start:end])
+
+            try:
+                outputs = self.run_batch(batch)
+            except Exception as e:
+                for req, _, _ in slices:
+                    if not req.future.done():
+                        req.future.set_exception(e)
+                continue
+
+            offset = 0
+            finished = []
+            with self._cond:
+                # Slices of one request may finish on different threads
+                for req, start, end in slices:
+                    count = end - start
+                    req.outputs[start:end] = outputs[offset:offset + count]
+                    offset += count
+                    req.remaining -= count
+                    if req.remaining == 0:
+                        finished.append(req)
+            for req in finished:
+                if not req.future.done():
+                    req.future.set_result(req.outputs)
@@ -0,0 +1,844 @@
+import json
+import time
+import uuid
+import heapq
+import sqlite3
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+
+# ------------------------------------------------------------------------------ #
+# Job records
+# ------------------------------------------------------------------------------ #
+# Statuses of jobs that will not change any more; they expire `ttl` seconds after finishing
+FINISHED_STATUSES = ("done", "failed")
+
+# Unfinished jobs are given up as lost (e.g. their replica died) this many seconds after they were created
+STALE_SECONDS = 3600
+
+
+class Job:
+    """Compact job record; services add their own fields in a subclass with more __slots__."""
+
+    __slots__ = ("job_id", "status", "result", "timestamp", "created", "timings", "error")
+
+    def __init__(self, job_id, status="waiting", result=None, timestamp=None, created=None, timings=None, error=None):
+        self.job_id = job_id
+        self.status = status
+        self.result = result
+        self.timestamp = timestamp
+        self.created = created if created is not None else time.time()
+        # Seconds spent per stage, filled in when the job finishes
+        self.timings = timings
+        # Why the computation failed, for jobs finished as "failed"
+        self.error = error
+
+
+def _record_fields(record_type):
+    """All slot names of a record type except the job ID, base class first."""
+    fields = []
+    for cls in reversed(record_type.__mro__):
+        fields.extend(name for name in cls.__dict__.get("__slots__", ()) if name != "job_id")
+    return fields
+
+
+# ------------------------------------------------------------------------------ #
+# Job stores
+#
+# Every store keeps the job records plus the work queue: each distinct text
+# (cache key) is one computation with the IDs of the jobs waiting on it.
+# `join` attaches a job to the computation of its text, queueing the text when
+# nothing is running for it yet; `claim` hands queued texts to a worker and
+# `complete` detaches the jobs once the worker has finished them.
+#
+# A job not finished `stale` seconds after it was created is considered lost:
+# it no longer counts as outstanding and is evicted with the expired ones.
+# ------------------------------------------------------------------------------ #
+class _Shard:
+    __slots__ = ("lock", "changed", "jobs")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.changed = threading.Condition(self.lock)
+        self.jobs = {}
+
+
+class MemoryJobStore:
+    """
+    Job table split over `shards` independently locked dicts, for a single process.
+
+    Finished jobs are pushed onto an expiry heap, so evicting them costs
+    O(expired) instead of a scan of the whole table; unfinished ones are
+    queued in creation order with their stale deadline and counted, so
+    `outstanding` is O(1). Waiters block on the condition of the job's shard
+    instead of a per-job event.
+    """
+
+    shared = False
+
+    def __init__(self, record_type=Job, ttl=300, shards=16, stale=STALE_SECONDS):
+        self.record_type = record_type
+        self.ttl = ttl
+        self.stale = stale
+        self._shards = [_Shard() for _ in range(max(1, int(shards)))]
+        self._expiry = []
+        self._deadlines = deque()
+        self._unfinished = 0
+        self._expiry_lock = threading.Lock()
+        self._work = {}
+        self._queue = deque()
+        self._work_changed = threading.Condition()
+
+    def _shard(self, job_id):
+        return self._shards[hash(job_id) % len(self._shards)]
+
+    def __len__(self):
+        return sum(len(shard.jobs) for shard in self._shards)
+
+    def create(self, **fields):
+        """Add a new job with a fresh UUID and return its record."""
+        job = self.record_type(str(uuid.uuid4()), **fields)
+        shard = self._shard(job.job_id)
+        with shard.lock:
+            shard.jobs[job.job_id] = job
+        if job.status in FINISHED_STATUSES:
+            self._expire_later(job)
+        else:
+            with self._expiry_lock:
+                self._deadlines.append((job.created + self.stale, job.job_id))
+                self._unfinished += 1
+        return job
+
+    def get(self, job_id):
+        """Return the job record, or None when it does not exist or has expired."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            return shard.jobs.get(job_id)
+
+    def read(self, job, render):
+        """Call `render(job)` on the current state of the job and return its result."""
+        with self._shard(job.job_id).lock:
+            return render(job)
+
+    def read_many(self, job_ids, render, missing):
+        """Render many jobs in order, taking each shard lock once; unknown IDs go through `missing(job_id)`."""
+        by_shard = {}
+        for index, job_id in enumerate(job_ids):
+            by_shard.setdefault(self._shard(job_id), []).append((index, job_id))
+
+        results = [None] * len(job_ids)
+        for shard, entries in by_shard.items():
+            with shard.lock:
+                for index, job_id in entries:
+                    job = shard.jobs.get(job_id)
+                    results[index] = render(job) if job is not None else missing(job_id)
+        return results
+
+    def update(self, job_id, **fields):
+        """Set fields on the job and wake anyone waiting on it."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            if job is None:
+                return
+            for name, value in fields.items():
+                setattr(job, name, value)
+            shard.changed.notify_all()
+
+    def finish(self, job_id, status="done", **fields):
+        """Mark the job finished (done or failed) with the given fields; it is evicted `ttl` seconds from now."""
+        shard = self._shard(job_id)
+        with shard.lock:
+            job = shard.jobs.get(job_id)
+            if job is None:
+                return
+            was_unfinished = job.status not in FINISHED_STATUSES
+            for name, value in {"status": status, "timestamp": time.time(), **fields}.items():
+                setattr(job, name, value)
+            shard.changed.notify_all()
+        self._expire_later(job, was_unfinished)
+
+    def fail(self, cache_key, error):
+        """Detach the jobs from a computation that raised, finish them as failed and return their IDs."""
+        job_ids = self.complete(cache_key)
+        for job_id in job_ids:
+            self.finish(job_id, status="failed", error=error)
+        return job_ids
+
+    def wait(self, job, timeout, predicate=None):
+        """Block until the job is finished (or `predicate(job)` holds) or the timeout passes; returns the outcome."""
+        shard = self._shard(job.job_id)
+        with shard.lock:
+            return shard.changed.wait_for(
+                lambda: job.status in FINISHED_STATUSES or (predicate is not None and predicate(job)), timeout=timeout
+            )
+
+    def _expire_later(self, job, was_unfinished=False):
+        with self._expiry_lock:
+            heapq.heappush(self._expiry, (job.timestamp + self.ttl, job.job_id))
+            if was_unfinished:
+                self._unfinished -= 1
+
+    def _evict(self, limit, now=None):
+        """Pop expiry entries (all due ones when `now` is given, else the `limit` oldest) and drop their jobs."""
+        evicted = 0
+        while evicted < limit:
+            with self._expiry_lock:
+                if not self._expiry or (now is not None and self._expiry[0][0] > now):
+                    break
+                _, job_id = heapq.heappop(self._expiry)
+            shard = self._shard(job_id)
+            with shard.lock:
+                if shard.jobs.pop(job_id, None) is not None:
+                    evicted += 1
+        return evicted
+
+    def _evict_stale(self, now):
+        """Drop the unfinished jobs past their stale deadline and forget the deadlines of finished ones."""
+        evicted = 0
+        while True:
+            with self._expiry_lock:
+                if not self._deadlines:
+                    break
+                entry = self._deadlines[0]
+            deadline, job_id = entry
+            shard = self._shard(job_id)
+            with shard.lock:
+                job = shard.jobs.get(job_id)
+                running = job is not None and job.status not in FINISHED_STATUSES
+                if running and deadline > now:
+                    # Deadlines are in creation order, the jobs behind this one are not stale either
+                    break
+                if running:
+                    del shard.jobs[job_id]
+            with self._expiry_lock:
+                if self._deadlines and self._deadlines[0] is entry:
+                    self._deadlines.popleft()
+                if running:
+                    self._unfinished -= 1
+                    evicted += 1
+        return evicted
+
+    def evict_expired(self):
+        """Drop finished jobs whose TTL has passed and stale unfinished ones; return how many were dropped."""
+        now = time.time()
+        return self._evict(float("inf"), now=now) + self._evict_stale(now)
+
+    def evict_oldest(self, count):
+        """Drop up to `count` jobs to make room: stale unfinished ones, then finished ones oldest first."""
+        evicted = self._evict_stale(time.time())
+        return evicted + self._evict(count - evicted)
+
+    def status_counts(self):
+        """Number of jobs per status."""
+        counts = {}
+        for shard in self._shards:
+            with shard.lock:
+                for job in shard.jobs.values():
+                    counts[job.status] = counts.get(job.status, 0) + 1
+        return counts
+
+    def in_flight(self, cache_key):
+        """Whether a computation for the text is queued or running."""
+        with self._work_changed:
+            return cache_key in self._work
+
+    def join(self, cache_key, job_id, description):
+        """Attach the job to the computation of the text and return the first job's ID, or queue it and return None."""
+        with self._work_changed:
+            entry = self._work.get(cache_key)
+            if entry is not None:
+                entry[1].append(job_id)
+                return entry[1][0]
+            self._work[cache_key] = (description, [job_id])
+            self._queue.append(cache_key)
+            self._work_changed.notify()
+            return None
+
+    def claim(self, limit=1, timeout=None):
+        """Take up to `limit` queued (cache_key, description) pairs, waiting up to `timeout` for the first."""
+        with self._work_changed:
+            if not self._queue:
+                self._work_changed.wait(timeout)
+            claimed = []
+            while self._queue and len(claimed) < limit:
+                cache_key = self._queue.popleft()
+                if cache_key in self._work:
+                    claimed.append((cache_key, self._work[cache_key][0]))
+            return claimed
+
+    def attached(self, cache_key):
+        """IDs of the jobs waiting on the computation of the text."""
+        with self._work_changed:
+            entry = self._work.get(cache_key)
+            return list(entry[1]) if entry is not None else []
+
+    def complete(self, cache_key):
+        """Remove the computation of the text and return the IDs of the jobs that were waiting on it."""
+        with self._work_changed:
+            entry = self._work.pop(cache_key, None)
+            return entry[1] if entry is not None else []
+
+    def queue_depth(self):
+        """Number of computations queued or running."""
+        with self._work_changed:
+            return len(self._work)
+
+    def outstanding(self):
+        """Number of jobs not finished yet, after dropping the stale ones."""
+        self._evict_stale(time.time())
+        with self._expiry_lock:
+            return self._unfinished
+
+    def close(self):
+        pass
+
+
+class _SharedJobStore:
+    """Shared store helpers: records are snapshots, so waiting polls the backend."""
+
+    shared = True
+
+    def __init__(self, record_type, ttl, lease, poll_interval, stale):
+        self.record_type = record_type
+        self.ttl = ttl
+        self.lease = lease
+        self.stale = stale
+        self.poll_interval = poll_interval
+        self._fields = _record_fields(record_type)
+
+    def _decode(self, job_id, data):
+        return self.record_type(job_id, **{name: value for name, value in data.items() if name in self._fields})
+
+    def _refresh(self, job):
+        """Copy the stored state of the job into the record; False when it has expired."""
+        current = self.get(job.job_id)
+        if current is None:
+            return False
+        for name in self._fields:
+            setattr(job, name, getattr(current, name))
+        return True
+
+    def read(self, job, render):
+        """Call `render(job)` on the current state of the job and return its result."""
+        self._refresh(job)
+        return render(job)
+
+    def fail(self, cache_key, error):
+        """Detach the jobs from a computation that raised, finish them as failed and return their IDs."""
+        job_ids = self.complete(cache_key)
+        for job_id in job_ids:
+            self.finish(job_id, status="failed", error=error)
+        return job_ids
+
+    def wait(self, job, timeout, predicate=None):
+        """Poll until the job is finished (or `predicate(job)` holds) or the timeout passes; returns the outcome."""
+        deadline = time.monotonic() + (timeout if timeout is not None else float("inf"))
+        while True:
+            if self._refresh(job) and (job.status in FINISHED_STATUSES or (predicate is not None and predicate(job))):
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(self.poll_interval, remaining))
+
+
+class SqliteJobStore(_SharedJobStore):
+    """
+    Job table and work queue in a SQLite database in WAL mode.
+
+    Every replica on the host opens the same file, so any of them can serve
+    a job's result and claim queued work. Claimed work whose worker has not
+    completed it within `lease` seconds is handed out again. Finished jobs
+    have an `expires` time and unfinished ones a stale `deadline`.
+    """
+
+    def __init__(self, path, record_type=Job, ttl=300, namespace="jobs", lease=120, poll_interval=0.05,
+                 stale=STALE_SECONDS):
+        super().__init__(record_type, ttl, lease, poll_interval, stale)
+        self._jobs = f"{namespace}_jobs"
+        self._work = f"{namespace}_work"
+        self._lock = threading.Lock()
+        self._queued = threading.Condition()
+        self._db = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._transaction() as db:
+            db.execute(
+                f"CREATE TABLE IF NOT EXISTS {self._jobs} "
+                f"(job_id TEXT PRIMARY KEY, data TEXT NOT NULL, expires REAL, deadline REAL)"
+            )
+            # Files created before unfinished jobs had a deadline
+            if "deadline" not in {row[1] for row in db.execute(f"PRAGMA table_info({self._jobs})")}:
+                db.execute(f"ALTER TABLE {self._jobs} ADD COLUMN deadline REAL")
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {self._jobs}_expires ON {self._jobs} (expires)")
+        self._db.execute(f"CREATE INDEX IF NOT EXISTS {self._jobs}_deadline ON {self._jobs} (deadline)")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {self._work} (cache_key TEXT PRIMARY KEY, description TEXT NOT NULL, "
+            f"job_ids TEXT NOT NULL, queued REAL NOT NULL, claimed REAL)"
+        )
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._db.execute(sql, params).fetchall()
+
+    def __len__(self):
+        return self._query(f"SELECT COUNT(*) FROM {self._jobs}")[0][0]
+
+    def create(self, **fields):
+        """Add a new job with a fresh UUID and return its record."""
+        job = self.record_type(str(uuid.uuid4()), **fields)
+        data = {name: getattr(job, name) for name in self._fields}
+        if job.status in FINISHED_STATUSES:
+            expires, deadline = job.timestamp + self.ttl, None
+        else:
+            expires, deadline = None, job.created + self.stale
+        with self._transaction() as db:
+            db.execute(f"INSERT INTO {self._jobs} (job_id, data, expires, deadline) VALUES (?, ?, ?, ?)",
+                       (job.job_id, json.dumps(data), expires, deadline))
+        return job
+
+    def get(self, job_id):
+        """Return a snapshot of the job record, or None when it does not exist or has expired."""
+        rows = self._query(f"SELECT data FROM {self._jobs} WHERE job_id = ?", (job_id,))
+        return self._decode(job_id, json.loads(rows[0][0])) if rows else None
+
+    def read_many(self, job_ids, render, missing):
+        """Render many jobs in order from one query; unknown IDs go through `missing(job_id)`."""
+        rows = self._query(
+            f"SELECT job_id, data FROM {self._jobs} WHERE job_id IN ({', '.join('?' * len(job_ids))})", job_ids
+        )
+        found = {job_id: self._decode(job_id, json.loads(data)) for job_id, data in rows}
+        return [render(found[job_id]) if job_id in found else missing(job_id) for job_id in job_ids]
+
+    def _set(self, job_id, fields, expires=None):
+        with self._transaction() as db:
+            row = db.execute(f"SELECT data FROM {self._jobs} WHERE job_id = ?", (job_id,)).fetchone()
+            if row is None:
+                return
+            data = json.loads(row[0])
+            data.update(fields)
+            if expires is None:
+                db.execute(f"UPDATE {self._jobs} SET data = ? WHERE job_id = ?", (json.dumps(data), job_id))
+            else:
+                db.execute(f"UPDATE {self._jobs} SET data = ?, expires = ?, deadline = NULL WHERE job_id = ?",
+                           (json.dumps(data), expires, job_id))
+
+    def update(self, job_id, **fields):
+        """Set fields on the job."""
+        self._set(job_id, fields)
+
+    def finish(self, job_id, status="done", **fields):
+        """Mark the job finished (done or failed) with the given fields; it is evicted `ttl` seconds from now."""
+        now = time.time()
+        self._set(job_id, {"status": status, "timestamp": now, **fields}, expires=now + self.ttl)
+
+    def evict_expired(self):
+        """Drop finished jobs whose TTL has passed and stale unfinished ones; return how many were dropped."""
+        now = time.time()
+        with self._transaction() as db:
+            return db.execute(f"DELETE FROM {self._jobs} WHERE expires <= ? OR deadline <= ?", (now, now)).rowcount
+
+    def evict_oldest(self, count):
+        """Drop up to `count` jobs to make room: stale unfinished ones, then finished ones oldest first."""
+        with self._transaction() as db:
+            stale = db.execute(
+                f"DELETE FROM {self._jobs} WHERE job_id IN (SELECT job_id FROM {self._jobs} "
+                f"WHERE deadline <= ? LIMIT ?)", (time.time(), count)
+            ).rowcount
+            return stale + db.execute(
+                f"DELETE FROM {self._jobs} WHERE job_id IN (SELECT job_id FROM {self._jobs} "
+                f"WHERE expires IS NOT NULL ORDER BY expires LIMIT ?)", (count - stale,)
+            ).rowcount
+
+    def status_counts(self):
+        """Number of jobs per status."""
+        return dict(self._query(
+            f"SELECT json_extract(data, '$.status'), COUNT(*) FROM {self._jobs} GROUP BY json_extract(data, '$.status')"
+        ))
+
+    def in_flight(self, cache_key):
+        """Whether a computation for the text is queued or running."""
+        return bool(self._query(f"SELECT 1 FROM {self._work} WHERE cache_key = ?", (cache_key,)))
+
+    def join(self, cache_key, job_id, description):
+        """Attach the job to the computation of the text and return the first job's ID, or queue it and return None."""
+        with self._transaction() as db:
+            row = db.execute(f"SELECT job_ids FROM {self._work} WHERE cache_key = ?", (cache_key,)).fetchone()
+            if row is not None:
+                job_ids = json.loads(row[0])
+                db.execute(f"UPDATE {self._work} SET job_ids = ? WHERE cache_key = ?",
+                           (json.dumps(job_ids + [job_id]), cache_key))
+                return job_ids[0]
+            db.execute(f"INSERT INTO {self._work} (cache_key, description, job_ids, queued) VALUES (?, ?, ?, ?)",
+                       (cache_key, description, json.dumps([job_id]), time.time()))
+        with self._queued:
+            self._queued.notify()
+        return None
+
+    def claim(self, limit=1, timeout=None):
+        """Take up to `limit` queued (cache_key, description) pairs, waiting up to `timeout` for the first."""
+        deadline = time.monotonic() + (timeout or 0)
+        while True:
+            now = time.time()
+            with self._transaction() as db:
+                rows = db.execute(
+                    f"SELECT cache_key, description FROM {self._work} WHERE claimed IS NULL OR claimed < ? "
+                    f"ORDER BY queued LIMIT ?", (now - self.lease, limit)
+                ).fetchall()
+                db.executemany(f"UPDATE {self._work} SET claimed = ? WHERE cache_key = ?",
+                               [(now, cache_key) for cache_key, _ in rows])
+            remaining = deadline - time.monotonic()
+            if rows or remaining <= 0:
+                return rows
+            # Woken straight away by local submissions, other replicas are picked up on the next poll
+            with self._queued:
+                self._queued.wait(min(remaining, max(self.poll_interval, 0.25)))
+
+    def attached(self, cache_key):
+        """IDs of the jobs waiting on the computation of the text."""
+        rows = self._query(f"SELECT job_ids FROM {self._work} WHERE cache_key = ?", (cache_key,))
+        return json.loads(rows[0][0]) if rows else []
+
+    def complete(self, cache_key):
+        """Remove the computation of the text and return the IDs of the jobs that were waiting on it."""
+        with self._transaction() as db:
+            row = db.execute(f"SELECT job_ids FROM {self._work} WHERE cache_key = ?", (cache_key,)).fetchone()
+            db.execute(f"DELETE FROM {self._work} WHERE cache_key = ?", (cache_key,))
+        return json.loads(row[0]) if row is not None else []
+
+    def queue_depth(self):
+        """Number of computations queued or running."""
+        return self._query(f"SELECT COUNT(*) FROM {self._work}")[0][0]
+
+    def outstanding(self):
+        """Number of jobs not finished yet and not stale."""
+        return self._query(f"SELECT COUNT(*) FROM {self._jobs} WHERE deadline > ?", (time.time(),))[0][0]
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+class RedisJobStore(_SharedJobStore):
+    """
+    Job table and work queue in Redis, shared by replicas on any host.
+
+    Jobs are hashes indexed by a sorted set of finished jobs scored with
+    their expiry time and one of unfinished jobs scored with their stale
+    deadline. Queued texts are a list that workers pop; claimed ones are
+    tracked with their claim time and requeued after `lease`.
+    """
+
+    def __init__(self, url, record_type=Job, ttl=300, namespace="jobs", lease=120, poll_interval=0.05, client=None,
+                 stale=STALE_SECONDS):
+        super().__init__(record_type, ttl, lease, poll_interval, stale)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError("JOB_STORE_URL=redis://... requires the redis package") from e
+            client = redis.Redis.from_url(url)
+        self._redis = client
+        self._prefix = namespace
+
+    def _key(self, *parts):
+        return ":".join((self._prefix,) + parts)
+
+    def __len__(self):
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.zcard(self._key("jobs"))
+        pipe.zcard(self._key("running"))
+        return sum(pipe.execute())
+
+    def create(self, **fields):
+        """Add a new job with a fresh UUID and return its record."""
+        job = self.record_type(str(uuid.uuid4()), **fields)
+        pipe = self._redis.pipeline()
+        pipe.hset(self._key("job", job.job_id), mapping={name: json.dumps(getattr(job, name)) for name in self._fields})
+        if job.status in FINISHED_STATUSES:
+            pipe.zadd(self._key("jobs"), {job.job_id: job.timestamp + self.ttl})
+        else:
+            pipe.zadd(self._key("running"), {job.job_id: job.created + self.stale})
+        pipe.execute()
+        return job
+
+    def get(self, job_id):
+        """Return a snapshot of the job record, or None when it does not exist or has expired."""
+        data = self._redis.hgetall(self._key("job", job_id))
+        if not data:
+            return None
+        return self._decode(job_id, {name.decode(): json.loads(value) for name, value in data.items()})
+
+    def read_many(self, job_ids, render, missing):
+        """Render many jobs in order from one round trip; unknown IDs go through `missing(job_id)`."""
+        pipe = self._redis.pipeline(transaction=False)
+        for job_id in job_ids:
+            pipe.hgetall(self._key("job", job_id))
+        results = []
+        for job_id, data in zip(job_ids, pipe.execute()):
+            if data:
+                job = self._decode(job_id, {name.decode(): json.loads(value) for name, value in data.items()})
+                results.append(render(job))
+            else:
+                results.append(missing(job_id))
+        return results
+
+    def update(self, job_id, **fields):
+        """Set fields on the job."""
+        from redis.exceptions import WatchError
+
+        key = self._key("job", job_id)
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    # Retried when the job changes in between, so an evicted job is not brought back
+                    pipe.watch(key)
+                    if not pipe.exists(key):
+                        return
+                    pipe.multi()
+                    pipe.hset(key, mapping={name: json.dumps(value) for name, value in fields.items()})
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def finish(self, job_id, status="done", **fields):
+        """Mark the job finished (done or failed) with the given fields; it is evicted `ttl` seconds from now."""
+        now = time.time()
+        pipe = self._redis.pipeline()
+        pipe.hset(self._key("job", job_id), mapping={
+            name: json.dumps(value) for name, value in {"status": status, "timestamp": now, **fields}.items()
+        })
+        pipe.zrem(self._key("running"), job_id)
+        pipe.zadd(self._key("jobs"), {job_id: now + self.ttl})
+        if status != "done":
+            pipe.sadd(self._key("failed"), job_id)
+        pipe.execute()
+
+    def _drop(self, job_ids):
+        if not job_ids:
+            return 0
+        pipe = self._redis.pipeline()
+        pipe.delete(*(self._key("job", job_id.decode()) for job_id in job_ids))
+        pipe.zrem(self._key("jobs"), *job_ids)
+        pipe.zrem(self._key("running"), *job_ids)
+        pipe.srem(self._key("failed"), *job_ids)
+        removed = pipe.execute()
+        return removed[1] + removed[2]
+
+    def evict_expired(self):
+        """Drop finished jobs whose TTL has passed and stale unfinished ones; return how many were dropped."""
+        now = time.time()
+        return (self._drop(self._redis.zrangebyscore(self._key("jobs"), "-inf", now))
+                + self._drop(self._redis.zrangebyscore(self._key("running"), "-inf", now)))
+
+    def evict_oldest(self, count):
+        """Drop up to `count` jobs to make room: stale unfinished ones, then finished ones oldest first."""
+        evicted = self._drop(self._redis.zrangebyscore(self._key("running"), "-inf", time.time(), start=0, num=count))
+        if evicted >= count:
+            return evicted
+        return evicted + self._drop(self._redis.zrange(self._key("jobs"), 0, count - evicted - 1))
+
+    def status_counts(self):
+        """Number of jobs per status; only the jobs not finished yet are read one by one."""
+        failed = self._redis.scard(self._key("failed"))
+        counts = {"done": self._redis.zcard(self._key("jobs")) - failed}
+        if failed:
+            counts["failed"] = failed
+        pipe = self._redis.pipeline(transaction=False)
+        for job_id in self._redis.zrange(self._key("running"), 0, -1):
+            pipe.hget(self._key("job", job_id.decode()), "status")
+        for status in pipe.execute():
+            if status is not None:
+                status = json.loads(status)
+                counts[status] = counts.get(status, 0) + 1
+        return counts
+
+    def in_flight(self, cache_key):
+        """Whether a computation for the text is queued or running."""
+        return bool(self._redis.exists(self._key("work", cache_key)))
+
+    def join(self, cache_key, job_id, description):
+        """Attach the job to the computation of the text and return the first job's ID, or queue it and return None."""
+        from redis.exceptions import WatchError
+
+        work = self._key("work", cache_key)
+        attached = self._key("attached", cache_key)
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    # Retried when `complete` removes the computation in between
+                    pipe.watch(work)
+                    running = pipe.exists(work)
+                    pipe.multi()
+                    if running:
+                        pipe.rpush(attached, job_id)
+                        pipe.lindex(attached, 0)
+                        return pipe.execute()[1].decode()
+                    pipe.set(work, description)
+                    pipe.rpush(attached, job_id)
+                    pipe.lpush(self._key("queue"), cache_key)
+                    pipe.execute()
+                    return None
+                except WatchError:
+                    continue
+
+    def claim(self, limit=1, timeout=None):
+        """Take up to `limit` queued (cache_key, description) pairs, waiting up to `timeout` for the first."""
+        queue = self._key("queue")
+        claimed = self._key("claimed")
+
+        # Requeue work whose worker died before completing it
+        for cache_key in self._redis.zrangebyscore(claimed, "-inf", time.time() - self.lease):
+            if self._redis.zrem(claimed, cache_key):
+                self._redis.rpush(queue, cache_key)
+
+        first = self._redis.brpop([queue], timeout=max(1, int(timeout or 0))) if timeout else self._redis.rpop(queue)
+        if first is None:
+            return []
+        keys = [first[1] if isinstance(first, (tuple, list)) else first]
+        if limit > 1:
+            keys.extend(self._redis.rpop(queue, limit - 1) or [])
+
+        from redis.exceptions import WatchError
+
+        work = [self._key("work", cache_key.decode()) for cache_key in keys]
+        with self._redis.pipeline() as pipe:
+            while True:
+                try:
+                    # Only texts still queued are marked claimed, completed ones would never be removed again
+                    pipe.watch(*work)
+                    descriptions = pipe.mget(work)
+                    fetched = {
+                        cache_key: description for cache_key, description in zip(keys, descriptions)
+                        if description is not None
+                    }
+                    pipe.multi()
+                    if fetched:
+                        pipe.zadd(claimed, {cache_key: time.time() for cache_key in fetched})
+                    pipe.execute()
+                    break
+                except WatchError:
+                    continue
+        return [(cache_key.decode(), description.decode()) for cache_key, description in fetched.items()]
+
+    def attached(self, cache_key):
+        """IDs of the jobs waiting on the computation of the text."""
+        return [job_id.decode() for job_id in self._redis.lrange(self._key("attached", cache_key), 0, -1)]
+
+    def complete(self, cache_key):
+        """Remove the computation of the text and return the IDs of the jobs that were waiting on it."""
+        attached = self._key("attached", cache_key)
+        pipe = self._redis.pipeline()
+        pipe.lrange(attached, 0, -1)
+        pipe.delete(attached, self._key("work", cache_key))
+        pipe.zrem(self._key("claimed"), cache_key)
+        return [job_id.decode() for job_id in pipe.execute()[0]]
+
+    def queue_depth(self):
+        """Number of computations queued or running."""
+        pipe = self._redis.pipeline(transaction=False)
+        pipe.llen(self._key("queue"))
+        pipe.zcard(self._key("claimed"))
+        return sum(pipe.execute())
+
+    def outstanding(self):
+        """Number of jobs not finished yet and not stale."""
+        return self._redis.zcount(self._key("running"), f"({time.time()}", "+inf")
+
+    def close(self):
+        self._redis.close()
+
+
+def open_job_store(url, record_type=Job, ttl=300, namespace="jobs", shards=16, lease=120, stale=STALE_SECONDS):
+    """Open the store selected by URL: "memory", "sqlite:///path/to/jobs.db" or "redis://host:port/db"."""
+    if url == "memory":
+        return MemoryJobStore(record_type, ttl=ttl, shards=shards, stale=stale)
+    if url.startswith("sqlite:///"):
+        return SqliteJobStore(
+            url[len("sqlite:///"):], record_type, ttl=ttl, namespace=namespace, lease=lease, stale=stale
+        )
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisJobStore(url, record_type, ttl=ttl, namespace=namespace, lease=lease, stale=stale)
+    raise ValueError(f"Unknown JOB_STORE_URL '{url}', expected memory, sqlite:///<path> or redis://<host>:<port>/<db>")
+
+
+# ------------------------------------------------------------------------------ #
+# Work dispatch
+# ------------------------------------------------------------------------------ #
+class WorkDispatcher:
+    """
+    Claim queued texts from a job store and hand them to this process's workers.
+
+    At most `slots` claimed texts are in progress at once, so a replica only
+    takes what it can run and leaves the rest of a shared queue to the others.
+    `handle(claimed)` receives up to `batch_size` (cache_key, description)
+    pairs and must call `done(count)` as each of them finishes. Claiming
+    begins once `start()` is called; `resize` changes the number of slots.
+    """
+
+    def __init__(self, store, handle, slots, batch_size=1, poll_interval=1.0):
+        self.store = store
+        self.handle = handle
+        self.batch_size = max(1, int(batch_size))
+        self.poll_interval = poll_interval
+        self.slots = max(1, int(slots))
+        self._busy = 0
+        self._changed = threading.Condition()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def resize(self, slots):
+        """Allow `slots` texts in progress; above the new limit, running ones finish before more are claimed."""
+        with self._changed:
+            self.slots = max(1, int(slots))
+            self._changed.notify_all()
+
+    def in_progress(self):
+        """Number of claimed texts not finished yet."""
+        with self._changed:
+            return self._busy
+
+    def done(self, count=1):
+        """Return the slots of `count` finished texts."""
+        with self._changed:
+            self._busy -= count
+            self._changed.notify_all()
+
+    def _loop(self):
+        while True:
+            with self._changed:
+                while self._busy >= self.slots:
+                    self._changed.wait()
+                limit = min(self.batch_size, self.slots - self._busy)
+            # Only this thread takes slots, so the free ones stay free while it waits for work
+            try:
+                claimed = self.store.claim(limit=limit, timeout=self.poll_interval)
+            except Exception as e:
+                print(f"Failed to claim queued work: {e}")
+                claimed = []
+                time.sleep(self.poll_interval)
+            if claimed:
+                with self._changed:
+                    self._busy += len(claimed)
+                try:
+                    self.handle(claimed)
+                except Exception as e:
+                    print(f"Failed to start claimed work: {e}")
+                    self.done(len(claimed))
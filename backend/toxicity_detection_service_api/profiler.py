@@ -0,0 +1,192 @@
+import sys
+import time
+import pstats
+import cProfile
+import threading
+from contextlib import contextmanager
+
+
+# ------------------------------------------------------------------------------ #
+# On-demand profiling of the next N jobs
+# ------------------------------------------------------------------------------ #
+PROFILE_MODES = ("sample", "cprofile")
+
+# Threads whose name starts with this are sampled while profiled jobs run
+INFERENCE_THREAD_PREFIX = "inference"
+
+
+class JobProfiler:
+    """
+    Profile the next `jobs` units of work wrapped in `job()`, then aggregate the result.
+
+    "sample" mode takes a stack sample of the threads running profiled jobs
+    and of the inference threads every `interval` seconds, and reports the
+    hottest lines and stacks. "cprofile" mode runs cProfile on one
+    profiled job at a time (Python 3.12+ allows a single active profiler per
+    process); jobs starting while it runs are not profiled and leave their
+    turn to later ones. It reports the functions by cumulative time. Nothing
+    is recorded while the profiler is not armed.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._done = threading.Condition(self._lock)
+        self._state = "idle"
+        self._mode = None
+        self._requested = 0
+        self._started = 0
+        self._finished = 0
+        self._interval = 0.005
+        self._active = set()
+        self._profiling = False
+        self._stacks = {}
+        self._samples = 0
+        self._stats = None
+        self._began = None
+        self._elapsed = 0.0
+
+    def start(self, jobs, mode="sample", interval=0.005):
+        """Arm the profiler for the next `jobs` jobs; returns False while a profile is still running."""
+        with self._lock:
+            if self._state == "running":
+                return False
+            self._state = "running"
+            self._mode = mode
+            self._requested = jobs
+            self._started = 0
+            self._finished = 0
+            self._interval = interval
+            self._active = set()
+            self._stacks = {}
+            self._samples = 0
+            self._stats = None
+            self._began = time.monotonic()
+            self._elapsed = 0.0
+        if mode == "sample":
+            threading.Thread(target=self._sample, daemon=True).start()
+        return True
+
+    @contextmanager
+    def job(self, count=1):
+        """Profile the enclosed work if the profiler is armed and still needs jobs; `count` jobs are run by it."""
+        with self._lock:
+            profiled = self._state == "running" and self._started < self._requested
+            if profiled and self._mode == "cprofile":
+                # Only one cProfile session can be active at a time
+                profiled = not self._profiling
+                self._profiling = True
+            if profiled:
+                self._started += count
+                self._active.add(threading.get_ident())
+            mode = self._mode
+
+        profile = cProfile.Profile() if profiled and mode == "cprofile" else None
+        enabled = False
+        try:
+            if profile is not None:
+                try:
+                    profile.enable()
+                    enabled = True
+                except ValueError as e:
+                    # Another profiling tool of the process is active, run the job without cProfile
+                    print(f"Unable to profile job: {e}")
+            yield
+        finally:
+            if enabled:
+                profile.disable()
+            if profiled:
+                with self._lock:
+                    self._active.discard(threading.get_ident())
+                    if profile is not None:
+                        self._profiling = False
+                    if enabled:
+                        if self._stats is None:
+                            self._stats = pstats.Stats(profile)
+                        else:
+                            self._stats.add(profile)
+                    self._finished += count
+                    if self._finished >= self._requested:
+                        self._state = "done"
+                        self._elapsed = time.monotonic() - self._began
+                        self._done.notify_all()
+
+    def result(self, wait=0, top=40):
+        """Current state with the aggregated profile once done, waiting up to `wait` seconds for it."""
+        with self._lock:
+            if wait and self._state == "running":
+                self._done.wait_for(lambda: self._state != "running", timeout=wait)
+            report = {
+                "status": self._state,
+                "mode": self._mode,
+                "jobs_requested": self._requested,
+                "jobs_profiled": self._finished
+            }
+            if self._state != "done":
+                return report
+            report["seconds"] = round(self._elapsed, 3)
+            if self._mode == "sample":
+                report["profile"] = self._sample_report(top)
+            else:
+                report["profile"] = self._cprofile_report(top)
+            return report
+
+    def _sample(self):
+        sampler = threading.get_ident()
+        while True:
+            with self._lock:
+                if self._state != "running":
+                    return
+                watched = set(self._active)
+            watched.update(
+                thread.ident for thread in threading.enumerate()
+                if thread.name.startswith(INFERENCE_THREAD_PREFIX) and thread.ident != sampler
+            )
+            if self._active:
+                frames = sys._current_frames()
+                stacks = []
+                for ident in watched:
+                    frame = frames.get(ident)
+                    stack = []
+                    while frame is not None:
+                        code = frame.f_code
+                        stack.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+                        frame = frame.f_back
+                    if stack:
+                        stacks.append(";".join(reversed(stack)))
+                with self._lock:
+                    for stack in stacks:
+                        self._stacks[stack] = self._stacks.get(stack, 0) + 1
+                        self._samples += 1
+            time.sleep(self._interval)
+
+    def _sample_report(self, top):
+        lines = {}
+        for stack, count in self._stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            lines[leaf] = lines.get(leaf, 0) + count
+        hottest = sorted(self._stacks.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "samples": self._samples,
+            "interval_seconds": self._interval,
+            # Innermost function and line of the samples
+            "lines": [
+                {"line": line, "samples": count}
+                for line, count in sorted(lines.items(), key=lambda item: item[1], reverse=True)[:top]
+            ],
+            # Collapsed stacks, root first, ready for flame graph tools
+            "stacks": [{"stack": stack, "samples": count} for stack, count in hottest]
+        }
+
+    def _cprofile_report(self, top):
+        if self._stats is None:
+            return {"functions": []}
+        rows = []
+        for (filename, line, name), (_, calls, total, cumulative, _) in self._stats.stats.items():
+            rows.append({
+                "function": f"{name} ({filename.rsplit('/', 1)[-1]}:{line})",
+                "calls": calls,
+                "total_seconds": round(total, 6),
+                "cumulative_seconds": round(cumulative, 6)
+            })
+        rows.sort(key=lambda row: row["cumulative_seconds"], reverse=True)
+        return {"functions": rows[:top]}
@@ -0,0 +1,127 @@
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import threading
+import unicodedata
+from collections import OrderedDict
+
+
+# ------------------------------------------------------------------------------ #
+# Content-addressed prediction cache
+# ------------------------------------------------------------------------------ #
+def normalize_text(text):
+    """Normalise unicode and collapse whitespace so trivially different copies share a key."""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def content_key(text, version, normalize=True):
+    """Hash the normalised (or, for results that point into the text, exact) text together with the model/engine version."""
+    return hashlib.sha256(f"{version}\0{normalize_text(text) if normalize else text}".encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    """
+    Bounded in-memory LRU cache with TTL, backed by an optional SQLite file.
+
+    Values must be JSON serialisable. The disk tier survives restarts; a
+    memory miss that hits the disk promotes the entry back into memory.
+    """
+
+    def __init__(self, max_entries=10000, ttl=3600, disk_path=None):
+        self.max_entries = max(0, int(max_entries))
+        self.ttl = float(ttl)
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_hits = 0
+        self._puts = 0
+
+        self._disk = None
+        if disk_path:
+            os.makedirs(os.path.dirname(disk_path) or ".", exist_ok=True)
+            self._disk = sqlite3.connect(disk_path, check_same_thread=False, isolation_level=None)
+            self._disk.execute("PRAGMA journal_mode=WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires REAL NOT NULL)"
+            )
+            self._disk.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+
+    def get(self, key, count=True):
+        """
+        Return the cached value for the key, or None on a miss or expired entry.
+
+        With `count` false the lookup is left out of the hit and miss counters,
+        for reads that are not a request for the result itself.
+        """
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires > now:
+                    self._entries.move_to_end(key)
+                    self.hits += count
+                    return value
+                del self._entries[key]
+
+            if self._disk is not None:
+                row = self._disk.execute(
+                    "SELECT value, expires FROM results WHERE key = ? AND expires > ?", (key, now)
+                ).fetchone()
+                if row is not None:
+                    value = json.loads(row[0])
+                    self._remember(key, value, row[1])
+                    self.hits += count
+                    self.disk_hits += count
+                    return value
+
+            self.misses += count
+            return None
+
+    def put(self, key, value):
+        """Store a value under the key in memory and on disk."""
+        expires = time.time() + self.ttl
+        with self._lock:
+            self._remember(key, value, expires)
+            if self._disk is not None:
+                self._disk.execute(
+                    "INSERT OR REPLACE INTO results (key, value, expires) VALUES (?, ?, ?)",
+                    (key, json.dumps(value), expires)
+                )
+                self._puts += 1
+                if self._puts % 1000 == 0:
+                    self._disk.execute("DELETE FROM results WHERE expires <= ?", (time.time(),))
+
+    def _remember(self, key, value, expires):
+        if self.max_entries == 0:
+            return
+        self._entries[key] = (value, expires)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def stats(self):
+        """Hit, miss and eviction counters plus the current size."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+    def close(self):
+        """Close the disk tier."""
+        with self._lock:
+            if self._disk is not None:
+                self._disk.close()
+                self._disk = None
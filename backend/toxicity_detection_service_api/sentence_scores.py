@@ -0,0 +1,106 @@
+from concurrent.futures import Future
+from result_cache import content_key
+from sentences import split_sentences
+
+
+# ------------------------------------------------------------------------------ #
+# Sentence-level reuse of toxicity scores
+# ------------------------------------------------------------------------------ #
+class SentenceScores:
+    """
+    Toxicity of texts scored sentence by sentence.
+
+    The scores of each sentence are kept in `cache` by the sentence's text,
+    one {label: score} entry per sentence, so a text sharing sentences with
+    one scored before (such as an edited comment) only sends its new
+    sentences to the model through `submit`. A text scores the highest score
+    of its sentences for each label, and its spans are its `top_spans` most
+    toxic sentences scoring `span_threshold` or more.
+    """
+
+    def __init__(self, cache, version, submit, top_spans=3, span_threshold=0.5):
+        self.cache = cache
+        self.version = version
+        self.submit = submit
+        self.top_spans = top_spans
+        self.span_threshold = span_threshold
+
+    def score(self, texts, on_start=None):
+        """
+        Return a Future of one (result, spans, segments, timings) tuple per text,
+        where segments holds the scores of each of the text's sentences by cache key.
+
+        Sentences scored before come from the cache; the others, of every text,
+        go to the model as one submission. `on_start` is called once they are
+        handed to the model, or straight away when there are none.
+        """
+        segmented = [split_sentences(text) for text in texts]
+        keys = [
+            [content_key(text[start:end], self.version) for start, end in spans]
+            for text, spans in zip(texts, segmented)
+        ]
+        known = {}
+        missing = {}
+        for text, spans, text_keys in zip(texts, segmented, keys):
+            for (start, end), key in zip(spans, text_keys):
+                if key in known or key in missing:
+                    continue
+                cached = self.cache.get(key)
+                if cached is not None:
+                    known[key] = cached
+                else:
+                    missing[key] = text[start:end]
+
+        def assemble(stages):
+            outputs = []
+            for text, spans, text_keys in zip(texts, segmented, keys):
+                sentences = [
+                    {"start": start, "end": end, "text": text[start:end], "scores": known[key]}
+                    for (start, end), key in zip(spans, text_keys)
+                ]
+                result = {
+                    label: max(sentence["scores"][label] for sentence in sentences) for label in sentences[0]["scores"]
+                }
+                offending = sorted(
+                    (sentence for sentence in sentences if max(sentence["scores"].values()) >= self.span_threshold),
+                    key=lambda sentence: max(sentence["scores"].values()), reverse=True
+                )
+                timings = {
+                    **stages,
+                    "sentences": len(spans),
+                    "sentences_scored": sum(1 for key in set(text_keys) if key in missing)
+                }
+                segments = {key: known[key] for key in text_keys}
+                outputs.append((result, offending[:self.top_spans], segments, timings))
+            return outputs
+
+        future = Future()
+        if not missing:
+            if on_start is not None:
+                on_start()
+            future.set_result(assemble({}))
+            return future
+
+        pending = list(missing)
+
+        def collect(scored):
+            if scored.exception() is not None:
+                future.set_exception(scored.exception())
+                return
+            stages = {}
+            for key, (scores, sentence_stages) in zip(pending, scored.result()):
+                self.cache.put(key, scores)
+                known[key] = scores
+                # Sentences of a submission share their batches, report the slowest
+                for name in ("tokenize", "forward"):
+                    stages[name] = max(stages.get(name, 0.0), sentence_stages[name])
+            future.set_result(assemble(stages))
+
+        self.submit([missing[key] for key in pending], on_start=on_start).add_done_callback(collect)
+        return future
+
+    def restore(self, segments):
+        """Put the sentence scores of an earlier text, as returned in its segments, back into the cache."""
+        for key, scores in segments.items():
+            # Keep scores added for the sentence since
+            self.cache.put(key, {**scores, **(self.cache.get(key, count=False) or {})})
@@ -0,0 +1,34 @@
+import re
+
+
+# ------------------------------------------------------------------------------
+# Sentence segmentation
+# ------------------------------------------------------------------------------
+# End of a sentence: terminal punctuation (with any closing quotes or brackets)
+# followed by whitespace, or a line break
+SENTENCE_END = re.compile(r"[.!?…]+[\"'”’)\]]*\s+|\n\s*")
+
+
+def split_sentences(text):
+    """
+    Split a text into sentences, returned as (start, end) character offsets into it.
+
+    Whitespace around a sentence is left out of its span, so text[start:end]
+    is the sentence as written. A text without sentence breaks is one sentence.
+    """
+    spans = []
+    start = 0
+    for match in SENTENCE_END.finditer(text):
+        _add_span(text, start, match.end(), spans)
+        start = match.end()
+    _add_span(text, start, len(text), spans)
+    return spans
+
+
+def _add_span(text, start, end, spans):
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    if start < end:
+        spans.append((start, end))
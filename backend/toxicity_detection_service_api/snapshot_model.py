@@ -0,0 +1,36 @@
+import os
+import argparse
+
+
+# ------------------------------------------------------------------------------
+# Hugging Face model setup
+# ------------------------------------------------------------------------------
+os.environ["TORCH_HOME"] = "./model_cache"
+os.environ["HF_HOME"] = "./hf_cache"
+os.environ["HF_HUB_DISABLE_SYMLINKS_WARNING"] = "1"
+
+from detoxify import Detoxify
+from model_snapshot import save_snapshot
+
+
+MODEL_NAME = "detoxify-original"
+
+# ------------------------------------------------------------------------------
+# Ready-to-load snapshot for fast restarts (MODEL_SNAPSHOT_DIR)
+# ------------------------------------------------------------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Snapshot the Detoxify model, tokenizer and labels for fast startup.")
+    parser.add_argument(
+        "--snapshot-dir",
+        default=os.getenv("MODEL_SNAPSHOT_DIR", "./model_cache/snapshot"),
+        help="Directory the app loads the snapshot from (MODEL_SNAPSHOT_DIR)."
+    )
+    args = parser.parse_args()
+
+    model = Detoxify('original')
+    print("Wrote", save_snapshot(
+        args.snapshot_dir, MODEL_NAME, model.model, model.tokenizer, {"class_names.json": model.class_names}
+    ))
+
+if __name__ == "__main__":
+    main()
@@ -44,8 +44,7 @@ for idx, sample in enumerate(samples, 1):
     job_id = response.json()["job_id"]
 
     while True:
-        time.sleep(1)
-        res = requests.get(f"{RESULT_ENDPOINT}/{job_id}")
+        res = requests.get(f"{RESULT_ENDPOINT}/{job_id}", params={"wait": 30})
         if res.status_code != 200:
             print(f"Job {job_id} not found")
             break
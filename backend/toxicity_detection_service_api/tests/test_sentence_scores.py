@@ -0,0 +1,88 @@
+from concurrent.futures import Future
+from result_cache import ResultCache
+from sentence_scores import SentenceScores
+
+
+class Model:
+    """Scores sentences by the words in them, recording what it was asked to score."""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, sentences, on_start=None):
+        self.submitted.append(list(sentences))
+        if on_start is not None:
+            on_start()
+        future = Future()
+        future.set_result([
+            ({"toxicity": 0.9 if "idiot" in sentence else 0.1, "insult": 0.8 if "idiot" in sentence else 0.0},
+             {"tokenize": 0.01, "forward": 0.02})
+            for sentence in sentences
+        ])
+        return future
+
+
+def open_scores(model, **options):
+    return SentenceScores(ResultCache(max_entries=100), "model", model.submit, **options)
+
+
+def test_a_text_takes_the_highest_sentence_score_of_each_label():
+    model = Model()
+    (result, _, segments, timings), = open_scores(model).score(["Nice view. You idiot! See you."]).result()
+
+    assert result == {"toxicity": 0.9, "insult": 0.8}
+    assert model.submitted == [["Nice view.", "You idiot!", "See you."]]
+    assert len(segments) == 3
+    assert (timings["sentences"], timings["sentences_scored"]) == (3, 3)
+
+
+def test_spans_are_the_most_toxic_sentences_at_their_offsets():
+    text = "You idiot. Nice view. Idiot, you idiot!"
+    (_, spans, _, _), = open_scores(Model(), top_spans=1, span_threshold=0.5).score([text]).result()
+
+    assert [(span["start"], span["end"], span["text"]) for span in spans] == [(0, 10, "You idiot.")]
+    assert text[spans[0]["start"]:spans[0]["end"]] == spans[0]["text"]
+    assert spans[0]["scores"]["toxicity"] == 0.9
+
+
+def test_sentences_are_scored_once_across_texts():
+    model = Model()
+    outputs = open_scores(model).score(["Hello there. You idiot.", "You idiot. Bye."]).result()
+
+    assert model.submitted == [["Hello there.", "You idiot.", "Bye."]]
+    assert [timings["sentences_scored"] for _, _, _, timings in outputs] == [2, 2]
+
+
+def test_an_edited_text_only_scores_its_changed_sentences_from_restored_segments():
+    model = Model()
+    (_, _, segments, _), = open_scores(model).score(["Nice view. Great hike. See you."]).result()
+
+    # The previous version's sentences were evicted, its cached result brings them back
+    scores = open_scores(model)
+    scores.restore(segments)
+    (_, _, _, timings), = scores.score(["Nice view. You idiot. See you."]).result()
+
+    assert model.submitted[-1] == ["You idiot."]
+    assert (timings["sentences"], timings["sentences_scored"]) == (3, 1)
+    assert scores.cache.stats()["hits"] == 2
+
+
+def test_restoring_keeps_scores_added_since():
+    scores = open_scores(Model())
+    scores.cache.put("key", {"toxicity": 0.3})
+    scores.restore({"key": {"toxicity": 0.2, "insult": 0.1}})
+
+    assert scores.cache.get("key") == {"toxicity": 0.3, "insult": 0.1}
+
+
+def test_texts_whose_sentences_are_all_known_start_without_the_model():
+    model = Model()
+    scores = open_scores(model)
+    scores.score(["You idiot."]).result()
+    started = []
+
+    (result, _, _, timings), = scores.score(["You idiot."], on_start=lambda: started.append(True)).result()
+
+    assert len(model.submitted) == 1
+    assert started == [True]
+    assert timings["sentences_scored"] == 0 and result["toxicity"] == 0.9